@@ -1,10 +1,27 @@
+import os
+import tempfile
+
 from pydantic_settings import BaseSettings
 
+# Queues and logs that must survive a restart; the container mounts a volume here
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+
 class Settings(BaseSettings):
     # Supabase
     SUPABASE_URL: str
     SUPABASE_KEY: str
     SUPABASE_SERVICE_KEY: str
+    SUPABASE_TIMEOUT_SECONDS: float = 15
+    SUPABASE_CONNECT_TIMEOUT_SECONDS: float = 5
+    SUPABASE_MAX_CONNECTIONS: int = 50
+    
+    # Auth (JWT secret enables local HS256 verification)
+    SUPABASE_JWT_SECRET: str = ""
+    SUPABASE_JWKS_URL: str = ""
+    JWKS_CACHE_SECONDS: float = 3600
+    JWT_LEEWAY_SECONDS: float = 30
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: float = 300
     
     # Stripe
     STRIPE_SECRET_KEY: str
@@ -21,8 +38,110 @@ class Settings(BaseSettings):
     # Limits
     FREE_TIER_LIMIT: int = 10
     PRO_TIER_LIMIT: int = 500
-    MAX_AUDIO_LENGTH_SECONDS: int = 30
+    MAX_AUDIO_LENGTH_SECONDS: int = 30  # longest reference kept after preprocessing
+    MAX_UPLOAD_SECONDS: int = 120  # longest sample accepted, trimmed down to the best window
+    MAX_UPLOAD_BYTES: int = 25 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
     MAX_TEXT_LENGTH: int = 5000
+    MAX_BATCH_TEXTS: int = 100
+    BATCH_UPLOAD_CONCURRENCY: int = 8
+    BATCH_ADMISSION_SHARE: float = 0.25  # most of the admission capacity one batch may queue for at once
+    QUOTA_FLUSH_INTERVAL: float = 2
+    QUOTA_REFRESH_SECONDS: float = 60
+    
+    # Caches
+    CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "voiceclone", "cache")
+    REFERENCE_CACHE_SIZE: int = 256
+    SAMPLE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    SEGMENT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    SEGMENT_CROSSFADE_MS: float = 10
+    OUTPUT_CACHE_SECONDS: float = 900  # generated audio served locally while it uploads
+    
+    # Background writes of generated audio and generation rows
+    WRITER_FLUSH_INTERVAL: float = 0.5
+    WRITER_BATCH_SIZE: int = 100
+    WRITER_MAX_ATTEMPTS: int = 5  # reported as stuck after this, but still retried
+    WRITER_MAX_BACKOFF_SECONDS: float = 300
+    WRITER_QUEUE_PATH: str = os.path.join(DATA_DIR, "writer.sqlite3")
+    WRITER_AUDIO_DIR: str = os.path.join(DATA_DIR, "outputs")  # unsaved audio must survive a restart too
+    
+    # Long-text planning, each segment is synthesized independently
+    SEGMENT_MAX_CHARS: int = 200
+    SEGMENT_MIN_CHARS: int = 20
+    
+    # Generated audio encoding; WAV keeps existing clients' files and content
+    # types, benchmarks/bench_formats.py recommends a compressed opt-in
+    OUTPUT_FORMAT: str = "wav"  # wav, flac, ogg (opus) or mp3
+    OUTPUT_SAMPLE_RATE: int = 0  # 0 keeps the model's 24 kHz
+    
+    # Observability
+    TRACE_RESPONSE_HEADERS: bool = True  # X-Trace-Id and Server-Timing on responses
+    TRACE_LOG: bool = True  # one JSON line per request that recorded spans
+    
+    # Backbone variants, cheapest first, as name=repo[@threads] (0 threads
+    # keeps the library default), e.g.
+    # "q4=neuphonic/neutts-air-q4-gguf@4,q8=neuphonic/neutts-air-q8-gguf@8"
+    MODEL_VARIANTS: str = "q4=neuphonic/neutts-air-q4-gguf"
+    FREE_TIER_VARIANT: str = "q4"
+    PRO_TIER_VARIANT: str = "q4"  # unknown names fall back to the first variant
+    
+    # Model startup
+    PRELOAD_MODEL: bool = True  # load in the background at startup, off for auth/billing-only processes
+    WARMUP_INFERENCE: bool = True
+    
+    # Inference scheduling
+    BATCH_MAX_SIZE: int = 4
+    BATCH_MAX_WAIT_MS: float = 25
+    WORKER_PROCESSES: int = 0  # 0 runs the model in the API process
+    WORKER_HEALTHCHECK_INTERVAL: float = 5
+    WORKER_BATCH_TIMEOUT: float = 300
+    WORKER_DISPATCH_TIMEOUT: float = 30  # longest wait for an idle worker before a 503
+    WORKER_RESTART_BACKOFF_SECONDS: float = 5  # after a failed model load, doubling each time
+    WORKER_RESTART_BACKOFF_MAX: float = 300
+    WORKER_MAX_LOAD_FAILURES: int = 5  # then the worker is left down and the pool is degraded
+    
+    # CPU layout of inference
+    WORKER_THREADS: int = 0  # torch/llama threads per worker, 0 splits the cores evenly (library default in-process)
+    CPU_PIN_WORKERS: bool = False  # pin each worker process to its own cores
+    CPU_NUMA_AWARE: bool = False  # keep each pinned worker inside one NUMA node
+    EXECUTOR_THREADS: int = 0  # default thread pool of the event loop, 0 keeps asyncio's
+    CPU_AUTOTUNE: bool = False  # measure layouts in the background, the saved one overrides WORKER_PROCESSES/THREADS from the next start
+    CPU_AUTOTUNE_PATH: str = os.path.join(DATA_DIR, "cpu_layout.json")
+    CPU_AUTOTUNE_REQUESTS: int = 3  # generations per worker for each candidate
+    CPU_AUTOTUNE_MAX_RTF: float = 1.0  # prefer layouts that keep every worker at least real-time
+    
+    # Per-user limits on generation routes
+    RATE_LIMIT_ENABLED: bool = True
+    FREE_RATE_PER_MINUTE: float = 10
+    FREE_RATE_BURST: int = 5
+    FREE_MAX_CONCURRENT: int = 1
+    PRO_RATE_PER_MINUTE: float = 60
+    PRO_RATE_BURST: int = 20
+    PRO_MAX_CONCURRENT: int = 4
+    RATE_LIMIT_REDIS_URL: str = ""  # share limits across instances (needs the redis package)
+    
+    # Admission control
+    ADMISSION_CONCURRENCY: int = 0  # 0 fills one batch per inference slot
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_DEADLINE_SECONDS: float = 60
+    ADMISSION_INITIAL_RTF: float = 1.0  # seconds of processing per second of audio
+    CHARS_PER_AUDIO_SECOND: float = 15
+    
+    # Background generation jobs
+    JOB_QUEUE_PATH: str = os.path.join(DATA_DIR, "jobs.sqlite3")
+    JOB_WORKERS: int = 2
+    JOB_MAX_ATTEMPTS: int = 4
+    JOB_RETRY_BASE_SECONDS: float = 2
+    JOB_POLL_INTERVAL: float = 5
+    JOB_EVENT_INTERVAL: float = 0.5
+    
+    # Stripe webhook event log and cached subscription state
+    BILLING_EVENTS_PATH: str = os.path.join(DATA_DIR, "billing.sqlite3")
+    BILLING_EVENT_MAX_ATTEMPTS: int = 8
+    BILLING_EVENT_RETRY_BASE_SECONDS: float = 2
+    BILLING_EVENT_POLL_INTERVAL: float = 5
+    BILLING_EVENT_RETENTION_SECONDS: float = 4 * 24 * 3600  # applied events kept past Stripe's 3-day retry window
+    SUBSCRIPTION_CACHE_SECONDS: float = 3600  # refreshed from Stripe after this, events update it sooner
     
     class Config:
         env_file = ".env"
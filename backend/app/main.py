@@ -1,10 +1,34 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+import asyncio
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from app.routers import auth, voice, billing
 from app.config import settings
+from app.services.reference_cache import reference_cache
+from app.services.sample_cache import sample_cache
+from app.services.segment_cache import segment_cache
+from app.services.batch_scheduler import get_batch_scheduler
+from app.services.worker_pool import get_worker_pool
+from app.services.cpu_layout import apply_thread_settings, get_layout
+from app.services.cpu_autotune import autotune_status, start_autotune, stop_autotune
+from app.services.supabase_service import supabase_repo
+from app.services.auth_service import token_verifier
+from app.services.quota_service import quota_service
+from app.services.job_queue import job_queue
+from app.services.generation_service import run_generation_job
+from app.services.generation_writer import generation_writer
+from app.services.billing_events import billing_events
+from app.services.model_lifecycle import model_lifecycle
+from app.services.model_registry import model_registry
+from app.services.admission import get_admission_controller
+from app.services import metrics
+from app.services.rate_limit import RateLimitMiddleware, rate_limiter
+from app.utils.upload_limit import AudioUploadCheckMiddleware, UploadLimitMiddleware
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -17,7 +41,32 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS
+# Refuse oversized voice samples while they stream in
+app.add_middleware(
+    AudioUploadCheckMiddleware,
+    paths=["/api/voice/upload-voice"],
+    max_seconds=settings.MAX_UPLOAD_SECONDS
+)
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=settings.MAX_UPLOAD_BYTES,
+    paths=["/api/voice/upload-voice"]
+)
+
+# Per-user rate and concurrency caps, checked before the request body is read
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=rate_limiter,
+        paths=[
+            "/api/voice/generate",
+            "/api/voice/generate-stream",
+            "/api/voice/generate-batch",
+            "/api/voice/generate-async"
+        ]
+    )
+
+# CORS, added last so it wraps the limiters' early responses too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -30,11 +79,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Time each request, collect its stage spans and tag it with a trace id"""
+    trace_id = request.headers.get("x-trace-id") or metrics.new_trace_id()
+    started = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    status = 500
+    try:
+        with metrics.trace(trace_id) as spans:
+            response = await call_next(request)
+            status = response.status_code
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - started
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            str(status)
+        ).observe(elapsed)
+    
+    if settings.TRACE_RESPONSE_HEADERS:
+        response.headers["X-Trace-Id"] = trace_id
+        if spans:
+            response.headers["Server-Timing"] = metrics.server_timing(spans)
+    if settings.TRACE_LOG and spans:
+        print(json.dumps({
+            "trace_id": trace_id,
+            "method": request.method,
+            "path": request.url.path,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+            "spans": [{"stage": stage, "ms": round(seconds * 1000, 1)} for stage, seconds in spans]
+        }))
+    return response
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(voice.router, prefix="/api/voice", tags=["voice"])
 app.include_router(billing.router, prefix="/api/billing", tags=["billing"])
 
+@app.on_event("startup")
+async def start_background_services():
+    # The layout decides the pool size; a background autotune only changes it
+    # from the next start
+    start_autotune()
+    layout = get_layout()
+    print(f"🧵 CPU layout: {layout.stats()}")
+    if layout.workers == 0:
+        apply_thread_settings(layout.threads)
+    if settings.EXECUTOR_THREADS > 0:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=settings.EXECUTOR_THREADS)
+        )
+    pool = get_worker_pool()
+    if pool is not None:
+        await pool.start()
+    model_lifecycle.start()
+    await quota_service.check_database()
+    quota_service.start()
+    await generation_writer.start()
+    await billing_events.start()
+    await job_queue.start(run_generation_job)
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    # Stop taking jobs first, then models, and flush usage before the HTTP
+    # client goes away
+    await job_queue.stop()
+    stop_autotune()
+    await model_lifecycle.stop()
+    pool = get_worker_pool()
+    if pool is not None:
+        await pool.stop()
+    await generation_writer.stop()
+    await billing_events.stop()
+    await quota_service.stop()
+    await supabase_repo.close()
+
 @app.get("/")
 async def root():
     return {
@@ -47,10 +171,44 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    if not model_lifecycle.ready:
+        return JSONResponse(status_code=503, content=model_lifecycle.stats())
+    return model_lifecycle.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/stats")
+async def stats():
+    return {
+        "model": model_lifecycle.stats(),
+        "auth": token_verifier.stats(),
+        "quota": quota_service.stats(),
+        "jobs": await job_queue.stats(),
+        "writer": generation_writer.stats(),
+        "billing_events": await billing_events.stats(),
+        "admission": get_admission_controller().stats(),
+        "rate_limit": rate_limiter.stats(),
+        "reference_cache": reference_cache.stats(),
+        "sample_cache": sample_cache.stats(),
+        "segment_cache": segment_cache.stats(),
+        "models": model_registry.stats(),
+        "cpu_layout": get_layout().stats(),
+        "cpu_autotune": autotune_status(),
+        "batch_scheduler": {
+            variant: get_batch_scheduler(variant).stats() for variant in model_registry.variants
+        },
+        "worker_pool": get_worker_pool().stats() if get_worker_pool() else None
+    }
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"error": exc.detail}
+        content={"error": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel, EmailStr
-from app.services.supabase_service import supabase_client
+from app.services.supabase_service import supabase_repo
 
 router = APIRouter()
 
@@ -12,28 +12,34 @@ class SignInRequest(BaseModel):
     email: EmailStr
     password: str
 
+def split_auth_response(data: dict):
+    """Split a GoTrue response into (user, session)"""
+    if data.get("access_token"):
+        return data.get("user"), data
+    # Signups awaiting email confirmation return the bare user
+    return (data if data.get("id") else data.get("user")), None
+
 @router.post("/signup")
 async def sign_up(request: SignUpRequest):
     """Sign up new user"""
     try:
-        response = supabase_client.auth.sign_up({
-            "email": request.email,
-            "password": request.password
-        })
+        user, session = split_auth_response(
+            await supabase_repo.sign_up(request.email, request.password)
+        )
         
-        if response.user:
+        if user:
             # Create user profile in database
-            supabase_client.table("profiles").insert({
-                "user_id": response.user.id,
+            await supabase_repo.create_profile({
+                "user_id": user["id"],
                 "email": request.email,
                 "tier": "free",
                 "generations_used": 0,
                 "generations_limit": 10
-            }).execute()
+            })
             
             return {
-                "user": response.user,
-                "session": response.session
+                "user": user,
+                "session": session
             }
         else:
             raise HTTPException(status_code=400, detail="Signup failed")
@@ -45,23 +51,23 @@ async def sign_up(request: SignUpRequest):
 async def sign_in(request: SignInRequest):
     """Sign in existing user"""
     try:
-        response = supabase_client.auth.sign_in_with_password({
-            "email": request.email,
-            "password": request.password
-        })
+        user, session = split_auth_response(
+            await supabase_repo.sign_in(request.email, request.password)
+        )
         
         return {
-            "user": response.user,
-            "session": response.session
+            "user": user,
+            "session": session
         }
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
 @router.post("/signout")
-async def sign_out():
+async def sign_out(authorization: str = Header(None)):
     """Sign out user"""
     try:
-        supabase_client.auth.sign_out()
+        if authorization and authorization.startswith("Bearer "):
+            await supabase_repo.sign_out(authorization.split(" ")[1])
         return {"message": "Signed out successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -70,18 +76,16 @@ async def sign_out():
 async def get_current_user(token: str):
     """Get current user info"""
     try:
-        user = supabase_client.auth.get_user(token)
+        user = await supabase_repo.get_user(token)
         
         # Get profile
-        profile = supabase_client.table("profiles")\
-            .select("*")\
-            .eq("user_id", user.user.id)\
-            .single()\
-            .execute()
+        profile = await supabase_repo.get_profile(user.id)
+        if profile is None:
+            raise Exception("Profile not found")
         
         return {
-            "user": user.user,
-            "profile": profile.data
+            "user": user.data,
+            "profile": profile
         }
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, HTTPException, Request, Depends
 from pydantic import BaseModel
+import asyncio
 import stripe
 
 from app.config import settings
-from app.services.supabase_service import supabase_client
+from app.services.supabase_service import supabase_repo
+from app.services.billing_events import billing_events
 from app.routers.voice import get_current_user
 
 router = APIRouter()
@@ -50,35 +52,9 @@ async def stripe_webhook(request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     
-    # Handle checkout.session.completed
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        user_id = session["client_reference_id"]
-        
-        # Upgrade user to Pro
-        supabase_client.table("profiles")\
-            .update({
-                "tier": "pro",
-                "generations_limit": 500,
-                "stripe_customer_id": session["customer"],
-                "stripe_subscription_id": session["subscription"]
-            })\
-            .eq("user_id", user_id)\
-            .execute()
-    
-    # Handle subscription deleted/cancelled
-    elif event["type"] in ["customer.subscription.deleted", "customer.subscription.updated"]:
-        subscription = event["data"]["object"]
-        
-        if subscription["status"] != "active":
-            # Downgrade to free
-            supabase_client.table("profiles")\
-                .update({
-                    "tier": "free",
-                    "generations_limit": 10
-                })\
-                .eq("stripe_subscription_id", subscription["id"])\
-                .execute()
+    # Acknowledge once the event is logged; the billing worker applies it.
+    # Redeliveries of an event already logged are acknowledged and dropped.
+    await billing_events.record(event, payload)
     
     return {"status": "success"}
 
@@ -86,28 +62,48 @@ async def stripe_webhook(request: Request):
 async def get_subscription(user: dict = Depends(get_current_user)):
     """Get current subscription info"""
     try:
-        profile = supabase_client.table("profiles")\
-            .select("*")\
-            .eq("user_id", user.id)\
-            .single()\
-            .execute()
+        state = await billing_events.get_subscription(user.id)
+        if state is None:
+            state = await _load_subscription(user.id)
         
         subscription_info = {
-            "tier": profile.data["tier"],
-            "status": "active" if profile.data["tier"] == "pro" else "free"
+            "tier": state["tier"],
+            "status": "active" if state["tier"] == "pro" else "free"
         }
-        
-        # Get Stripe subscription if pro
-        if profile.data.get("stripe_subscription_id"):
-            try:
-                subscription = stripe.Subscription.retrieve(
-                    profile.data["stripe_subscription_id"]
-                )
-                subscription_info["next_billing_date"] = subscription["current_period_end"]
-                subscription_info["cancel_at_period_end"] = subscription["cancel_at_period_end"]
-            except:
-                pass
+        if state.get("current_period_end") is not None:
+            subscription_info["next_billing_date"] = state["current_period_end"]
+            subscription_info["cancel_at_period_end"] = bool(state["cancel_at_period_end"])
         
         return subscription_info
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _load_subscription(user_id: str) -> dict:
+    """Read the profile and its Stripe subscription, and cache the result"""
+    profile = await supabase_repo.get_profile(user_id)
+    if profile is None:
+        raise Exception("Profile not found")
+    
+    state = {
+        "customer_id": profile.get("stripe_customer_id"),
+        "subscription_id": profile.get("stripe_subscription_id"),
+        "tier": profile["tier"],
+        "status": "active" if profile["tier"] == "pro" else "free"
+    }
+    
+    # Get Stripe subscription if pro
+    if profile.get("stripe_subscription_id"):
+        try:
+            loop = asyncio.get_running_loop()
+            subscription = await loop.run_in_executor(
+                None, stripe.Subscription.retrieve, profile["stripe_subscription_id"]
+            )
+            state["current_period_end"] = subscription["current_period_end"]
+            state["cancel_at_period_end"] = subscription["cancel_at_period_end"]
+        except Exception as e:
+            # Don't cache a partial answer; the next page load tries again
+            print(f"Stripe subscription lookup failed: {e}")
+            return state
+    
+    await billing_events.put_subscription(user_id, state)
+    return state
@@ -1,22 +1,45 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Header, Depends
-from fastapi.responses import FileResponse
-import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Header, Depends, BackgroundTasks, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import json
+from starlette.background import BackgroundTask
 import uuid
-import tempfile
 import asyncio
+import math
+import soundfile as sf
+from contextlib import asynccontextmanager
 from datetime import datetime
-from pathlib import Path
 
-from app.services.neutts_service import get_neutts_service
-from app.services.supabase_service import supabase_client
+from app.services.admission import get_admission_controller, Overloaded
+from app.services.metrics import span
+from app.services.model_registry import model_registry
+from app.services.neutts_service import SAMPLE_RATE
+from app.services.sample_cache import sample_cache
+from app.services.worker_pool import WorkersUnavailable
+from app.services.synthesis import synthesize, synthesize_segment
+from app.services.generation_service import (
+    load_reference_codes, encode_generation, upload_generation, generation_record,
+    generation_storage_path
+)
+from app.services.generation_writer import generation_writer
+from app.services.job_queue import job_queue, TERMINAL_STATUSES
+from app.services.supabase_service import supabase_repo
+from app.services.auth_service import token_verifier
+from app.services.quota_service import quota_service, Reservation, QuotaExceeded, ProfileNotFound
 from app.config import settings
-from app.utils.audio_utils import get_audio_duration
+from app.utils.audio_utils import get_audio_duration, wav_stream_header, pcm16_bytes, crossfade_concat, check_output_format, match_loudness, speech_rms, encode_audio, OUTPUT_FORMATS
+from app.utils.reference_audio import REFERENCE_SAMPLE_RATE, prepare_reference, sniff_audio_format
+from app.utils.text_utils import plan_segments
+from app.utils.listing import decode_cursor, encode_cursor, etag_response, select_columns
 
 router = APIRouter()
 
-# Windows-compatible temp directory
-TEMP_DIR = Path(tempfile.gettempdir()) / "voiceclone"
-TEMP_DIR.mkdir(exist_ok=True)
+class GenerateBatchRequest(BaseModel):
+    voice_id: str
+    texts: List[str]
+    output_format: Optional[str] = None
+    sample_rate: Optional[int] = None
 
 async def get_current_user(authorization: str = Header(None)):
     """Get current user from token"""
@@ -25,98 +48,153 @@ async def get_current_user(authorization: str = Header(None)):
     
     token = authorization.split(" ")[1]
     try:
-        user = supabase_client.auth.get_user(token)
-        return user.user
+        with span("auth"):
+            return await token_verifier.verify(token)
     except Exception as e:
         print(f"Auth error: {e}")
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def check_usage_limit(user_id: str):
-    """Check if user has generations remaining"""
+async def reserve_generation(user_id: str, units: int = 1) -> Reservation:
+    """Reserve generations up front; commit on success, refund on failure"""
     try:
-        response = supabase_client.table("profiles")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .execute()
-        
-        if not response.data or len(response.data) == 0:
-            raise HTTPException(status_code=404, detail="Profile not found")
-        
-        profile = response.data[0]
-        
-        if profile["generations_used"] >= profile["generations_limit"]:
-            raise HTTPException(
-                status_code=403,
-                detail="Generation limit reached. Upgrade to Pro for more."
-            )
-        
-        return profile
-    except HTTPException:
-        raise
+        with span("quota"):
+            return await quota_service.reserve(user_id, units)
+    except ProfileNotFound:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    except QuotaExceeded:
+        raise HTTPException(
+            status_code=403,
+            detail="Generation limit reached. Upgrade to Pro for more."
+        )
     except Exception as e:
         print(f"Usage check error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def admit_generation(text: str, tier: str):
+    """Wait for an inference slot, or fail fast with 429 when overloaded"""
+    try:
+        return await get_admission_controller().acquire(text, tier)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Server busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+def generation_error(e: Exception) -> HTTPException:
+    """503 with Retry-After when no model worker can run it, 500 otherwise"""
+    if isinstance(e, WorkersUnavailable):
+        return HTTPException(
+            status_code=503,
+            detail="Voice model unavailable, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return HTTPException(status_code=500, detail=str(e))
+
+@asynccontextmanager
+async def admitted(text: str, tier: str):
+    ticket = await admit_generation(text, tier)
+    try:
+        yield ticket
+    finally:
+        get_admission_controller().release(ticket)
+
+async def precompute_reference_codes(voice: dict):
+    """Encode a freshly uploaded sample so the first generation is warm"""
+    try:
+        await load_reference_codes(voice)
+        print(f"Reference codes cached for voice: {voice['id']}")
+    except Exception as e:
+        # Not fatal, codes are computed on first use instead
+        print(f"Reference precompute error: {e}")
+
 @router.post("/upload-voice")
 async def upload_voice_sample(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     voice_name: str = Form(...),
     user: dict = Depends(get_current_user)
 ):
     """Upload voice sample for cloning"""
-    temp_path = None
     try:
         print(f"Upload request from user: {user.id}")
         
-        # Validate audio file
-        if not file.content_type.startswith('audio/'):
-            raise HTTPException(status_code=400, detail="File must be audio")
-        
-        # Read file
-        audio_data = await file.read()
-        print(f"Audio data size: {len(audio_data)} bytes")
+        # Trust the bytes, not the declared content type
+        head = await file.read(64)
+        sniffed = sniff_audio_format(head)
+        if sniffed is None:
+            raise HTTPException(status_code=415, detail="Unsupported audio format")
+        extension, content_type = sniffed
+        await file.seek(0)
         
-        # Save to temp file for validation
-        temp_path = TEMP_DIR / f"{uuid.uuid4()}.wav"
-        with open(temp_path, "wb") as f:
-            f.write(audio_data)
-        
-        # Validate duration
-        duration = get_audio_duration(str(temp_path))
-        print(f"Audio duration: {duration}s")
-        
-        if duration > settings.MAX_AUDIO_LENGTH_SECONDS:
-            os.remove(temp_path)
+        # Validate duration from the header, without decoding samples
+        loop = asyncio.get_running_loop()
+        try:
+            duration = await loop.run_in_executor(None, get_audio_duration, file.file)
+        except Exception as e:
+            print(f"Unreadable upload: {e}")
+            raise HTTPException(status_code=415, detail="Unsupported or corrupt audio file")
+        file.file.seek(0)
+        print(f"Audio: {extension}, {file.size} bytes, {duration:.1f}s")
+        
+        if duration > settings.MAX_UPLOAD_SECONDS:
             raise HTTPException(
                 status_code=400,
-                detail=f"Audio must be under {settings.MAX_AUDIO_LENGTH_SECONDS}s"
+                detail=f"Audio must be under {settings.MAX_UPLOAD_SECONDS}s"
+            )
+        
+        # Canonical 16 kHz reference: trimmed, normalized, best window only
+        try:
+            reference = await loop.run_in_executor(
+                None, prepare_reference, file.file, settings.MAX_AUDIO_LENGTH_SECONDS
             )
+        except sf.LibsndfileError as e:
+            print(f"Undecodable upload: {e}")
+            raise HTTPException(status_code=415, detail="Unsupported or corrupt audio file")
+        reference_duration = len(reference) / REFERENCE_SAMPLE_RATE
+        if reference_duration < 1:
+            raise HTTPException(status_code=400, detail="No speech found in audio")
+        reference_data = await loop.run_in_executor(
+            None, encode_audio, reference, REFERENCE_SAMPLE_RATE, "wav"
+        )
+        await file.seek(0)
         
-        # Upload to Supabase Storage
+        # Upload to Supabase Storage: the reference used for cloning, and the
+        # original streamed from the spooled upload chunk by chunk
         voice_id = str(uuid.uuid4())
         storage_path = f"{user.id}/voices/{voice_id}.wav"
+        original_path = f"{user.id}/voices/{voice_id}.original.{extension}"
+        
+        async def original_chunks():
+            while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+                yield chunk
         
         print(f"Uploading to Supabase: {storage_path}")
-        supabase_client.storage.from_("voice-samples").upload(
-            storage_path,
-            audio_data,
-            {"content-type": "audio/wav"}
+        await asyncio.gather(
+            supabase_repo.upload("voice-samples", storage_path, reference_data, "audio/wav"),
+            supabase_repo.upload(
+                "voice-samples", original_path, original_chunks(), content_type,
+                content_length=file.size
+            )
         )
+        sample_cache.put(storage_path, reference_data)
         
         # Save to database
         print(f"Saving to database: {voice_id}")
-        supabase_client.table("voices").insert({
+        await supabase_repo.insert_voice({
             "id": voice_id,
             "user_id": user.id,
             "name": voice_name,
             "storage_path": storage_path,
-            "duration": duration,
+            "duration": round(reference_duration, 2),
             "created_at": datetime.utcnow().isoformat()
-        }).execute()
+        })
         
-        # Cleanup
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
+        # Encode reference codes after the response is sent
+        background_tasks.add_task(
+            precompute_reference_codes,
+            {"id": voice_id, "storage_path": storage_path}
+        )
         
         print(f"Upload successful: {voice_id}")
         return {
@@ -131,37 +209,38 @@ async def upload_voice_sample(
         print(f"Upload error: {e}")
         import traceback
         traceback.print_exc()
-        
-        # Cleanup on error
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
-        
         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_voice(voice_id: str, user_id: str) -> dict:
+    """Look up a voice owned by the user"""
+    with span("voice_lookup"):
+        voice = await supabase_repo.get_voice(voice_id, user_id)
+    
+    if voice is None:
+        raise HTTPException(status_code=404, detail="Voice not found")
+    
+    return voice
+
 @router.post("/generate")
 async def generate_voice(
+    request: Request,
     voice_id: str = Form(...),
     text: str = Form(...),
+    output_format: str = Form(None),
+    sample_rate: int = Form(None),
+    latency_budget: float = Form(None),
     user: dict = Depends(get_current_user)
 ):
-    """Generate audio from text using cloned voice"""
-    temp_voice_path = None
-    output_path = None
-    
-    def run_generation():
-        neutts = get_neutts_service()
-        return neutts.clone_and_generate(
-            reference_audio=str(temp_voice_path),
-            text=text,
-            output_path=str(output_path)
-        )
+    """
+    Generate audio from text using cloned voice.
     
+    The model variant follows the user's tier; with latency_budget (seconds)
+    a cheaper variant is used when the tier's one would not finish in time.
+    """
+    reservation = None
     try:
         print(f"Generate request from user: {user.id}")
         
-        # Check usage limit
-        profile = await check_usage_limit(user.id)
-        
         # Validate text length
         if len(text) > settings.MAX_TEXT_LENGTH:
             raise HTTPException(
@@ -169,79 +248,50 @@ async def generate_voice(
                 detail=f"Text too long (max {settings.MAX_TEXT_LENGTH} chars)"
             )
         
-        # Get voice sample
-        voice_response = supabase_client.table("voices")\
-            .select("*")\
-            .eq("id", voice_id)\
-            .eq("user_id", user.id)\
-            .execute()
+        output_format = output_format or settings.OUTPUT_FORMAT
+        sample_rate = sample_rate or settings.OUTPUT_SAMPLE_RATE or SAMPLE_RATE
+        try:
+            check_output_format(output_format, sample_rate)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        if not voice_response.data or len(voice_response.data) == 0:
-            raise HTTPException(status_code=404, detail="Voice not found")
+        # Reserve a generation before any model work
+        reservation = await reserve_generation(user.id)
         
-        voice = voice_response.data[0]
+        # Get voice sample
+        voice = await get_voice(voice_id, user.id)
         print(f"Using voice: {voice['name']}")
         
-        # Download voice sample from storage
-        print(f"Downloading voice sample: {voice['storage_path']}")
-        voice_sample_data = supabase_client.storage\
-            .from_("voice-samples")\
-            .download(voice["storage_path"])
+        variant = model_registry.select(reservation.tier, text, latency_budget)
         
-        temp_voice_path = TEMP_DIR / f"voice_{uuid.uuid4()}.wav"
-        with open(temp_voice_path, "wb") as f:
-            f.write(voice_sample_data)
+        async with admitted(text, reservation.tier) as ticket:
+            audio_hash, ref_codes = await load_reference_codes(voice)
+            
+            # Generate audio with NeuTTS
+            print(f"Generating audio with {variant.name}: {text[:50]}...")
+            
+            # Synthesize uncached sentences, then encode off the event loop
+            with span("synthesize"):
+                wav = await synthesize(
+                    text, ref_codes, audio_hash, variant=variant.name, on_synthesized=ticket.add_audio
+                )
         
-        # Generate audio with NeuTTS
-        output_path = TEMP_DIR / f"output_{uuid.uuid4()}.wav"
-        print(f"Generating audio with text: {text[:50]}...")
-        
-        # Run blocking generation in thread pool
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, run_generation)
+        audio_data = await encode_generation(wav, output_format, sample_rate)
         
         print("Audio generation complete")
         
-        # Upload generated audio to storage
+        # Respond from the local cache; storage upload and the row insert
+        # happen in the background writer
         generation_id = str(uuid.uuid4())
-        storage_path = f"{user.id}/generations/{generation_id}.wav"
-        
-        with open(output_path, "rb") as f:
-            audio_data = f.read()
-        
-        print(f"Uploading generated audio: {storage_path}")
-        supabase_client.storage.from_("generated-audio").upload(
-            storage_path,
+        storage_path = generation_storage_path(user.id, generation_id, output_format)
+        await generation_writer.submit(
+            generation_record(user.id, voice_id, text, generation_id, storage_path),
             audio_data,
-            {"content-type": "audio/wav"}
+            OUTPUT_FORMATS[output_format]["content_type"]
         )
+        quota_service.commit(reservation)
         
-        # Save generation record
-        supabase_client.table("generations").insert({
-            "id": generation_id,
-            "user_id": user.id,
-            "voice_id": voice_id,
-            "text": text,
-            "storage_path": storage_path,
-            "created_at": datetime.utcnow().isoformat()
-        }).execute()
-        
-        # Update usage count
-        supabase_client.table("profiles")\
-            .update({"generations_used": profile["generations_used"] + 1})\
-            .eq("user_id", user.id)\
-            .execute()
-        
-        # Cleanup temp files
-        if temp_voice_path and os.path.exists(temp_voice_path):
-            os.remove(temp_voice_path)
-        if output_path and os.path.exists(output_path):
-            os.remove(output_path)
-        
-        # Get download URL
-        download_url = supabase_client.storage\
-            .from_("generated-audio")\
-            .get_public_url(storage_path)
+        download_url = str(request.url_for("get_generation_audio", storage_path=storage_path))
         
         print(f"Generation successful: {generation_id}")
         
@@ -249,84 +299,439 @@ async def generate_voice(
             "generation_id": generation_id,
             "download_url": download_url,
             "text": text,
-            "generations_remaining": profile["generations_limit"] - profile["generations_used"] - 1
+            "format": output_format,
+            "model": variant.name,
+            "generations_remaining": reservation.quota.remaining
         }
         
     except HTTPException:
+        if reservation is not None:
+            quota_service.refund(reservation)
         raise
     except Exception as e:
+        if reservation is not None:
+            quota_service.refund(reservation)
         print(f"Generation error: {e}")
         import traceback
         traceback.print_exc()
+        raise generation_error(e)
+
+@router.post("/generate-stream")
+async def generate_voice_stream(
+    voice_id: str = Form(...),
+    text: str = Form(...),
+    output_format: Optional[str] = Form(None),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Stream generated audio segment by segment as a chunked 16-bit WAV.
+    
+    The stream is always WAV, as compressed formats can't be cut at segment
+    boundaries; the saved take uses OUTPUT_FORMAT. It is assembled, uploaded
+    and counted in the background once every segment has been sent. If a
+    segment fails, the chunked response is aborted rather than ended, so
+    clients see a failed transfer instead of a short file.
+    """
+    print(f"Stream request from user: {user.id}")
+    
+    if output_format not in (None, "wav"):
+        raise HTTPException(status_code=400, detail="Streaming is WAV only")
+    if len(text) > settings.MAX_TEXT_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Text too long (max {settings.MAX_TEXT_LENGTH} chars)"
+        )
+    
+    segments = plan_segments(text, settings.SEGMENT_MAX_CHARS, settings.SEGMENT_MIN_CHARS)
+    if not segments:
+        raise HTTPException(status_code=400, detail="Text is empty")
+    
+    reservation = await reserve_generation(user.id)
+    ticket = None
+    try:
+        voice = await get_voice(voice_id, user.id)
+        ticket = await admit_generation(text, reservation.tier)
+        audio_hash, ref_codes = await load_reference_codes(voice)
+    except HTTPException:
+        quota_service.refund(reservation)
+        if ticket is not None:
+            get_admission_controller().release(ticket)
+        raise
+    except Exception as e:
+        quota_service.refund(reservation)
+        if ticket is not None:
+            get_admission_controller().release(ticket)
+        print(f"Reference encode error: {e}")
+        raise generation_error(e)
+    
+    generation_id = str(uuid.uuid4())
+    variant = model_registry.select(reservation.tier, text).name
+    generated = []
+    
+    def release_slot():
+        get_admission_controller().release(ticket)
+    
+    async def stream_audio():
+        # Keep one segment generating ahead of the one being sent
+        tasks = [asyncio.create_task(
+            synthesize_segment(segments[0], ref_codes, audio_hash, variant, ticket.add_audio)
+        )]
+        try:
+            yield wav_stream_header(SAMPLE_RATE)
+            for i in range(len(segments)):
+                if i + 1 < len(segments):
+                    tasks.append(asyncio.create_task(
+                        synthesize_segment(segments[i + 1], ref_codes, audio_hash, variant, ticket.add_audio)
+                    ))
+                wav = await tasks[i]
+                # Later segments can't be known yet, so match the first one's level
+                if generated:
+                    wav = match_loudness(wav, target_rms)
+                else:
+                    target_rms = speech_rms(wav)
+                generated.append(wav)
+                yield pcm16_bytes(wav)
+        except Exception as e:
+            # Raising aborts the response without the final chunk; the
+            # background save never runs, so refund here
+            print(f"Stream generation error: {e}")
+            quota_service.refund(reservation)
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+            release_slot()
+    
+    async def finalize():
+        # Covers streams that never started sending
+        release_slot()
+        # Only complete streams count as a generation
+        if len(generated) != len(segments):
+            quota_service.refund(reservation)
+            print(f"Stream {generation_id} incomplete, not saved")
+            return
+        try:
+            audio_data = await encode_generation(
+                crossfade_concat(generated, SAMPLE_RATE, settings.SEGMENT_CROSSFADE_MS)
+            )
+            await generation_writer.submit(
+                generation_record(
+                    user.id, voice_id, text, generation_id,
+                    generation_storage_path(user.id, generation_id)
+                ),
+                audio_data,
+                OUTPUT_FORMATS[settings.OUTPUT_FORMAT]["content_type"]
+            )
+            quota_service.commit(reservation)
+            print(f"Stream generation saved: {generation_id}")
+        except Exception as e:
+            quota_service.refund(reservation)
+            print(f"Stream save error: {e}")
+    
+    return StreamingResponse(
+        stream_audio(),
+        media_type="audio/wav",
+        headers={"X-Generation-Id": generation_id},
+        background=BackgroundTask(finalize)
+    )
+
+@router.post("/generate-batch")
+async def generate_voice_batch(
+    request: GenerateBatchRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Generate many texts with one voice.
+    
+    Auth, quota, voice lookup and reference encoding happen once. Lines are
+    synthesized as admission slots allow and each is encoded and uploaded as
+    soon as it's ready. Generation rows are written in one bulk insert and
+    quota is charged only for lines that succeeded.
+    """
+    texts = [text.strip() for text in request.texts]
+    print(f"Batch request from user: {user.id} ({len(texts)} texts)")
+    
+    if not texts or not all(texts):
+        raise HTTPException(status_code=400, detail="Texts must be non-empty")
+    if len(texts) > settings.MAX_BATCH_TEXTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many texts (max {settings.MAX_BATCH_TEXTS})"
+        )
+    if any(len(text) > settings.MAX_TEXT_LENGTH for text in texts):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Text too long (max {settings.MAX_TEXT_LENGTH} chars)"
+        )
+    
+    output_format = request.output_format or settings.OUTPUT_FORMAT
+    sample_rate = request.sample_rate or settings.OUTPUT_SAMPLE_RATE or SAMPLE_RATE
+    try:
+        check_output_format(output_format, sample_rate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # One reservation covers every line; unused units are refunded on commit
+    reservation = await reserve_generation(user.id, units=len(texts))
+    try:
+        voice = await get_voice(request.voice_id, user.id)
+        
+        # Fail fast if overloaded, later lines queue behind the first
+        admission = get_admission_controller()
+        first_ticket = await admit_generation(texts[0], reservation.tier)
+        try:
+            audio_hash, ref_codes = await load_reference_codes(voice)
+        except BaseException:
+            admission.release(first_ticket)
+            raise
+        
+        uploads = asyncio.Semaphore(settings.BATCH_UPLOAD_CONCURRENCY)
+        # Keep a big batch from filling the admission queue ahead of other users
+        in_admission = asyncio.Semaphore(
+            max(1, math.ceil(admission.concurrency * settings.BATCH_ADMISSION_SHARE))
+        )
+        variant = model_registry.select(reservation.tier).name
+        
+        async def generate_line(index: int, text: str) -> dict:
+            async with in_admission:
+                ticket = first_ticket if index == 0 else await admission.acquire(
+                    text, reservation.tier, fail_fast=False
+                )
+                try:
+                    with span("synthesize"):
+                        wav = await synthesize(
+                            text, ref_codes, audio_hash, variant=variant, on_synthesized=ticket.add_audio
+                        )
+                finally:
+                    admission.release(ticket)
+            
+            audio_data = await encode_generation(wav, output_format, sample_rate)
+            generation_id = str(uuid.uuid4())
+            async with uploads:
+                storage_path = await upload_generation(user.id, generation_id, audio_data, output_format)
+            return generation_record(user.id, voice["id"], text, generation_id, storage_path)
+        
+        outcomes = await asyncio.gather(
+            *[generate_line(i, text) for i, text in enumerate(texts)],
+            return_exceptions=True
+        )
         
-        # Cleanup on error
-        if temp_voice_path and os.path.exists(temp_voice_path):
-            os.remove(temp_voice_path)
-        if output_path and os.path.exists(output_path):
-            os.remove(output_path)
-        
-        raise HTTPException(status_code=500, detail=str(e))
+        records = [outcome for outcome in outcomes if isinstance(outcome, dict)]
+        try:
+            with span("db_insert"):
+                await supabase_repo.insert_generations(records)
+        except Exception:
+            # Nothing points at the uploads without their rows
+            try:
+                await supabase_repo.remove("generated-audio", [record["storage_path"] for record in records])
+            except Exception as e:
+                print(f"Failed to remove batch uploads: {e}")
+            raise
+    except HTTPException:
+        quota_service.refund(reservation)
+        raise
+    except BaseException as e:
+        quota_service.refund(reservation)
+        if not isinstance(e, Exception):
+            raise
+        print(f"Batch generation error: {e}")
+        raise generation_error(e)
+    
+    quota_service.commit(reservation, units=len(records))
+    
+    results = []
+    for index, (text, outcome) in enumerate(zip(texts, outcomes)):
+        if isinstance(outcome, dict):
+            results.append({
+                "index": index,
+                "generation_id": outcome["id"],
+                "text": text,
+                "download_url": supabase_repo.public_url("generated-audio", outcome["storage_path"])
+            })
+        else:
+            print(f"Batch line {index} failed: {outcome}")
+            results.append({"index": index, "text": text, "error": str(outcome)})
+    
+    if not records:
+        if all(isinstance(outcome, WorkersUnavailable) for outcome in outcomes):
+            raise generation_error(outcomes[0])
+        raise HTTPException(status_code=500, detail="Every text in the batch failed")
+    
+    print(f"Batch generation complete: {len(records)}/{len(texts)} succeeded")
+    return {
+        "voice_id": voice["id"],
+        "format": output_format,
+        "generations": results,
+        "generations_remaining": reservation.quota.remaining
+    }
+
+def job_response(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "error": job["error"] if job["status"] == "failed" else None,
+        "result": job["result"]
+    }
+
+@router.post("/generate-async", status_code=202)
+async def submit_generation_job(
+    voice_id: str = Form(...),
+    text: str = Form(...),
+    user: dict = Depends(get_current_user)
+):
+    """Queue a generation and return a job id right away"""
+    if len(text) > settings.MAX_TEXT_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Text too long (max {settings.MAX_TEXT_LENGTH} chars)"
+        )
+    
+    # Fail fast on quota and voice; the worker reserves the unit when it runs
+    try:
+        quota = await quota_service.get(user.id)
+    except ProfileNotFound:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if quota.remaining <= 0:
+        raise HTTPException(
+            status_code=403,
+            detail="Generation limit reached. Upgrade to Pro for more."
+        )
+    await get_voice(voice_id, user.id)
+    
+    job = await job_queue.submit(user.id, voice_id, text, quota.tier)
+    print(f"Queued job {job['id']} for user: {user.id}")
+    return job_response(job)
+
+async def get_user_job(job_id: str, user_id: str) -> dict:
+    job = await job_queue.get(job_id)
+    if job is None or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_generation_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Poll a generation job"""
+    return job_response(await get_user_job(job_id, user.id))
+
+@router.get("/jobs/{job_id}/events")
+async def stream_generation_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Push job status changes as server-sent events until it finishes"""
+    job = await get_user_job(job_id, user.id)
+    
+    async def events():
+        last = None
+        current = job
+        while True:
+            payload = job_response(current)
+            if payload != last:
+                yield f"data: {json.dumps(payload)}\n\n"
+                last = payload
+            if current["status"] in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(settings.JOB_EVENT_INTERVAL)
+            current = await job_queue.get(job_id)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+VOICE_FIELDS = ("id", "name", "duration", "created_at", "storage_path")
+VOICE_DEFAULT_FIELDS = ("id", "name", "duration", "created_at")
+GENERATION_FIELDS = ("id", "voice_id", "text", "storage_path", "created_at")
+GENERATION_DEFAULT_FIELDS = ("id", "voice_id", "storage_path", "created_at")
 
 @router.get("/my-voices")
-async def get_my_voices(user: dict = Depends(get_current_user)):
-    """Get all voices for current user"""
+async def get_my_voices(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """Get a page of the current user's voices, newest first"""
+    columns = select_columns(fields, VOICE_DEFAULT_FIELDS, VOICE_FIELDS)
+    after = decode_cursor(cursor)
     try:
-        voices = supabase_client.table("voices")\
-            .select("*")\
-            .eq("user_id", user.id)\
-            .order("created_at", desc=True)\
-            .execute()
-        
-        return {"voices": voices.data if voices.data else []}
+        # One extra row tells us whether another page exists
+        voices = await supabase_repo.list_voices(user.id, ",".join(columns), limit + 1, after)
     except Exception as e:
         print(f"Get voices error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    next_cursor = encode_cursor(voices[limit - 1]) if len(voices) > limit else None
+    return etag_response(request, {"voices": voices[:limit], "next_cursor": next_cursor})
 
 @router.get("/my-generations")
-async def get_my_generations(user: dict = Depends(get_current_user)):
-    """Get all generations for current user"""
+async def get_my_generations(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Get a page of the current user's generations, newest first.
+    
+    text is left out unless asked for in fields; download_url is added
+    whenever storage_path is selected.
+    """
+    columns = select_columns(fields, GENERATION_DEFAULT_FIELDS, GENERATION_FIELDS)
+    after = decode_cursor(cursor)
     try:
-        generations = supabase_client.table("generations")\
-            .select("*")\
-            .eq("user_id", user.id)\
-            .order("created_at", desc=True)\
-            .limit(50)\
-            .execute()
-        
-        # Add download URLs
-        if generations.data:
-            for gen in generations.data:
-                gen["download_url"] = supabase_client.storage\
-                    .from_("generated-audio")\
-                    .get_public_url(gen["storage_path"])
-        
-        return {"generations": generations.data if generations.data else []}
+        generations = await supabase_repo.list_generations(user.id, ",".join(columns), limit + 1, after)
     except Exception as e:
         print(f"Get generations error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    next_cursor = encode_cursor(generations[limit - 1]) if len(generations) > limit else None
+    generations = generations[:limit]
+    
+    if "storage_path" in columns:
+        urls = supabase_repo.public_urls(
+            "generated-audio",
+            [gen["storage_path"] for gen in generations]
+        )
+        for gen, url in zip(generations, urls):
+            gen["download_url"] = url
+    
+    return etag_response(request, {"generations": generations, "next_cursor": next_cursor})
+
+@router.get("/audio/{storage_path:path}")
+async def get_generation_audio(storage_path: str):
+    """Serve generated audio from the local cache, or redirect to storage"""
+    output = next(
+        (o for o in OUTPUT_FORMATS.values() if storage_path.endswith(f".{o['extension']}")),
+        None
+    )
+    if output is None or "/generations/" not in storage_path:
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    cached = generation_writer.cached_path(storage_path)
+    if cached is not None:
+        return FileResponse(cached, media_type=output["content_type"])
+    return RedirectResponse(supabase_repo.public_url("generated-audio", storage_path))
 
 @router.get("/usage")
 async def get_usage(user: dict = Depends(get_current_user)):
     """Get current usage stats"""
     try:
-        response = supabase_client.table("profiles")\
-            .select("*")\
-            .eq("user_id", user.id)\
-            .execute()
-        
-        if not response.data or len(response.data) == 0:
+        try:
+            quota = await quota_service.get(user.id)
+        except ProfileNotFound:
             raise HTTPException(
                 status_code=404, 
                 detail="Profile not found. Please contact support."
             )
         
-        profile = response.data[0]
-        
         return {
-            "tier": profile["tier"],
-            "generations_used": profile["generations_used"],
-            "generations_limit": profile["generations_limit"],
-            "generations_remaining": profile["generations_limit"] - profile["generations_used"]
+            "tier": quota.tier,
+            "generations_used": quota.used,
+            "generations_limit": quota.limit,
+            "generations_remaining": quota.limit - quota.used
         }
     except HTTPException:
         raise
@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import List, Optional, Tuple
+
+from app.config import settings
+from app.services.job_queue import TIER_PRIORITY
+from app.services.worker_pool import get_worker_pool
+
+
+class Overloaded(Exception):
+    """The estimated wait is past the deadline; retry after retry_after seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self, priority: int, cost: float):
+        self.priority = priority
+        self.cost = cost
+        self.started_at: Optional[float] = None
+        # Audio the model produced for this request; cache hits don't count
+        self.audio_seconds = 0.0
+        self.released = False
+
+    def add_audio(self, seconds: float):
+        self.audio_seconds += seconds
+
+
+class AdmissionController:
+    """
+    Bounded admission in front of inference.
+
+    At most `concurrency` generations run at once; the rest wait in a
+    priority queue where pro requests go ahead of free ones. Each request's
+    cost is estimated from its text length and the observed real-time
+    factor, and a request whose estimated wait would exceed the deadline is
+    rejected up front instead of timing out later with everyone else.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_queue: int,
+        deadline_seconds: float,
+        initial_rtf: float,
+        chars_per_second: float
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.deadline = deadline_seconds
+        self.rtf = initial_rtf
+        self.chars_per_second = chars_per_second
+
+        self.admitted = 0
+        self.rejected = 0
+        self._active: List[Ticket] = []
+        self._waiting: List[Tuple[int, int, Ticket, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    def estimate_seconds(self, text: str) -> float:
+        """Expected processing time of a text at the current real-time factor"""
+        return len(text) / self.chars_per_second * self.rtf
+
+    def estimated_wait(self, priority: int) -> float:
+        """Seconds until a new request at this priority would start"""
+        if len(self._active) < self.concurrency and not self._waiting:
+            return 0.0
+        now = time.monotonic()
+        remaining = sum(max(0.0, t.cost - (now - t.started_at)) for t in self._active)
+        ahead = sum(t.cost for p, _, t, _ in self._waiting if p <= priority)
+        return (remaining + ahead) / self.concurrency
+
+    def _start(self, ticket: Ticket):
+        ticket.started_at = time.monotonic()
+        self._active.append(ticket)
+        self.admitted += 1
+
+    async def acquire(self, text: str, tier: str, fail_fast: bool = True) -> Ticket:
+        """
+        Wait for a generation slot.
+
+        Raises Overloaded when fail_fast is set and the queue for this tier
+        is full or the estimated wait plus the request's own processing
+        would exceed the deadline.
+        """
+        priority = TIER_PRIORITY.get(tier, TIER_PRIORITY["free"])
+        ticket = Ticket(priority, self.estimate_seconds(text))
+
+        if len(self._active) < self.concurrency and not self._waiting:
+            self._start(ticket)
+            return ticket
+
+        if fail_fast:
+            wait = self.estimated_wait(priority)
+            queued_ahead = sum(1 for p, _, _, _ in self._waiting if p <= priority)
+            if queued_ahead >= self.max_queue or wait + ticket.cost > self.deadline:
+                self.rejected += 1
+                raise Overloaded(max(1, math.ceil(wait)))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._order), ticket, future)
+        heapq.heappush(self._waiting, entry)
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Granted a slot just as the caller went away
+                self.release(ticket)
+            else:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Free a slot, learn from the request's speed and start the next one"""
+        if ticket.released or ticket.started_at is None:
+            return
+        ticket.released = True
+        self._active.remove(ticket)
+
+        if ticket.audio_seconds:
+            observed = (time.monotonic() - ticket.started_at) / ticket.audio_seconds
+            self.rtf = 0.8 * self.rtf + 0.2 * observed
+
+        while self._waiting and len(self._active) < self.concurrency:
+            _, _, waiting, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            self._start(waiting)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": len(self._active),
+            "queued": len(self._waiting),
+            "rtf": round(self.rtf, 3),
+            "estimated_wait_seconds": round(self.estimated_wait(TIER_PRIORITY["free"]), 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+
+
+_admission_controller = None
+
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller
+    if _admission_controller is None:
+        concurrency = settings.ADMISSION_CONCURRENCY
+        if concurrency <= 0:
+            # Enough requests to keep one full batch on every inference slot
+            pool = get_worker_pool()
+            concurrency = (pool.size if pool is not None else 1) * settings.BATCH_MAX_SIZE
+        _admission_controller = AdmissionController(
+            concurrency=concurrency,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            deadline_seconds=settings.ADMISSION_DEADLINE_SECONDS,
+            initial_rtf=settings.ADMISSION_INITIAL_RTF,
+            chars_per_second=settings.CHARS_PER_AUDIO_SECOND
+        )
+    return _admission_controller
@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import httpx
+
+from app.config import settings
+from app.services.supabase_service import AuthUser, supabase_repo
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+    from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class Undecided(Exception):
+    """Local verification can't say either way, ask Supabase"""
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64int(segment: str) -> int:
+    return int.from_bytes(_b64decode(segment), "big")
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens, locally when possible.
+
+    HS256 tokens are checked against SUPABASE_JWT_SECRET; RS256/ES256 tokens
+    against the project's JWKS (needs the optional cryptography package).
+    Tokens that can't be checked locally fall back to GET /auth/v1/user.
+    Verified tokens are cached until their exp, capped at TOKEN_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, jwt_secret: str, jwks_url: str, max_entries: int, max_ttl: float):
+        self.jwt_secret = jwt_secret.encode() if jwt_secret else None
+        self.jwks_url = jwks_url
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.local_verifications = 0
+        self.remote_verifications = 0
+        self.cache_hits = 0
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._jwks: Dict[str, dict] = {}
+        self._jwks_fetched_at = 0.0
+
+    def _cache_key(self, token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[AuthUser]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return user
+
+    def _cache_put(self, key: str, user: AuthUser, exp: Optional[float]):
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._cache[key] = (user, expires_at)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    async def _get_jwk(self, kid: Optional[str]) -> dict:
+        stale = time.time() - self._jwks_fetched_at > settings.JWKS_CACHE_SECONDS
+        if kid not in self._jwks or stale:
+            # Refetch at most once per minute when a kid is unknown
+            if stale or time.time() - self._jwks_fetched_at > 60:
+                try:
+                    # A plain client: the JWKS host must not receive the service key
+                    async with httpx.AsyncClient(timeout=settings.SUPABASE_TIMEOUT_SECONDS) as client:
+                        response = await client.get(self.jwks_url)
+                    response.raise_for_status()
+                    self._jwks = {key.get("kid"): key for key in response.json().get("keys", [])}
+                    self._jwks_fetched_at = time.time()
+                except Exception as e:
+                    print(f"JWKS fetch error: {e}")
+        if kid not in self._jwks:
+            raise Undecided(f"Unknown signing key: {kid}")
+        return self._jwks[kid]
+
+    async def _verify_signature(self, header: dict, signing_input: bytes, signature: bytes):
+        alg = header.get("alg")
+
+        if alg == "HS256":
+            if self.jwt_secret is None:
+                raise Undecided("No JWT secret configured")
+            expected = hmac.new(self.jwt_secret, signing_input, hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, signature):
+                raise InvalidToken("Bad signature")
+            return
+
+        if alg not in ("RS256", "ES256") or not HAS_CRYPTOGRAPHY or not self.jwks_url:
+            raise Undecided(f"Can't verify {alg} locally")
+
+        jwk = await self._get_jwk(header.get("kid"))
+        try:
+            if alg == "RS256":
+                public_key = rsa.RSAPublicNumbers(_b64int(jwk["e"]), _b64int(jwk["n"])).public_key()
+                public_key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+            else:
+                public_key = ec.EllipticCurvePublicNumbers(
+                    _b64int(jwk["x"]), _b64int(jwk["y"]), ec.SECP256R1()
+                ).public_key()
+                r = int.from_bytes(signature[:32], "big")
+                s = int.from_bytes(signature[32:], "big")
+                public_key.verify(encode_dss_signature(r, s), signing_input, ec.ECDSA(hashes.SHA256()))
+        except InvalidSignature:
+            raise InvalidToken("Bad signature")
+        except (KeyError, ValueError) as e:
+            raise Undecided(f"Unusable signing key: {e}")
+
+    async def _verify_locally(self, token: str) -> dict:
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            claims = json.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature_segment)
+        except ValueError:
+            raise InvalidToken("Malformed token")
+
+        await self._verify_signature(
+            header,
+            f"{header_segment}.{payload_segment}".encode(),
+            signature
+        )
+
+        now = time.time()
+        if "exp" in claims and claims["exp"] <= now - settings.JWT_LEEWAY_SECONDS:
+            raise InvalidToken("Token expired")
+        if "nbf" in claims and claims["nbf"] > now + settings.JWT_LEEWAY_SECONDS:
+            raise InvalidToken("Token not yet valid")
+        audience = claims.get("aud")
+        audiences = audience if isinstance(audience, list) else [audience]
+        if "authenticated" not in audiences:
+            raise InvalidToken("Wrong audience")
+        if claims.get("role") != "authenticated" or not claims.get("sub"):
+            raise InvalidToken("Not a user token")
+        return claims
+
+    async def verify(self, token: str) -> AuthUser:
+        """Return the user for a token, or raise InvalidToken"""
+        key = self._cache_key(token)
+        user = self._cache_get(key)
+        if user is not None:
+            return user
+
+        try:
+            claims = await self._verify_locally(token)
+            user = AuthUser({"id": claims["sub"], "email": claims.get("email"), **claims})
+            self.local_verifications += 1
+            self._cache_put(key, user, claims.get("exp"))
+            return user
+        except Undecided as e:
+            print(f"Falling back to remote token check: {e}")
+
+        self.remote_verifications += 1
+        try:
+            user = await supabase_repo.get_user(token)
+        except Exception as e:
+            raise InvalidToken(str(e))
+
+        # Supabase accepted the token, so its exp claim can be trusted
+        try:
+            exp = json.loads(_b64decode(token.split(".")[1])).get("exp")
+        except (ValueError, IndexError):
+            exp = None
+        self._cache_put(key, user, exp)
+        return user
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cached_tokens": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "local_verifications": self.local_verifications,
+                "remote_verifications": self.remote_verifications
+            }
+
+
+token_verifier = TokenVerifier(
+    settings.SUPABASE_JWT_SECRET,
+    settings.SUPABASE_JWKS_URL or f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json",
+    settings.TOKEN_CACHE_SIZE,
+    settings.TOKEN_CACHE_TTL_SECONDS
+)
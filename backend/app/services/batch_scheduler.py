@@ -0,0 +1,232 @@
+import asyncio
+import math
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.metrics import observe_batch
+from app.services.model_registry import model_registry
+from app.services.neutts_service import get_neutts_service, SAMPLE_RATE
+from app.services.worker_pool import get_worker_pool
+
+# Called with (index, waveform or Exception) as each job of a group finishes
+ResultCallback = Callable[[int, object], None]
+# A runner takes [(text, ref_codes, ref_text), ...] and a ResultCallback and
+# returns one waveform or Exception per job
+BatchRunner = Callable[[List[Tuple[str, object, str]], ResultCallback], Awaitable[List[object]]]
+
+
+class GenerationJob:
+    def __init__(self, text: str, ref_codes, ref_text: str, future: asyncio.Future):
+        self.text = text
+        self.ref_codes = ref_codes
+        self.ref_text = ref_text
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class BatchScheduler:
+    """
+    Hands queued generation jobs to runner slots in small groups.
+
+    A group is sent as soon as a slot is free and either max_batch_size jobs
+    are queued or max_wait_ms has passed since the first one arrived, which
+    saves a dispatch per job. Queued jobs are split evenly over idle slots
+    first. Jobs in a group still run one after another (the backbone has no
+    batched decode), so each job resolves as soon as its own audio is ready
+    rather than when the group ends.
+    """
+
+    def __init__(
+        self,
+        runner: BatchRunner,
+        max_batch_size: int,
+        max_wait_ms: float,
+        concurrency: int = 1
+    ):
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.concurrency = max(1, concurrency)
+
+        self.jobs_submitted = 0
+        self.jobs_failed = 0
+        self.batches_run = 0
+        self.batch_sizes = Counter()
+        self.total_queue_wait = 0.0
+        self.in_flight_batches = 0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._batch_tasks = set()
+
+    def _ensure_started(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def submit(self, text: str, ref_codes, ref_text: str):
+        """Queue one generation and wait for its waveform"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self.jobs_submitted += 1
+        await self._queue.put(GenerationJob(text, ref_codes, ref_text, future))
+        return await future
+
+    async def _collect_batch(self) -> List[GenerationJob]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        # Spread a burst (e.g. the segments of one long text) over every idle
+        # slot instead of packing it onto one worker; the backbone runs jobs
+        # within a batch one after another
+        idle_slots = self.concurrency - self.in_flight_batches
+        batch_size = min(
+            self.max_batch_size,
+            max(1, math.ceil((len(batch) + self._queue.qsize()) / max(1, idle_slots)))
+        )
+
+        while len(batch) < batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Drop jobs whose callers went away while queued
+        return [job for job in batch if not job.future.done()]
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+
+            self.in_flight_batches += 1
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    def _resolve(self, job: GenerationJob, result):
+        if job.future.done():
+            return
+        if isinstance(result, Exception):
+            self.jobs_failed += 1
+            job.future.set_exception(result)
+        else:
+            job.future.set_result(result)
+
+    async def _run_batch(self, batch: List[GenerationJob]):
+        started = time.monotonic()
+        self.batches_run += 1
+        self.batch_sizes[len(batch)] += 1
+        waits = [started - job.enqueued_at for job in batch]
+        self.total_queue_wait += sum(waits)
+        observe_batch({"batch_queue_wait": waits})
+
+        try:
+            results = await self.runner(
+                [(job.text, job.ref_codes, job.ref_text) for job in batch],
+                lambda i, result: self._resolve(batch[i], result)
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self.in_flight_batches -= 1
+            self._slots.release()
+
+        # Anything the runner didn't report on its own
+        for job, result in zip(batch, results):
+            self._resolve(job, result)
+
+    def stats(self) -> dict:
+        jobs_batched = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "in_flight_batches": self.in_flight_batches,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "jobs_submitted": self.jobs_submitted,
+            "jobs_failed": self.jobs_failed,
+            "batches_run": self.batches_run,
+            "avg_batch_size": jobs_batched / self.batches_run if self.batches_run else 0,
+            "avg_queue_wait_ms": self.total_queue_wait / jobs_batched * 1000 if jobs_batched else 0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items()))
+        }
+
+
+# The in-process model is a single llama/codec instance, so groups run one
+# at a time on a dedicated thread
+_inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="neutts")
+
+async def run_batch_in_process(
+    jobs: List[Tuple[str, object, str]],
+    variant: Optional[str] = None,
+    on_result: Optional[ResultCallback] = None
+) -> List[object]:
+    """Run a group of jobs on the in-process NeuTTS model of a variant"""
+    loop = asyncio.get_running_loop()
+
+    def report(i: int, result):
+        if on_result is not None:
+            loop.call_soon_threadsafe(on_result, i, result)
+
+    def run():
+        timings = {}
+        return get_neutts_service(variant).generate_batch(jobs, timings, report), timings
+
+    results, timings = await loop.run_in_executor(_inference_executor, run)
+    observe_batch(timings)
+    return results
+
+
+def _variant_runner(run, variant: str) -> BatchRunner:
+    """Bind a runner to one variant and feed its speed back to the registry"""
+    async def runner(jobs: List[Tuple[str, object, str]], on_result: ResultCallback) -> List[object]:
+        started = time.perf_counter()
+        results = await run(jobs, variant, on_result)
+        audio_seconds = sum(
+            len(result) / SAMPLE_RATE for result in results if not isinstance(result, Exception)
+        )
+        model_registry.observe(variant, time.perf_counter() - started, audio_seconds)
+        return results
+    return runner
+
+
+# Batches only group jobs for the same model, so each variant has a scheduler
+_batch_schedulers: Dict[str, BatchScheduler] = {}
+
+def get_batch_scheduler(variant: Optional[str] = None) -> BatchScheduler:
+    variant = model_registry.get(variant).name
+    scheduler = _batch_schedulers.get(variant)
+    if scheduler is None:
+        pool = get_worker_pool()
+        if pool is not None:
+            # One group in flight per worker process
+            scheduler = BatchScheduler(
+                runner=_variant_runner(pool.run_batch, variant),
+                max_batch_size=settings.BATCH_MAX_SIZE,
+                max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+                concurrency=pool.size
+            )
+        else:
+            scheduler = BatchScheduler(
+                runner=_variant_runner(run_batch_in_process, variant),
+                max_batch_size=settings.BATCH_MAX_SIZE,
+                max_wait_ms=settings.BATCH_MAX_WAIT_MS
+            )
+        _batch_schedulers[variant] = scheduler
+    return scheduler
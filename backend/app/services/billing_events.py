@@ -0,0 +1,416 @@
+"""
+Stripe webhook event log.
+
+Events that failed BILLING_EVENT_MAX_ATTEMPTS times are dead-lettered and
+hold back their customer's later events. Inspect and release them with:
+
+    python -m app.services.billing_events list
+    python -m app.services.billing_events retry [event_id]
+    python -m app.services.billing_events skip <event_id>
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.config import settings
+from app.services import metrics
+from app.services.quota_service import quota_service
+from app.services.supabase_service import supabase_repo
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stripe_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    customer TEXT NOT NULL,
+    created INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    available_at REAL NOT NULL,
+    received_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stripe_events_pending_idx ON stripe_events (status, customer, created, seq);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id TEXT PRIMARY KEY,
+    customer_id TEXT,
+    subscription_id TEXT,
+    tier TEXT NOT NULL,
+    status TEXT NOT NULL,
+    current_period_end INTEGER,
+    cancel_at_period_end INTEGER,
+    event_created INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subscriptions_subscription_idx ON subscriptions (subscription_id);
+"""
+
+# Events that change a user's plan; everything else is acknowledged and dropped
+HANDLED_EVENTS = (
+    "checkout.session.completed",
+    "customer.subscription.updated",
+    "customer.subscription.deleted"
+)
+
+
+class BillingEvents:
+    """
+    Durable log of Stripe webhook events and the subscription state they build.
+
+    The webhook only appends the verified event and returns, keyed by the
+    Stripe event id so redelivered events are ignored. A single worker
+    applies events to Supabase in Stripe's created order per customer; a
+    customer whose oldest event keeps failing is retried with backoff
+    without holding up anyone else. After max_attempts the event is
+    dead-lettered as failed and the customer's later events wait until it
+    is retried or skipped, so they are never applied out of order. Applied
+    events also update a local subscription table that get_subscription
+    reads instead of Stripe, and are pruned once Stripe can no longer
+    redeliver them.
+
+    Like the job queue, all database access happens on one dedicated thread.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.applied = 0
+        self.duplicates = 0
+        self.failures = 0
+        self._pruned_at = 0.0
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="billing-events")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        if self._db is not None:
+            return
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # The acknowledgement promises the event is on disk
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(SCHEMA)
+
+    # Event log
+
+    def _insert(self, event: dict, payload: str) -> bool:
+        obj = event["data"]["object"]
+        now = time.time()
+        inserted = self._db.execute(
+            """INSERT OR IGNORE INTO stripe_events
+                   (id, type, customer, created, payload, status, available_at, received_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?)""",
+            (
+                event["id"],
+                event["type"],
+                obj.get("customer") or event["id"],
+                event["created"],
+                payload,
+                now, now, now
+            )
+        ).rowcount
+        return inserted > 0
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        # Oldest due event whose customer has nothing older pending or dead-lettered
+        return self._db.execute(
+            """SELECT * FROM stripe_events e
+               WHERE status = 'pending' AND available_at <= ?
+                 AND NOT EXISTS (
+                     SELECT 1 FROM stripe_events p
+                     WHERE p.customer = e.customer AND p.status IN ('pending', 'failed')
+                       AND (p.created < e.created OR (p.created = e.created AND p.seq < e.seq))
+                 )
+               ORDER BY created, seq
+               LIMIT 1""",
+            (time.time(),)
+        ).fetchone()
+
+    def _next_available_at(self) -> Optional[float]:
+        row = self._db.execute(
+            "SELECT MIN(available_at) FROM stripe_events WHERE status = 'pending'"
+        ).fetchone()
+        return row[0]
+
+    def _finish(self, event_id: str, status: str, error: Optional[str] = None, delay: float = 0):
+        now = time.time()
+        self._db.execute(
+            """UPDATE stripe_events
+               SET status = ?, error = ?, attempts = attempts + 1,
+                   available_at = ?, updated_at = ?
+               WHERE id = ?""",
+            (status, error, now + delay, now, event_id)
+        )
+
+    def _counts(self) -> dict:
+        rows = self._db.execute("SELECT status, COUNT(*) FROM stripe_events GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _count_failed(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM stripe_events WHERE status = 'failed'").fetchone()[0]
+
+    def _count_customers_on_hold(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(DISTINCT customer) FROM stripe_events WHERE status = 'failed'"
+        ).fetchone()[0]
+
+    def _list_failed(self) -> list:
+        rows = self._db.execute(
+            """SELECT id, type, customer, created, attempts, error FROM stripe_events
+               WHERE status = 'failed' ORDER BY created, seq"""
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _retry(self, event_id: Optional[str] = None) -> int:
+        """Put dead-lettered events (one, or all) back in the queue with fresh attempts"""
+        query = """UPDATE stripe_events
+                   SET status = 'pending', attempts = 0, error = NULL, available_at = ?, updated_at = ?
+                   WHERE status = 'failed'"""
+        now = time.time()
+        if event_id is None:
+            return self._db.execute(query, (now, now)).rowcount
+        return self._db.execute(query + " AND id = ?", (now, now, event_id)).rowcount
+
+    def _skip(self, event_id: str) -> int:
+        """Give up on a dead-lettered event for good, releasing its customer's later events"""
+        return self._db.execute(
+            "UPDATE stripe_events SET status = 'skipped', updated_at = ? WHERE status = 'failed' AND id = ?",
+            (time.time(), event_id)
+        ).rowcount
+
+    def _prune(self, cutoff: float) -> int:
+        # Stripe stops redelivering after its retry window, so older ids can't repeat
+        return self._db.execute(
+            "DELETE FROM stripe_events WHERE status IN ('applied', 'skipped') AND received_at < ?",
+            (cutoff,)
+        ).rowcount
+
+    async def record(self, event: dict, payload: bytes) -> bool:
+        """Append a verified event; False if this event id was already logged"""
+        await self._run(self._connect)
+        inserted = await self._run(self._insert, event, payload.decode())
+        if not inserted:
+            self.duplicates += 1
+            metrics.BILLING_EVENTS.labels("duplicate").inc()
+        elif self._wakeup is not None:
+            self._wakeup.set()
+        return inserted
+
+    # Subscription state
+
+    def _get_subscription(self, user_id: str) -> Optional[dict]:
+        row = self._db.execute("SELECT * FROM subscriptions WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _user_for_subscription(self, subscription_id: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT user_id FROM subscriptions WHERE subscription_id = ?", (subscription_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _put_subscription(self, user_id: str, values: dict, event_created: int = 0):
+        """Upsert a user's state unless it was already set by a newer event"""
+        values = {
+            "customer_id": None,
+            "subscription_id": None,
+            "current_period_end": None,
+            "cancel_at_period_end": None,
+            **values,
+            "user_id": user_id,
+            "event_created": event_created,
+            "updated_at": time.time()
+        }
+        self._db.execute(
+            """INSERT INTO subscriptions
+                   (user_id, customer_id, subscription_id, tier, status,
+                    current_period_end, cancel_at_period_end, event_created, updated_at)
+               VALUES (:user_id, :customer_id, :subscription_id, :tier, :status,
+                       :current_period_end, :cancel_at_period_end, :event_created, :updated_at)
+               ON CONFLICT (user_id) DO UPDATE SET
+                   customer_id = COALESCE(excluded.customer_id, customer_id),
+                   subscription_id = COALESCE(excluded.subscription_id, subscription_id),
+                   tier = excluded.tier,
+                   status = excluded.status,
+                   current_period_end = COALESCE(excluded.current_period_end, current_period_end),
+                   cancel_at_period_end = COALESCE(excluded.cancel_at_period_end, cancel_at_period_end),
+                   event_created = MAX(event_created, excluded.event_created),
+                   updated_at = excluded.updated_at
+               WHERE excluded.event_created >= event_created""",
+            values
+        )
+
+    async def get_subscription(self, user_id: str) -> Optional[dict]:
+        """Cached subscription state, None if missing, older than the TTL or incomplete"""
+        await self._run(self._connect)
+        state = await self._run(self._get_subscription, user_id)
+        if state is None or time.time() - state["updated_at"] > settings.SUBSCRIPTION_CACHE_SECONDS:
+            return None
+        # Checkout sessions don't carry the billing period; read it from Stripe once
+        if state["tier"] == "pro" and state["current_period_end"] is None:
+            return None
+        return state
+
+    async def put_subscription(self, user_id: str, values: dict):
+        """Store state read from Stripe just now; events created before it won't undo it"""
+        await self._run(self._put_subscription, user_id, values, int(time.time()))
+
+    # Applying events
+
+    async def _apply(self, event: dict):
+        """Apply one event; every write sets state, so replaying it is harmless"""
+        obj = event["data"]["object"]
+        created = event["created"]
+
+        if event["type"] == "checkout.session.completed":
+            user_id = obj["client_reference_id"]
+            # Upgrade user to Pro
+            await supabase_repo.update_profile(user_id, {
+                "tier": "pro",
+                "generations_limit": settings.PRO_TIER_LIMIT,
+                "stripe_customer_id": obj["customer"],
+                "stripe_subscription_id": obj["subscription"]
+            })
+            await self._run(self._put_subscription, user_id, {
+                "customer_id": obj["customer"],
+                "subscription_id": obj["subscription"],
+                "tier": "pro",
+                "status": "active"
+            }, created)
+            quota_service.invalidate(user_id)
+
+        elif event["type"] in ("customer.subscription.updated", "customer.subscription.deleted"):
+            active = obj["status"] == "active"
+            if not active:
+                # Downgrade to free
+                await supabase_repo.update_profile_by_subscription(obj["id"], {
+                    "tier": "free",
+                    "generations_limit": settings.FREE_TIER_LIMIT
+                })
+            user_id = await self._run(self._user_for_subscription, obj["id"])
+            if user_id is not None:
+                await self._run(self._put_subscription, user_id, {
+                    "customer_id": obj.get("customer"),
+                    "subscription_id": obj["id"],
+                    "tier": "pro" if active else "free",
+                    "status": obj["status"] if active else "free",
+                    "current_period_end": obj.get("current_period_end"),
+                    "cancel_at_period_end": obj.get("cancel_at_period_end")
+                }, created)
+                quota_service.invalidate(user_id)
+
+    async def _housekeep(self):
+        """Prune old events and refresh the dead-letter gauge (retries may come from the CLI)"""
+        metrics.BILLING_EVENTS_FAILED.set(await self._run(self._count_failed))
+        if time.time() - self._pruned_at < 3600:
+            return
+        self._pruned_at = time.time()
+        pruned = await self._run(self._prune, time.time() - settings.BILLING_EVENT_RETENTION_SECONDS)
+        if pruned:
+            print(f"Pruned {pruned} old Stripe events")
+
+    async def retry_failed(self, event_id: Optional[str] = None) -> int:
+        """Requeue dead-lettered events; returns how many"""
+        await self._run(self._connect)
+        retried = await self._run(self._retry, event_id)
+        if retried and self._wakeup is not None:
+            self._wakeup.set()
+        return retried
+
+    async def _work(self):
+        while True:
+            row = await self._run(self._claim)
+            if row is None:
+                await self._housekeep()
+                next_at = await self._run(self._next_available_at)
+                timeout = settings.BILLING_EVENT_POLL_INTERVAL
+                if next_at is not None:
+                    timeout = min(timeout, max(0.0, next_at - time.time()))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                if row["type"] in HANDLED_EVENTS:
+                    await self._apply(json.loads(row["payload"]))
+                await self._run(self._finish, row["id"], "applied")
+                self.applied += 1
+                metrics.BILLING_EVENTS.labels("applied").inc()
+            except Exception as e:
+                attempts = row["attempts"] + 1
+                if attempts >= self.max_attempts:
+                    print(
+                        f"❌ Stripe event {row['id']} ({row['type']}) failed and is dead-lettered, "
+                        f"customer {row['customer']} is on hold until it is retried or skipped: {e}"
+                    )
+                    self.failures += 1
+                    metrics.BILLING_EVENTS.labels("failed").inc()
+                    await self._run(self._finish, row["id"], "failed", str(e))
+                    metrics.BILLING_EVENTS_FAILED.set(await self._run(self._count_failed))
+                else:
+                    delay = settings.BILLING_EVENT_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                    print(f"Stripe event {row['id']} error, retrying in {delay}s: {e}")
+                    metrics.BILLING_EVENTS.labels("retried").inc()
+                    await self._run(self._finish, row["id"], "pending", str(e), delay)
+
+    async def start(self):
+        await self._run(self._connect)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._work())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+
+    async def stats(self) -> dict:
+        if self._db is None:
+            return {}
+        return {
+            "events": await self._run(self._counts),
+            "customers_on_hold": await self._run(self._count_customers_on_hold),
+            "applied": self.applied,
+            "duplicates": self.duplicates,
+            "failures": self.failures
+        }
+
+
+billing_events = BillingEvents(
+    settings.BILLING_EVENTS_PATH,
+    settings.BILLING_EVENT_MAX_ATTEMPTS
+)
+
+
+if __name__ == "__main__":
+    # Works on the database directly; a running worker picks retried events up
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    event_id = sys.argv[2] if len(sys.argv) > 2 else None
+    billing_events._connect()
+    if command == "list":
+        print(json.dumps(billing_events._list_failed(), indent=2))
+    elif command == "retry":
+        print(f"Requeued {billing_events._retry(event_id)} events")
+    elif command == "skip" and event_id:
+        print(f"Skipped {billing_events._skip(event_id)} events")
+    else:
+        sys.exit(__doc__)
@@ -0,0 +1,195 @@
+"""
+Pick the worker/thread layout that gets the most audio out of this host.
+
+With CPU_AUTOTUNE (and no layout saved for this host and config yet) it
+runs in the background while the server starts and serves on the
+configured layout; the result is saved and used from the next start, since
+the pool size is fixed once it runs. Measurements made next to live
+traffic are noisier, so for a clean result run it by hand before deploying:
+
+    python -m app.services.cpu_autotune
+"""
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+from typing import List, Optional, Tuple
+
+from app.config import settings
+from app.services.cpu_layout import (
+    CpuLayout,
+    apply_thread_settings,
+    available_cpus,
+    build_layout,
+    get_layout,
+    host_fingerprint,
+    set_layout
+)
+from app.services.neutts_service import BACKEND_DIR
+
+SAMPLE = BACKEND_DIR / "samples" / "dave.wav"
+TRANSCRIPT = BACKEND_DIR / "samples" / "dave.txt"
+TEXT = (
+    "Every morning the harbour fills with small boats heading out to sea. "
+    "She checked the forecast twice before deciding to take the long route home."
+)
+
+
+def candidate_layouts(cpu_count: int) -> List[Tuple[int, int]]:
+    """(workers, threads) pairs that split the cores evenly, down to 2 threads each"""
+    candidates = []
+    workers = 1
+    while workers == 1 or cpu_count // workers >= 2:
+        candidates.append((workers, max(1, cpu_count // workers)))
+        workers *= 2
+    return candidates
+
+
+def _bench_worker(cpus: List[int], threads: int, requests: int, start, results: mp.Queue):
+    """Child process: load the model with the layout's settings and time generations"""
+    try:
+        apply_thread_settings(threads, cpus)
+        from app.services.neutts_service import NeuTTSService, SAMPLE_RATE
+
+        service = NeuTTSService()
+        if service.tts is None:
+            raise Exception("NeuTTS failed to load")
+        ref_codes = service.encode_reference(str(SAMPLE))
+        ref_text = TRANSCRIPT.read_text().strip()
+        # Warm, then start together with the other workers
+        service.generate_batch([(TEXT, ref_codes, ref_text)])
+        start.wait()
+
+        audio_seconds = 0.0
+        started = time.perf_counter()
+        for _ in range(requests):
+            wav = service.generate_batch([(TEXT, ref_codes, ref_text)])[0]
+            if isinstance(wav, Exception):
+                raise wav
+            audio_seconds += len(wav) / SAMPLE_RATE
+        results.put(("ok", time.perf_counter() - started, audio_seconds))
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}", 0.0))
+
+
+def measure_layout(layout: CpuLayout, requests: int) -> dict:
+    """Run one candidate layout; every worker generates the same text concurrently"""
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    start = ctx.Barrier(layout.workers)
+    processes = [
+        ctx.Process(
+            target=_bench_worker,
+            args=(layout.cpus_for(i), layout.threads, requests, start, results),
+            daemon=True
+        )
+        for i in range(layout.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    outcomes = []
+    while len(outcomes) < layout.workers:
+        try:
+            outcome = results.get(timeout=5)
+        except queue.Empty:
+            if sum(1 for process in processes if not process.is_alive()) > len(outcomes):
+                # A worker died without reporting; don't leave the rest at the barrier
+                start.abort()
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        outcomes.append(outcome)
+        if outcome[0] == "error":
+            start.abort()
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+    errors = [detail for status, detail, _ in outcomes if status == "error"]
+    if errors or len(outcomes) < layout.workers:
+        return {"workers": layout.workers, "threads": layout.threads, "error": errors[0] if errors else "worker died"}
+
+    elapsed = max(seconds for _, seconds, _ in outcomes)
+    audio_seconds = sum(audio for _, _, audio in outcomes)
+    return {
+        "workers": layout.workers,
+        "threads": layout.threads,
+        "rtf": round(max(seconds / audio for _, seconds, audio in outcomes), 3),
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 3)
+    }
+
+
+def autotune(apply: bool = True) -> CpuLayout:
+    """Measure every candidate, save the best and (with apply) make it the current layout"""
+    cpus = available_cpus()
+    measurements = []
+    for workers, threads in candidate_layouts(len(cpus)):
+        layout = build_layout(workers, threads, source="autotune")
+        print(f"🔧 Autotune: {workers} workers x {threads} threads...")
+        measurement = measure_layout(layout, settings.CPU_AUTOTUNE_REQUESTS)
+        print(f"🔧 Autotune: {measurement}")
+        measurements.append(measurement)
+
+    measured = [m for m in measurements if "error" not in m]
+    if not measured:
+        raise Exception("Autotune could not measure any layout")
+    # Most audio per second among layouts whose workers keep up with real time
+    fast_enough = [m for m in measured if m["rtf"] <= settings.CPU_AUTOTUNE_MAX_RTF] or measured
+    best = max(fast_enough, key=lambda m: m["audio_seconds_per_second"])
+
+    os.makedirs(os.path.dirname(settings.CPU_AUTOTUNE_PATH), exist_ok=True)
+    with open(settings.CPU_AUTOTUNE_PATH, "w") as f:
+        json.dump({
+            "fingerprint": host_fingerprint(),
+            "measurements": measurements,
+            "best": {"workers": best["workers"], "threads": best["threads"]}
+        }, f, indent=2)
+
+    layout = build_layout(best["workers"], best["threads"], source="autotune")
+    if apply:
+        set_layout(layout)
+    print(f"✅ Autotune picked {layout.workers} workers x {layout.threads} threads")
+    return layout
+
+
+_task: Optional[asyncio.Task] = None
+_status = {"state": "off"}
+
+
+async def _autotune_in_background():
+    _status["state"] = "running"
+    loop = asyncio.get_running_loop()
+    try:
+        layout = await loop.run_in_executor(None, autotune, False)
+    except Exception as e:
+        print(f"❌ Autotune failed, keeping configured layout: {e}")
+        _status.update(state="failed", error=str(e))
+        return
+    print("Autotuned layout saved, it takes effect on the next start")
+    _status.update(state="saved", workers=layout.workers, threads=layout.threads)
+
+
+def start_autotune():
+    """Autotune in the background unless this host already was; never delays startup"""
+    global _task
+    if not settings.CPU_AUTOTUNE or get_layout().source == "autotune" or _task is not None:
+        return
+    _task = asyncio.create_task(_autotune_in_background())
+
+
+def stop_autotune():
+    # Benchmark processes are daemons and go down with the server
+    if _task is not None:
+        _task.cancel()
+
+
+def autotune_status() -> dict:
+    return dict(_status)
+
+
+if __name__ == "__main__":
+    print(json.dumps(autotune().stats(), indent=2))
@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import settings
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+class CpuLayout:
+    """
+    How inference uses the host's cores.
+
+    workers is the number of model processes (0 runs the model in the API
+    process), threads the torch and llama.cpp thread count of each (0 keeps
+    the library defaults) and cpu_sets the cores each worker is pinned to
+    (empty when pinning is off).
+    """
+
+    def __init__(self, workers: int, threads: int, cpu_sets: List[List[int]], source: str):
+        self.workers = workers
+        self.threads = threads
+        self.cpu_sets = cpu_sets
+        self.source = source
+
+    def cpus_for(self, worker_id: int) -> List[int]:
+        return self.cpu_sets[worker_id] if worker_id < len(self.cpu_sets) else []
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "threads": self.threads,
+            "cpu_sets": self.cpu_sets,
+            "source": self.source
+        }
+
+
+def available_cpus() -> List[int]:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _parse_cpulist(text: str) -> List[int]:
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def numa_nodes() -> List[List[int]]:
+    """Available cores grouped by NUMA node (Linux), one group elsewhere"""
+    allowed = set(available_cpus())
+    nodes = []
+    for path in sorted(Path("/sys/devices/system/node").glob("node[0-9]*/cpulist")):
+        try:
+            cpus = [cpu for cpu in _parse_cpulist(path.read_text()) if cpu in allowed]
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [sorted(allowed)]
+
+
+def assign_cpus(workers: int, threads: int, numa_aware: bool) -> List[List[int]]:
+    """
+    Give each worker `threads` cores.
+
+    With numa_aware, workers are spread round-robin over NUMA nodes and
+    each stays inside its node, so its memory is local. Cores are reused
+    only when there are more threads than cores.
+    """
+    nodes = numa_nodes() if numa_aware else [available_cpus()]
+    offsets = [0] * len(nodes)
+    cpu_sets = []
+    for worker_id in range(workers):
+        index = worker_id % len(nodes)
+        node = nodes[index]
+        start = offsets[index]
+        cpu_sets.append(sorted({node[(start + k) % len(node)] for k in range(threads)}))
+        offsets[index] += threads
+    return cpu_sets
+
+
+def build_layout(workers: int, threads: int = 0, source: str = "settings") -> CpuLayout:
+    """Layout for a worker count, splitting the cores evenly when threads is 0"""
+    cpus = available_cpus()
+    if threads <= 0 and workers > 0:
+        # An equal share per worker so processes don't oversubscribe cores
+        threads = max(1, len(cpus) // workers)
+    cpu_sets = []
+    if settings.CPU_PIN_WORKERS and workers > 0:
+        cpu_sets = assign_cpus(workers, threads, settings.CPU_NUMA_AWARE)
+    return CpuLayout(workers, threads, cpu_sets, source)
+
+
+def apply_thread_settings(threads: int, cpus: Optional[List[int]] = None):
+    """
+    Pin this process and cap its math libraries' threads.
+
+    Call before torch is imported so the OpenMP pools start at the right
+    size; torch is adjusted directly too in case it already was.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if threads <= 0:
+        return
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+
+def host_fingerprint() -> dict:
+    """What an autotuned layout depends on; a change invalidates it"""
+    return {
+        "cpus": available_cpus(),
+        "model_variants": settings.MODEL_VARIANTS,
+        "pin": settings.CPU_PIN_WORKERS,
+        "numa": settings.CPU_NUMA_AWARE
+    }
+
+
+def load_tuned_layout() -> Optional[CpuLayout]:
+    """The autotuner's saved choice, if it was made on this host and config"""
+    try:
+        with open(settings.CPU_AUTOTUNE_PATH) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if saved.get("fingerprint") != host_fingerprint():
+        return None
+    best = saved["best"]
+    return build_layout(best["workers"], best["threads"], source="autotune")
+
+
+_layout: Optional[CpuLayout] = None
+
+def get_layout() -> CpuLayout:
+    global _layout
+    if _layout is None:
+        tuned = load_tuned_layout() if settings.CPU_AUTOTUNE else None
+        _layout = tuned or build_layout(settings.WORKER_PROCESSES, settings.WORKER_THREADS)
+    return _layout
+
+def set_layout(layout: CpuLayout):
+    global _layout
+    _layout = layout
@@ -0,0 +1,164 @@
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from app.config import settings
+from app.services.admission import get_admission_controller
+from app.services.metrics import span
+from app.services.model_registry import model_registry
+from app.services.neutts_service import get_neutts_service, SAMPLE_RATE
+from app.services.quota_service import quota_service
+from app.services.reference_cache import reference_cache
+from app.services.sample_cache import sample_cache
+from app.services.supabase_service import supabase_repo
+from app.services.synthesis import synthesize
+from app.services.worker_pool import get_worker_pool
+from app.utils.audio_utils import OUTPUT_FORMATS, encode_audio
+
+async def load_reference_codes(voice: dict):
+    """Return (audio_hash, ref_codes) for a voice, encoding it on a cache miss"""
+    # Warm requests reuse cached reference codes and skip the download;
+    # only the in-memory hit runs on the event loop
+    cached_reference = reference_cache.get_cached(voice["id"])
+    loop = asyncio.get_running_loop()
+    if cached_reference is None:
+        cached_reference = await loop.run_in_executor(None, reference_cache.load, voice["id"])
+    if cached_reference is not None:
+        return cached_reference
+    
+    # Fetch voice sample through the local blob cache
+    async def download_sample():
+        print(f"Downloading voice sample: {voice['storage_path']}")
+        with span("sample_download"):
+            return await supabase_repo.download("voice-samples", voice["storage_path"])
+    
+    sample_path, audio_hash = await sample_cache.get(
+        voice["storage_path"],
+        download_sample
+    )
+    
+    pool = get_worker_pool()
+    with span("reference_encode"):
+        if pool is not None:
+            import torch
+            ref_codes = torch.from_numpy(await pool.encode_reference(str(sample_path)))
+        else:
+            ref_codes = await loop.run_in_executor(
+                None,
+                get_neutts_service().encode_reference,
+                str(sample_path)
+            )
+    
+    await loop.run_in_executor(None, reference_cache.put, voice["id"], audio_hash, ref_codes)
+    return audio_hash, ref_codes
+
+async def encode_generation(
+    wav,
+    output_format: Optional[str] = None,
+    sample_rate: Optional[int] = None
+) -> bytes:
+    """Encode generated audio off the event loop, in the configured format by default"""
+    loop = asyncio.get_running_loop()
+    with span("encode"):
+        return await loop.run_in_executor(
+            None,
+            encode_audio,
+            wav,
+            SAMPLE_RATE,
+            output_format or settings.OUTPUT_FORMAT,
+            sample_rate or settings.OUTPUT_SAMPLE_RATE
+        )
+
+def generation_storage_path(user_id: str, generation_id: str, output_format: Optional[str] = None) -> str:
+    output = OUTPUT_FORMATS[output_format or settings.OUTPUT_FORMAT]
+    return f"{user_id}/generations/{generation_id}.{output['extension']}"
+
+async def upload_generation(
+    user_id: str,
+    generation_id: str,
+    audio_data: bytes,
+    output_format: Optional[str] = None
+) -> str:
+    """Upload generated audio; returns storage path"""
+    output = OUTPUT_FORMATS[output_format or settings.OUTPUT_FORMAT]
+    storage_path = generation_storage_path(user_id, generation_id, output_format)
+    
+    print(f"Uploading generated audio: {storage_path}")
+    # Idempotent per generation_id so retries are safe
+    with span("upload"):
+        await supabase_repo.upload(
+            "generated-audio", storage_path, audio_data, output["content_type"], upsert=True
+        )
+    return storage_path
+
+def generation_record(user_id: str, voice_id: str, text: str, generation_id: str, storage_path: str) -> dict:
+    return {
+        "id": generation_id,
+        "user_id": user_id,
+        "voice_id": voice_id,
+        "text": text,
+        "storage_path": storage_path,
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+async def save_generation(
+    user_id: str,
+    voice_id: str,
+    text: str,
+    generation_id: str,
+    audio_data: bytes,
+    output_format: Optional[str] = None
+) -> str:
+    """Upload generated audio and record it; returns storage path"""
+    storage_path = await upload_generation(user_id, generation_id, audio_data, output_format)
+    
+    # Save generation record
+    with span("db_insert"):
+        await supabase_repo.insert_generation(
+            generation_record(user_id, voice_id, text, generation_id, storage_path)
+        )
+    
+    return storage_path
+
+class JobFailed(Exception):
+    """Permanent job failure that should not be retried"""
+
+async def run_generation_job(job: dict, report_progress: Callable[[float], Awaitable[None]]) -> dict:
+    """Run a queued generation end to end and return its result"""
+    voice = await supabase_repo.get_voice(job["voice_id"], job["user_id"])
+    if voice is None:
+        raise JobFailed("Voice not found")
+    
+    reservation = await quota_service.reserve(job["user_id"])
+    try:
+        # Background jobs queue for a slot rather than being turned away
+        admission = get_admission_controller()
+        ticket = await admission.acquire(job["text"], reservation.tier, fail_fast=False)
+        try:
+            audio_hash, ref_codes = await load_reference_codes(voice)
+            await report_progress(0.1)
+            
+            async def on_segment(fraction: float):
+                await report_progress(0.1 + 0.8 * fraction)
+            
+            variant = model_registry.select(reservation.tier, job["text"])
+            with span("synthesize"):
+                wav = await synthesize(job["text"], ref_codes, audio_hash, on_segment, variant.name, ticket.add_audio)
+        finally:
+            admission.release(ticket)
+        audio_data = await encode_generation(wav)
+        
+        # The job id doubles as the generation id, keeping retries idempotent
+        storage_path = await save_generation(
+            job["user_id"], job["voice_id"], job["text"], job["id"], audio_data
+        )
+        quota_service.commit(reservation)
+    except BaseException:
+        quota_service.refund(reservation)
+        raise
+    
+    return {
+        "generation_id": job["id"],
+        "download_url": supabase_repo.public_url("generated-audio", storage_path),
+        "generations_remaining": reservation.quota.remaining
+    }
@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.services.metrics import span
+from app.services.quota_service import quota_service
+from app.services.supabase_service import supabase_repo
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_generations (
+    id TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    audio_path TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    uploaded INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class PendingGeneration:
+    def __init__(self, record: dict, audio_path: Path, content_type: str, uploaded: bool = False, attempts: int = 0):
+        self.record = record
+        self.audio_path = audio_path
+        self.content_type = content_type
+        self.uploaded = uploaded
+        self.attempts = attempts
+        self.next_attempt = 0.0
+
+
+class GenerationWriter:
+    """
+    Persists generated audio after the response has gone out.
+
+    Audio is written to a short-lived local cache that serves downloads
+    right away. A background loop uploads it to storage and inserts the
+    generation rows from every request since the last flush in a single
+    statement. Writes are keyed by generation_id, so resubmitting or
+    retrying one never duplicates it.
+
+    The user has already been charged and given a URL, so a generation is
+    never given up on: each one is logged in SQLite until its row is in,
+    replayed on start, and retried with backoff capped at
+    WRITER_MAX_BACKOFF_SECONDS. Only a generation whose local audio is gone
+    before it was uploaded is dropped, with its quota unit given back.
+    """
+
+    def __init__(self, cache_dir: Path, db_path: str, ttl_seconds: float, max_attempts: int):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+        self.written = 0
+        self.retries = 0
+        self.failures = 0
+        self.flushes = 0
+        self.replayed = 0
+        self._pending: Dict[str, PendingGeneration] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="generation-writer")
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        if self._db is not None:
+            return
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def _log(self, item: PendingGeneration):
+        now = time.time()
+        self._db.execute(
+            """INSERT OR IGNORE INTO pending_generations
+                   (id, record, audio_path, content_type, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (item.record["id"], json.dumps(item.record), str(item.audio_path), item.content_type, now, now)
+        )
+
+    def _mark_failed(self, generation_ids: List[str], error: str):
+        now = time.time()
+        self._db.executemany(
+            "UPDATE pending_generations SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+            [(error, now, generation_id) for generation_id in generation_ids]
+        )
+
+    def _save_progress(self, written: List[str], retried: List[PendingGeneration]):
+        """Drop written generations and record upload state and attempts of the rest"""
+        now = time.time()
+        self._db.execute("BEGIN")
+        self._db.executemany(
+            "DELETE FROM pending_generations WHERE id = ?",
+            [(generation_id,) for generation_id in written]
+        )
+        self._db.executemany(
+            "UPDATE pending_generations SET uploaded = ?, attempts = ?, updated_at = ? WHERE id = ?",
+            [(int(item.uploaded), item.attempts, now, item.record["id"]) for item in retried]
+        )
+        self._db.execute("COMMIT")
+
+    def _load(self) -> List[sqlite3.Row]:
+        return self._db.execute(
+            "SELECT * FROM pending_generations WHERE status = 'pending' ORDER BY created_at"
+        ).fetchall()
+
+    def _audio_path(self, storage_path: str) -> Path:
+        key = hashlib.sha256(storage_path.encode()).hexdigest()
+        return self.cache_dir / f"{key}{Path(storage_path).suffix}"
+
+    def cached_path(self, storage_path: str) -> Optional[Path]:
+        """Local copy of a generation while it is still fresh"""
+        path = self._audio_path(storage_path)
+        try:
+            age = time.time() - path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if age > self.ttl_seconds and not self._is_pending(path):
+            return None
+        return path
+
+    def _is_pending(self, path: Path) -> bool:
+        return any(item.audio_path == path for item in self._pending.values())
+
+    def _write_file(self, path: Path, data: bytes):
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+    async def submit(self, record: dict, audio_data: bytes, content_type: str):
+        """Cache the audio locally and log its upload and row insert"""
+        if record["id"] in self._pending:
+            return
+        path = self._audio_path(record["storage_path"])
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_file, path, audio_data)
+        item = PendingGeneration(record, path, content_type)
+        await self._run(self._connect)
+        await self._run(self._log, item)
+        self._pending[record["id"]] = item
+
+    async def _replay(self):
+        """Requeue generations a previous process accepted but didn't finish"""
+        lost = []
+        for row in await self._run(self._load):
+            record = json.loads(row["record"])
+            if record["id"] in self._pending:
+                continue
+            audio_path = Path(row["audio_path"])
+            if not row["uploaded"] and not audio_path.exists():
+                lost.append(record)
+                continue
+            self._pending[record["id"]] = PendingGeneration(
+                record, audio_path, row["content_type"], bool(row["uploaded"]), row["attempts"]
+            )
+            self.replayed += 1
+        for record in lost:
+            print(f"❌ Audio for generation {record['id']} is gone, refunding its quota")
+            quota_service.uncommit(record["user_id"])
+            self.failures += 1
+        if lost:
+            await self._run(self._mark_failed, [record["id"] for record in lost], "audio lost")
+        if self.replayed:
+            print(f"Replaying {self.replayed} unsaved generations")
+
+    async def _upload(self, item: PendingGeneration, semaphore: asyncio.Semaphore):
+        if item.uploaded:
+            return
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            data = await loop.run_in_executor(None, item.audio_path.read_bytes)
+            with span("upload"):
+                await supabase_repo.upload(
+                    "generated-audio", item.record["storage_path"], data, item.content_type, upsert=True
+                )
+        item.uploaded = True
+
+    def _retry_later(self, item: PendingGeneration, error: Exception):
+        item.attempts += 1
+        if item.attempts == self.max_attempts:
+            print(f"❌ Generation {item.record['id']} still not saved after {item.attempts} attempts, will keep retrying: {error}")
+        item.next_attempt = time.monotonic() + min(settings.WRITER_MAX_BACKOFF_SECONDS, 2 ** item.attempts)
+        self.retries += 1
+
+    async def _write_batch(self, batch: List[PendingGeneration]):
+        semaphore = asyncio.Semaphore(settings.BATCH_UPLOAD_CONCURRENCY)
+        results = await asyncio.gather(
+            *[self._upload(item, semaphore) for item in batch],
+            return_exceptions=True
+        )
+        for item, result in zip(batch, results):
+            if isinstance(result, Exception):
+                self._retry_later(item, result)
+
+        # One insert for every uploaded generation; re-inserting an id is a no-op
+        uploaded = [item for item in batch if item.uploaded]
+        if uploaded:
+            try:
+                with span("db_insert"):
+                    await supabase_repo.insert_generations([item.record for item in uploaded])
+            except Exception as e:
+                for item in uploaded:
+                    self._retry_later(item, e)
+                uploaded = []
+        for item in uploaded:
+            self._pending.pop(item.record["id"], None)
+        self.written += len(uploaded)
+
+        written = {item.record["id"] for item in uploaded}
+        retried = [item for item in batch if item.record["id"] not in written]
+        await self._run(self._save_progress, list(written), retried)
+
+    async def flush(self, force: bool = False):
+        """Write everything due (or everything, when forced)"""
+        async with self._flush_lock:
+            now = time.monotonic()
+            due = [
+                item for item in self._pending.values()
+                if force or item.next_attempt <= now
+            ]
+            for start in range(0, len(due), settings.WRITER_BATCH_SIZE):
+                await self._write_batch(due[start:start + settings.WRITER_BATCH_SIZE])
+            if due:
+                self.flushes += 1
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        pending = {item.audio_path for item in self._pending.values()}
+        for path in self.cache_dir.iterdir():
+            try:
+                if path not in pending and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(settings.WRITER_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+                await loop.run_in_executor(None, self._purge_expired)
+            except Exception as e:
+                print(f"Generation writer error: {e}")
+
+    async def start(self):
+        await self._run(self._connect)
+        await self._replay()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        try:
+            await self.flush(force=True)
+        except Exception as e:
+            print(f"Generation writer error: {e}")
+        # Anything left stays logged and is replayed on the next start
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "stuck": sum(1 for item in self._pending.values() if item.attempts >= self.max_attempts),
+            "written": self.written,
+            "replayed": self.replayed,
+            "retries": self.retries,
+            "failures": self.failures,
+            "flushes": self.flushes
+        }
+
+
+generation_writer = GenerationWriter(
+    Path(settings.WRITER_AUDIO_DIR),
+    settings.WRITER_QUEUE_PATH,
+    settings.OUTPUT_CACHE_SECONDS,
+    settings.WRITER_MAX_ATTEMPTS
+)
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional
+
+from app.config import settings
+from app.services.supabase_service import is_transient_error
+from app.services.worker_pool import WorkersUnavailable
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+# Lower runs first
+TIER_PRIORITY = {"pro": 0, "free": 10}
+
+JobHandler = Callable[[dict, Callable[[float], Awaitable[None]]], Awaitable[dict]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    voice_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result TEXT,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue_idx ON jobs (status, priority, available_at, created_at);
+CREATE INDEX IF NOT EXISTS jobs_user_idx ON jobs (user_id, created_at);
+"""
+
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    """
+    Durable SQLite-backed queue for long generations.
+
+    All database access happens on one dedicated thread, so the connection is
+    never shared. Jobs are claimed in (priority, created_at) order. Jobs left
+    running by a crashed process are requeued on start, and transient storage
+    errors are retried with exponential backoff.
+    """
+
+    def __init__(self, db_path: str, workers: int, max_attempts: int):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        recovered = self._db.execute(
+            "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+            (time.time(),)
+        ).rowcount
+        if recovered:
+            print(f"Requeued {recovered} interrupted jobs")
+
+    def _insert(self, job: dict):
+        self._db.execute(
+            """INSERT INTO jobs (id, user_id, voice_id, text, priority, status,
+                                 available_at, created_at, updated_at)
+               VALUES (:id, :user_id, :voice_id, :text, :priority, 'queued',
+                       :created_at, :created_at, :created_at)""",
+            job
+        )
+
+    def _get(self, job_id: str) -> Optional[dict]:
+        row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def _claim(self) -> Optional[dict]:
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                """SELECT * FROM jobs
+                   WHERE status = 'queued' AND available_at <= ?
+                   ORDER BY priority, created_at
+                   LIMIT 1""",
+                (now,)
+            ).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+            self._db.execute(
+                """UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                                  progress = 0, updated_at = ?
+                   WHERE id = ?""",
+                (now, row["id"])
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        job = _row_to_job(row)
+        job["attempts"] += 1
+        return job
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = :{name}" for name in fields)
+        self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = :id", {**fields, "id": job_id})
+
+    def _next_available_at(self) -> Optional[float]:
+        row = self._db.execute(
+            "SELECT MIN(available_at) FROM jobs WHERE status = 'queued'"
+        ).fetchone()
+        return row[0]
+
+    def _queue_depth(self) -> dict:
+        rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    async def submit(self, user_id: str, voice_id: str, text: str, tier: str) -> dict:
+        """Queue a generation job and return it"""
+        job = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "voice_id": voice_id,
+            "text": text,
+            "priority": TIER_PRIORITY.get(tier, TIER_PRIORITY["free"]),
+            "created_at": time.time()
+        }
+        await self._run(self._insert, job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job["id"])
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self._run(self._get, job_id)
+
+    async def set_progress(self, job_id: str, progress: float):
+        await self._run(lambda: self._update(job_id, progress=round(progress, 3)))
+
+    async def _work(self, handler: JobHandler):
+        while True:
+            job = await self._run(self._claim)
+            if job is None:
+                # Sleep until a submit or the next retry comes due
+                next_at = await self._run(self._next_available_at)
+                timeout = settings.JOB_POLL_INTERVAL
+                if next_at is not None:
+                    timeout = min(timeout, max(0.0, next_at - time.time()))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            print(f"Running job {job['id']} (attempt {job['attempts']})")
+
+            async def report_progress(progress: float, job_id=job["id"]):
+                await self.set_progress(job_id, progress)
+
+            try:
+                result = await handler(job, report_progress)
+                await self._run(lambda: self._update(
+                    job["id"], status="succeeded", progress=1.0,
+                    result=json.dumps(result), error=None
+                ))
+                print(f"Job {job['id']} succeeded")
+            except Exception as e:
+                retryable = is_transient_error(e) or isinstance(e, WorkersUnavailable)
+                if retryable and job["attempts"] < self.max_attempts:
+                    delay = settings.JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+                    print(f"Job {job['id']} transient error, retrying in {delay}s: {e}")
+                    await self._run(lambda: self._update(
+                        job["id"], status="queued", error=str(e),
+                        available_at=time.time() + delay
+                    ))
+                else:
+                    print(f"Job {job['id']} failed: {e}")
+                    await self._run(lambda: self._update(job["id"], status="failed", error=str(e)))
+
+    async def start(self, handler: JobHandler):
+        await self._run(self._connect)
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._work(handler))
+            for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+
+    async def stats(self) -> dict:
+        if self._db is None:
+            return {}
+        return await self._run(self._queue_depth)
+
+
+job_queue = JobQueue(
+    settings.JOB_QUEUE_PATH,
+    settings.JOB_WORKERS,
+    settings.JOB_MAX_ATTEMPTS
+)
@@ -0,0 +1,119 @@
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Stage latencies span from sub-millisecond cache hits to minute-long inference
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 20, 30, 60, 120, 300
+)
+
+REQUEST_SECONDS = Histogram(
+    "voiceclone_request_seconds",
+    "HTTP request latency until the response starts",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "voiceclone_requests_in_flight",
+    "HTTP requests currently being handled"
+)
+STAGE_SECONDS = Histogram(
+    "voiceclone_stage_seconds",
+    "Latency of one stage of a generation request",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_IN_FLIGHT = Gauge(
+    "voiceclone_stage_in_flight",
+    "Operations currently inside a stage",
+    ["stage"]
+)
+STAGE_ERRORS = Counter(
+    "voiceclone_stage_errors_total",
+    "Stages that ended with an exception",
+    ["stage"]
+)
+BILLING_EVENTS = Counter(
+    "voiceclone_billing_events_total",
+    "Stripe webhook events by outcome",
+    ["outcome"]
+)
+BILLING_EVENTS_FAILED = Gauge(
+    "voiceclone_billing_events_failed",
+    "Stripe events given up on and waiting to be retried or skipped"
+)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Spans recorded for the current request, set by the tracing middleware
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("spans", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: str):
+    """Collect spans for one request; yields the list they are appended to"""
+    spans: List[Tuple[str, float]] = []
+    trace_token = _trace_id.set(trace_id)
+    spans_token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace_id.reset(trace_token)
+        _spans.reset(spans_token)
+
+
+def observe(stage: str, seconds: float):
+    """Record a stage duration measured elsewhere (e.g. in a worker process)"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage of the current request"""
+    in_flight = STAGE_IN_FLIGHT.labels(stage)
+    in_flight.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        in_flight.dec()
+        observe(stage, time.perf_counter() - started)
+
+
+def observe_batch(timings: Dict[str, List[float]]):
+    """Record stage timings of a shared batch, which belong to no single request"""
+    for stage, durations in timings.items():
+        for seconds in durations:
+            STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Spans as a Server-Timing header value, repeated stages summed"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+def render() -> bytes:
+    return generate_latest()
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services.batch_scheduler import run_batch_in_process
+from app.services.model_registry import model_registry
+from app.services.neutts_service import BACKEND_DIR, get_neutts_service, import_backend
+from app.services.worker_pool import get_worker_pool
+
+WARMUP_SAMPLE = BACKEND_DIR / "samples" / "dave.wav"
+WARMUP_TRANSCRIPT = BACKEND_DIR / "samples" / "dave.txt"
+WARMUP_TEXT = "Warming up the voice model."
+
+
+class ModelLifecycle:
+    """
+    Startup lifecycle of the NeuTTS model.
+
+    With PRELOAD_MODEL the model is imported, loaded and (with
+    WARMUP_INFERENCE) run once on the bundled sample in the background, so
+    the first user request doesn't pay for it. State moves through
+    idle -> loading -> warming -> ready, or failed. Each phase is timed.
+    """
+
+    def __init__(self):
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        # Without preloading the model loads on first use, nothing to wait for
+        return self.state == "ready" or not settings.PRELOAD_MODEL
+
+    def _phase_done(self, phase: str, started: float) -> float:
+        elapsed = time.perf_counter() - started
+        self.timings[phase] = round(elapsed, 3)
+        print(f"⏱️ Model {phase}: {elapsed:.1f}s")
+        return time.perf_counter()
+
+    async def _load_in_process(self):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        await loop.run_in_executor(None, import_backend)
+        started = self._phase_done("import", started)
+
+        for variant in model_registry.variants:
+            service = await loop.run_in_executor(None, get_neutts_service, variant)
+            if service.tts is None:
+                raise Exception(f"NeuTTS {variant} failed to load")
+        self._phase_done("load", started)
+
+    async def _load_workers(self, pool):
+        started = time.perf_counter()
+        ready = await pool.wait_ready()
+        if ready == 0:
+            raise Exception("No NeuTTS worker loaded")
+        self._phase_done("load", started)
+        # Per-process timings, the slowest worker decides readiness
+        for phase in ("import", "load"):
+            self.timings[f"worker_{phase}"] = round(
+                max(w.timings.get(phase, 0.0) for w in pool.workers.values()),
+                3
+            )
+
+    async def _warmup(self, pool):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        ref_text = WARMUP_TRANSCRIPT.read_text().strip()
+
+        if pool is not None:
+            ref_codes = await pool.encode_reference(str(WARMUP_SAMPLE))
+            # One batch per worker and variant so every model is warm
+            batches = await asyncio.gather(*[
+                pool.run_batch([(WARMUP_TEXT, ref_codes, ref_text)], variant)
+                for _ in range(pool.size)
+                for variant in model_registry.variants
+            ])
+        else:
+            ref_codes = await loop.run_in_executor(
+                None,
+                get_neutts_service().encode_reference,
+                str(WARMUP_SAMPLE)
+            )
+            batches = [
+                await run_batch_in_process([(WARMUP_TEXT, ref_codes, ref_text)], variant)
+                for variant in model_registry.variants
+            ]
+        outputs = [output for batch in batches for output in batch]
+
+        for output in outputs:
+            if isinstance(output, Exception):
+                raise output
+        self._phase_done("warmup", started)
+
+    async def _run(self):
+        started = time.perf_counter()
+        pool = get_worker_pool()
+        try:
+            self.state = "loading"
+            if pool is not None:
+                await self._load_workers(pool)
+            else:
+                await self._load_in_process()
+
+            if settings.WARMUP_INFERENCE:
+                self.state = "warming"
+                await self._warmup(pool)
+
+            self.state = "ready"
+            self._phase_done("startup", started)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"❌ Model startup failed: {e}")
+
+    def start(self):
+        """Begin preloading in the background"""
+        if settings.PRELOAD_MODEL and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "timings": self.timings
+        }
+
+
+model_lifecycle = ModelLifecycle()
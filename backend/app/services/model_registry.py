@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.config import settings
+
+CODEC_REPO = "neuphonic/neucodec"
+
+
+class ModelVariant:
+    """One backbone build, e.g. a q4 or q8 GGUF, sharing the common codec"""
+
+    def __init__(self, name: str, backbone_repo: str, threads: int = 0):
+        self.name = name
+        self.backbone_repo = backbone_repo
+        self.threads = threads
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.backbone_repo}+{CODEC_REPO}"
+
+    def __repr__(self):
+        return f"ModelVariant({self.name}, {self.backbone_repo}, threads={self.threads})"
+
+
+def parse_variants(spec: str) -> "OrderedDict[str, ModelVariant]":
+    """Parse "name=repo[@threads],..." into variants, keeping their order"""
+    variants = OrderedDict()
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, repo = entry.partition("=")
+        repo, _, threads = repo.partition("@")
+        if not name or not repo:
+            raise ValueError(f"Invalid model variant: {entry!r}")
+        variants[name.strip()] = ModelVariant(name.strip(), repo.strip(), int(threads or 0))
+    if not variants:
+        raise ValueError("MODEL_VARIANTS is empty")
+    return variants
+
+
+class ModelRegistry:
+    """
+    Configured backbone variants and the rules for picking one per request.
+
+    Variants are listed cheapest first. Each tier maps to a variant; a
+    request with a latency budget steps down to cheaper variants until the
+    estimated processing time fits. Estimates use a real-time factor per
+    variant, learned from finished batches.
+    """
+
+    def __init__(
+        self,
+        variants: "OrderedDict[str, ModelVariant]",
+        tier_variants: Dict[str, str],
+        initial_rtf: float,
+        chars_per_second: float
+    ):
+        self.variants = variants
+        self.default = next(iter(variants.values()))
+        self.tier_variants = tier_variants
+        self.chars_per_second = chars_per_second
+        self.rtf = {name: initial_rtf for name in variants}
+        self.routed = {name: 0 for name in variants}
+
+    def get(self, name: Optional[str] = None) -> ModelVariant:
+        if name is None:
+            return self.default
+        return self.variants[name]
+
+    def estimate_seconds(self, variant: ModelVariant, text: str) -> float:
+        return len(text) / self.chars_per_second * self.rtf[variant.name]
+
+    def select(self, tier: str, text: str = "", latency_budget: Optional[float] = None) -> ModelVariant:
+        """Variant for a request: the tier's choice, or cheaper if over budget"""
+        variant = self.variants.get(self.tier_variants.get(tier), self.default)
+        if latency_budget is not None:
+            names = list(self.variants)
+            index = names.index(variant.name)
+            while index > 0 and self.estimate_seconds(variant, text) > latency_budget:
+                index -= 1
+                variant = self.variants[names[index]]
+        self.routed[variant.name] += 1
+        return variant
+
+    def observe(self, name: str, seconds: float, audio_seconds: float):
+        """Learn a variant's speed from a finished batch"""
+        if audio_seconds > 0:
+            self.rtf[name] = 0.8 * self.rtf[name] + 0.2 * (seconds / audio_seconds)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "backbone_repo": variant.backbone_repo,
+                "threads": variant.threads,
+                "rtf": round(self.rtf[name], 3),
+                "routed": self.routed[name]
+            }
+            for name, variant in self.variants.items()
+        }
+
+
+model_registry = ModelRegistry(
+    parse_variants(settings.MODEL_VARIANTS),
+    {"free": settings.FREE_TIER_VARIANT, "pro": settings.PRO_TIER_VARIANT},
+    settings.ADMISSION_INITIAL_RTF,
+    settings.CHARS_PER_AUDIO_SECOND
+)
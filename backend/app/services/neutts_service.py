@@ -1,60 +1,162 @@
+import io
 import os
+import re
 import sys
+import threading
+import time
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 
 # Add neutts-air to Python path
 BACKEND_DIR = Path(__file__).parent.parent.parent
 NEUTTS_DIR = BACKEND_DIR / "neutts-air"
 sys.path.insert(0, str(NEUTTS_DIR))
 
-print(f"📂 Loading NeuTTS from: {NEUTTS_DIR}")
-
 # Set espeak path
 ESPEAK_LIBRARY = r"C:\Program Files\eSpeak NG\libespeak-ng.dll"
 
-if os.path.exists(ESPEAK_LIBRARY):
-    from phonemizer.backend.espeak.wrapper import EspeakWrapper
-    EspeakWrapper.set_library(ESPEAK_LIBRARY)
-    print(f"✅ espeak loaded from: {ESPEAK_LIBRARY}")
-else:
-    print(f"⚠️ WARNING: espeak not found at {ESPEAK_LIBRARY}")
+import numpy as np
+
+from app.config import settings
+from app.services.cpu_layout import get_layout
+from app.services.model_registry import CODEC_REPO, ModelVariant, model_registry
+from app.utils.audio_utils import crossfade_concat, match_segment_loudness
+from app.utils.text_utils import plan_segments
+
+# torch, soundfile and NeuTTSAir are imported on first use so processes that
+# never touch the model (auth, billing) start without loading them
+torch = None
+sf = None
+NeuTTSAir = None
+_import_lock = threading.Lock()
+
+def import_backend():
+    """Import the heavy model dependencies once"""
+    global torch, sf, NeuTTSAir
+    if NeuTTSAir is not None:
+        return
+    with _import_lock:
+        if NeuTTSAir is not None:
+            return
+        
+        print(f"📂 Loading NeuTTS from: {NEUTTS_DIR}")
+        if os.path.exists(ESPEAK_LIBRARY):
+            from phonemizer.backend.espeak.wrapper import EspeakWrapper
+            EspeakWrapper.set_library(ESPEAK_LIBRARY)
+            print(f"✅ espeak loaded from: {ESPEAK_LIBRARY}")
+        else:
+            print(f"⚠️ WARNING: espeak not found at {ESPEAK_LIBRARY}")
+        
+        import torch as _torch
+        import soundfile as _sf
+        from neuttsair.neutts import NeuTTSAir as _NeuTTSAir
+        torch, sf, NeuTTSAir = _torch, _sf, _NeuTTSAir
 
-import torch
-import soundfile as sf
-from neuttsair.neutts import NeuTTSAir
+SAMPLE_RATE = 24000
+SPEECH_TOKEN_PATTERN = re.compile(r"<\|speech_(\d+)\|>")
+
+def _model_class(codec=None):
+    """NeuTTSAir, or a subclass that takes an already loaded codec instead of loading its own"""
+    if codec is None or not hasattr(NeuTTSAir, "_load_codec"):
+        return NeuTTSAir
+    
+    class SharedCodecNeuTTSAir(NeuTTSAir):
+        def _load_codec(self, codec_repo, codec_device):
+            self.codec = codec
+    
+    return SharedCodecNeuTTSAir
 
 class NeuTTSService:
-    def __init__(self):
+    def __init__(self, variant: Optional[ModelVariant] = None, codec=None):
+        import_backend()
+        self.variant = variant or model_registry.default
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"🎙️ NeuTTS running on: {self.device}")
+        print(f"🎙️ NeuTTS {self.variant.name} running on: {self.device}")
         
         try:
             print("⏳ Loading NeuTTS models (this takes 30-60 seconds first time)...")
-            self.tts = NeuTTSAir(
-                backbone_repo="neuphonic/neutts-air-q4-gguf",
+            # Variants differ only in the backbone, so later ones reuse the
+            # first one's codec rather than loading another
+            self.tts = _model_class(codec)(
+                backbone_repo=self.variant.backbone_repo,
                 backbone_device="cpu",
-                codec_repo="neuphonic/neucodec",
+                codec_repo=CODEC_REPO,
                 codec_device=self.device
             )
-            print("✅ NeuTTS Air loaded successfully!")
+            if codec is not None and self.tts.codec is not codec:
+                # Builds without a _load_codec hook loaded their own
+                self.tts.codec = codec
+            # A variant's own thread count wins over the layout's budget
+            threads = self.variant.threads or get_layout().threads
+            if threads > 0:
+                self._set_threads(threads)
+            print(f"✅ NeuTTS Air {self.variant.name} loaded successfully!")
         except Exception as e:
             print(f"❌ Error loading NeuTTS: {e}")
             import traceback
             traceback.print_exc()
             self.tts = None
     
-    def clone_and_generate(self, reference_audio: str, text: str, output_path: str):
+    def _set_threads(self, threads: int):
+        """Set the backbone's llama.cpp threads and the process's torch threads"""
+        if self.tts._is_quantized_model:
+            import llama_cpp
+            backbone = self.tts.backbone
+            backbone.context_params.n_threads = threads
+            backbone.context_params.n_threads_batch = threads
+            llama_cpp.llama_set_n_threads(backbone.ctx, threads, threads)
+        # The codec runs on torch, whose threads are per process
+        torch.set_num_threads(threads)
+        print(f"🧵 NeuTTS {self.variant.name} using {threads} threads")
+    
+    def encode_reference(self, reference_audio):
+        """Encode a reference sample (path, bytes or file-like) into codec codes"""
+        if self.tts is None:
+            raise Exception("NeuTTS not initialized!")
+        
+        if isinstance(reference_audio, (bytes, bytearray)):
+            reference_audio = io.BytesIO(reference_audio)
+        print(f"🎤 Encoding reference: {reference_audio if isinstance(reference_audio, str) else 'in-memory sample'}")
+        return self.tts.encode_reference(reference_audio)
+    
+    def clone_and_generate(
+        self,
+        reference_audio,
+        text: str,
+        output_path: Optional[str] = None,
+        ref_codes=None
+    ):
+        """
+        Generate speech; pass precomputed ref_codes to skip the codec encode.
+        
+        Writes to output_path when given, otherwise returns the waveform.
+        """
         if self.tts is None:
             raise Exception("NeuTTS not initialized!")
         
         try:
-            print(f"🎤 Encoding reference: {reference_audio}")
-            ref_codes = self.tts.encode_reference(reference_audio)
+            if ref_codes is None:
+                ref_codes = self.encode_reference(reference_audio)
+            else:
+                print("⚡ Using cached reference codes")
             
-            print(f"🎙️ Generating: {text[:50]}...")
-            wav = self.tts.infer(text, ref_codes, text)
+            # Long scripts go through the segment planner and one batch
+            segments = plan_segments(text, settings.SEGMENT_MAX_CHARS, settings.SEGMENT_MIN_CHARS) or [text]
+            print(f"🎙️ Generating {len(segments)} segments: {text[:50]}...")
+            wavs = self.generate_batch([(segment, ref_codes, segment) for segment in segments])
+            for wav in wavs:
+                if isinstance(wav, Exception):
+                    raise wav
+            wav = crossfade_concat(
+                match_segment_loudness(wavs),
+                SAMPLE_RATE,
+                settings.SEGMENT_CROSSFADE_MS
+            )
+            
+            if output_path is None:
+                return wav
             
-            sf.write(output_path, wav, 24000)
+            sf.write(output_path, wav, SAMPLE_RATE)
             print(f"✅ Generated audio saved to: {output_path}")
             
             return output_path
@@ -62,13 +164,96 @@ class NeuTTSService:
             import traceback
             traceback.print_exc()
             raise Exception(f"Voice generation failed: {str(e)}")
+    
+    def _run_backbone(self, text: str, ref_codes, ref_text: str) -> str:
+        """Autoregressive pass, returns the speech-token string"""
+        if self.tts._is_quantized_model:
+            return self.tts._infer_ggml(ref_codes, ref_text, text)
+        prompt_ids = self.tts._apply_chat_template(ref_codes, ref_text, text)
+        return self.tts._infer_torch(prompt_ids)
+    
+    def _decode(self, token_string: str) -> np.ndarray:
+        """Codec pass over one speech-token string"""
+        codes = [int(token) for token in SPEECH_TOKEN_PATTERN.findall(token_string)]
+        if not codes:
+            raise ValueError("No valid speech tokens found in the output.")
+        with torch.no_grad():
+            codes = torch.tensor(codes, dtype=torch.long)[None, None, :].to(self.device)
+            return self.tts.codec.decode_code(codes).cpu().numpy()[0, 0, :]
+    
+    def _watermark(self, wav: np.ndarray) -> np.ndarray:
+        watermarker = getattr(self.tts, "watermarker", None)
+        if watermarker is None:
+            return wav
+        return watermarker.apply_watermark(wav, sample_rate=SAMPLE_RATE)
+    
+    def _generate_one(self, text: str, ref_codes, ref_text: str, timings: Dict[str, List[float]]) -> np.ndarray:
+        # Older NeuTTS builds don't expose the split backbone/codec steps
+        if not hasattr(self.tts, "_infer_ggml"):
+            started = time.perf_counter()
+            try:
+                return self.tts.infer(text, ref_codes, ref_text)
+            finally:
+                timings.setdefault("infer", []).append(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        try:
+            tokens = self._run_backbone(text, ref_codes, ref_text)
+        finally:
+            timings.setdefault("backbone", []).append(time.perf_counter() - started)
+        started = time.perf_counter()
+        try:
+            return self._watermark(self._decode(tokens))
+        finally:
+            timings.setdefault("codec_decode", []).append(time.perf_counter() - started)
+    
+    def generate_batch(
+        self,
+        jobs: List[Tuple[str, object, str]],
+        timings: Optional[Dict[str, List[float]]] = None,
+        on_result: Optional[Callable[[int, object], None]] = None
+    ) -> List[object]:
+        """
+        Generate a group of (text, ref_codes, ref_text) jobs one after another.
+        
+        llama.cpp decodes one sequence at a time, so jobs share no model
+        pass; on_result(index, result) is called as each one finishes so
+        callers don't wait for the rest. Returns one waveform or Exception
+        per job, in order. When a timings dict is given, stage durations in
+        seconds are appended to it.
+        """
+        if timings is None:
+            timings = {}
+        if self.tts is None:
+            raise Exception("NeuTTS not initialized!")
+        
+        results: List[object] = []
+        for i, (text, ref_codes, ref_text) in enumerate(jobs):
+            try:
+                result = self._generate_one(text, ref_codes, ref_text, timings)
+            except Exception as e:
+                result = e
+            results.append(result)
+            if on_result is not None:
+                on_result(i, result)
+        
+        print(f"🎙️ Generated {len(jobs)} jobs")
+        return results
 
-# CRITICAL: Load model ONCE at startup, reuse forever
-_neutts_instance = None
+# CRITICAL: Load each model ONCE at startup, reuse forever
+_neutts_instances: Dict[str, NeuTTSService] = {}
+_neutts_lock = threading.Lock()
 
-def get_neutts_service():
-    global _neutts_instance
-    if _neutts_instance is None:
-        print("🔄 Initializing NeuTTS (first time only)...")
-        _neutts_instance = NeuTTSService()
-    return _neutts_instance
\ No newline at end of file
+def get_neutts_service(variant: Optional[str] = None) -> NeuTTSService:
+    """The loaded service for a variant name, the default variant if None"""
+    variant = model_registry.get(variant)
+    service = _neutts_instances.get(variant.name)
+    if service is None:
+        with _neutts_lock:
+            service = _neutts_instances.get(variant.name)
+            if service is None:
+                print(f"🔄 Initializing NeuTTS {variant.name} (first time only)...")
+                loaded = [s for s in _neutts_instances.values() if s.tts is not None]
+                service = NeuTTSService(variant, codec=loaded[0].tts.codec if loaded else None)
+                _neutts_instances[variant.name] = service
+    return service
@@ -0,0 +1,244 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services.supabase_service import SupabaseError, supabase_repo
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class ProfileNotFound(Exception):
+    pass
+
+
+class UserQuota:
+    def __init__(self, user_id: str, profile: dict):
+        self.user_id = user_id
+        self.tier = profile["tier"]
+        self.limit = profile["generations_limit"]
+        self.used = profile["generations_used"]
+        self.reserved = 0
+        # Committed units the database hasn't confirmed yet
+        self.unsynced = 0
+        self.loaded_at = time.monotonic()
+
+    @property
+    def remaining(self) -> int:
+        return self.limit - self.used - self.reserved
+
+
+class Reservation:
+    def __init__(self, quota: UserQuota, units: int):
+        self.quota = quota
+        self.units = units
+        self.settled = False
+
+    @property
+    def user_id(self) -> str:
+        return self.quota.user_id
+
+    @property
+    def tier(self) -> str:
+        return self.quota.tier
+
+
+class QuotaService:
+    """
+    Local generation quota accounting.
+
+    Units are reserved before inference, then committed on success or
+    refunded on failure. All of this happens in-process on the event loop,
+    so checks are atomic without a database round-trip. Committed usage is
+    written to the database in batches by a background flush, using an
+    atomic server-side increment. Entries reload from the database every
+    QUOTA_REFRESH_SECONDS to pick up plan changes and usage recorded by
+    other instances; if the database is unreachable the cached entry keeps
+    being used.
+    """
+
+    def __init__(self):
+        self.reservations = 0
+        self.rejections = 0
+        self.flushes = 0
+        self._entries: Dict[str, UserQuota] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._pending: Dict[str, int] = {}
+        self._flushing = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def _fetch(self, user_id: str) -> dict:
+        profile = await supabase_repo.get_profile(
+            user_id,
+            columns="user_id,tier,generations_used,generations_limit"
+        )
+        if profile is None:
+            raise ProfileNotFound(user_id)
+        return profile
+
+    async def _entry(self, user_id: str) -> UserQuota:
+        entry = self._entries.get(user_id)
+        fresh = (
+            entry is not None
+            and (self._flushing or time.monotonic() - entry.loaded_at < settings.QUOTA_REFRESH_SECONDS)
+        )
+        if fresh:
+            return entry
+
+        # One profile load per user at a time
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        flushes = self.flushes
+        try:
+            try:
+                profile = await self._fetch(user_id)
+            except Exception as e:
+                if entry is None or isinstance(e, ProfileNotFound):
+                    raise
+                print(f"Quota refresh failed for {user_id}, using cached entry: {e}")
+                future.set_result(entry)
+                return entry
+
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = UserQuota(user_id, profile)
+                self._entries[user_id] = entry
+            else:
+                entry.tier = profile["tier"]
+                entry.limit = profile["generations_limit"]
+                # If a flush landed while loading, the row may or may not
+                # include it; keep the local count and reload next time
+                if self.flushes == flushes:
+                    entry.used = profile["generations_used"] + entry.unsynced
+                    entry.loaded_at = time.monotonic()
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else ProfileNotFound(user_id))
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(user_id, None)
+
+    async def get(self, user_id: str) -> UserQuota:
+        """Current quota state for a user"""
+        return await self._entry(user_id)
+
+    def cached_tier(self, user_id: str) -> Optional[str]:
+        """Tier from the local entry, without loading the profile"""
+        entry = self._entries.get(user_id)
+        return entry.tier if entry is not None else None
+
+    async def reserve(self, user_id: str, units: int = 1) -> Reservation:
+        """Reserve units before inference, or raise QuotaExceeded"""
+        entry = await self._entry(user_id)
+        if entry.remaining < units:
+            self.rejections += 1
+            raise QuotaExceeded(user_id)
+        entry.reserved += units
+        self.reservations += 1
+        return Reservation(entry, units)
+
+    def commit(self, reservation: Reservation, units: Optional[int] = None):
+        """Turn a reservation into recorded usage, refunding any units not used"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+        used = reservation.units if units is None else max(0, min(units, reservation.units))
+        entry = reservation.quota
+        entry.reserved -= reservation.units
+        if used == 0:
+            return
+        entry.used += used
+        entry.unsynced += used
+        self._pending[entry.user_id] = self._pending.get(entry.user_id, 0) + used
+
+    def refund(self, reservation: Reservation):
+        """Release a reservation that produced nothing"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+        reservation.quota.reserved -= reservation.units
+
+    def uncommit(self, user_id: str, units: int = 1):
+        """Give back committed units, e.g. for a generation that was lost before it was saved"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            entry.used -= units
+            entry.unsynced -= units
+        self._pending[user_id] = self._pending.get(user_id, 0) - units
+
+    def invalidate(self, user_id: str):
+        """Force a reload from the database, e.g. after a plan change"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            entry.loaded_at = 0.0
+
+    async def check_database(self):
+        """Fail startup if the usage increment function hasn't been migrated in"""
+        try:
+            await supabase_repo.increment_generations_used({})
+        except SupabaseError as e:
+            if e.status_code == 404:
+                raise RuntimeError(
+                    "Supabase function increment_generations_used is missing, "
+                    "run the migration in setup.md"
+                ) from e
+            print(f"⚠️ Could not check increment_generations_used: {e}")
+        except Exception as e:
+            print(f"⚠️ Could not check increment_generations_used: {e}")
+
+    async def flush(self):
+        """Write committed usage to the database in one batched call"""
+        if not self._pending or self._flushing:
+            return
+
+        deltas, self._pending = self._pending, {}
+        self._flushing = True
+        try:
+            await supabase_repo.increment_generations_used(deltas)
+            for user_id, delta in deltas.items():
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    entry.unsynced -= delta
+            self.flushes += 1
+        except Exception as e:
+            print(f"Usage flush error, will retry: {e}")
+            for user_id, delta in deltas.items():
+                self._pending[user_id] = self._pending.get(user_id, 0) + delta
+        finally:
+            self._flushing = False
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.QUOTA_FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._entries),
+            "reserved": sum(entry.reserved for entry in self._entries.values()),
+            "pending_units": sum(self._pending.values()),
+            "reservations": self.reservations,
+            "rejections": self.rejections,
+            "flushes": self.flushes
+        }
+
+
+quota_service = QuotaService()
@@ -0,0 +1,243 @@
+import json
+import math
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.config import settings
+from app.services.auth_service import token_verifier
+from app.services.quota_service import quota_service
+
+
+class TierLimits:
+    def __init__(self, per_minute: float, burst: int, max_concurrent: int):
+        self.rate = per_minute / 60
+        self.burst = max(1, burst)
+        self.max_concurrent = max_concurrent
+
+
+class MemoryBackend:
+    """Token buckets and slot counts for this process only"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated, burst, rate)
+        self._buckets: Dict[str, Tuple[float, float, int, float]] = {}
+        self._slots: Dict[str, int] = {}
+
+    def _prune(self, now: float):
+        # Drop buckets that have refilled; they behave like new ones
+        for key, (tokens, updated, burst, rate) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0, or the seconds until one is available"""
+        now = time.monotonic()
+        if len(self._buckets) >= self.max_keys:
+            self._prune(now)
+        tokens, updated, _, _ = self._buckets.get(key, (burst, now, burst, rate))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now, burst, rate)
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now, burst, rate)
+        return 0.0
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        count = self._slots.get(key, 0)
+        if count >= limit:
+            return False
+        self._slots[key] = count + 1
+        return True
+
+    async def release_slot(self, key: str):
+        count = self._slots.get(key, 0) - 1
+        if count > 0:
+            self._slots[key] = count
+        else:
+            self._slots.pop(key, None)
+
+
+# Refill and take in one step, on the Redis server's clock
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """
+    Limits shared by every instance through Redis (needs the redis package).
+
+    Slot counters expire after slot_ttl seconds without activity, so slots
+    held by an instance that died are eventually freed.
+    """
+
+    def __init__(self, url: str, slot_ttl: int = 600):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.slot_ttl = slot_ttl
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return float(await self._take(keys=[f"ratelimit:bucket:{key}"], args=[rate, burst]))
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        slot_key = f"ratelimit:slots:{key}"
+        count = await self.client.incr(slot_key)
+        await self.client.expire(slot_key, self.slot_ttl)
+        if count > limit:
+            await self.client.decr(slot_key)
+            return False
+        return True
+
+    async def release_slot(self, key: str):
+        await self.client.decr(f"ratelimit:slots:{key}")
+
+
+class RateLimiter:
+    """
+    Per-user request rate and concurrency caps by tier.
+
+    Each user has a token bucket (requests per minute with a burst
+    allowance) and a number of concurrent generation slots. Users whose
+    tier isn't known locally yet get the free tier's limits.
+    """
+
+    def __init__(self, backend, limits: Dict[str, TierLimits]):
+        self.backend = backend
+        self.limits = limits
+        self.allowed = 0
+        self.rate_limited = 0
+        self.concurrency_limited = 0
+
+    def limits_for(self, tier: Optional[str]) -> TierLimits:
+        return self.limits.get(tier) or self.limits["free"]
+
+    async def acquire(self, user_id: str, tier: Optional[str]) -> Tuple[bool, int]:
+        """Returns (allowed, retry_after seconds); allowed requests hold a slot"""
+        limits = self.limits_for(tier)
+        if not await self.backend.acquire_slot(user_id, limits.max_concurrent):
+            self.concurrency_limited += 1
+            return False, 1
+        # Only requests that could run spend a token
+        wait = await self.backend.take(user_id, limits.rate, limits.burst)
+        if wait > 0:
+            await self.backend.release_slot(user_id)
+            self.rate_limited += 1
+            return False, max(1, math.ceil(wait))
+        self.allowed += 1
+        return True, 0
+
+    async def release(self, user_id: str):
+        await self.backend.release_slot(user_id)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "allowed": self.allowed,
+            "rate_limited": self.rate_limited,
+            "concurrency_limited": self.concurrency_limited
+        }
+
+
+class RateLimitMiddleware:
+    """
+    Apply the rate limiter to generation routes before the app runs.
+
+    The user comes from the bearer token through the verifier's cache or
+    local JWT check, and the tier from the quota service's cached profile,
+    so an over-limit request is turned away before any Supabase or model
+    work. A user with no cached profile has it loaded first (the route
+    would load it anyway) rather than being held to free limits. Requests
+    without a valid token pass through to get their 401.
+    """
+
+    def __init__(self, app, limiter: RateLimiter, paths: Iterable[str]):
+        self.app = app
+        self.limiter = limiter
+        self.paths = set(paths)
+
+    async def _user_id(self, scope) -> Optional[str]:
+        authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+        if not authorization.startswith("Bearer "):
+            return None
+        try:
+            user = await token_verifier.verify(authorization.split(" ")[1])
+        except Exception:
+            return None
+        return user.id
+
+    async def _tier(self, user_id: str) -> Optional[str]:
+        tier = quota_service.cached_tier(user_id)
+        if tier is not None:
+            return tier
+        try:
+            return (await quota_service.get(user_id)).tier
+        except Exception:
+            # The route reports a missing profile or an unreachable database
+            return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        user_id = await self._user_id(scope)
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = await self.limiter.acquire(user_id, await self._tier(user_id))
+        if not allowed:
+            await self._reject(send, retry_after)
+            return
+        try:
+            # Held until the response, including a streamed one, is done
+            await self.app(scope, receive, send)
+        finally:
+            await self.limiter.release(user_id)
+
+    async def _reject(self, send, retry_after: int):
+        body = json.dumps({"error": "Too many requests, please slow down"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _make_backend():
+    if settings.RATE_LIMIT_REDIS_URL:
+        return RedisBackend(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+
+rate_limiter = RateLimiter(
+    _make_backend(),
+    {
+        "free": TierLimits(settings.FREE_RATE_PER_MINUTE, settings.FREE_RATE_BURST, settings.FREE_MAX_CONCURRENT),
+        "pro": TierLimits(settings.PRO_RATE_PER_MINUTE, settings.PRO_RATE_BURST, settings.PRO_MAX_CONCURRENT)
+    }
+)
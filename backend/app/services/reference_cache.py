@@ -0,0 +1,120 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.config import settings
+
+
+def hash_audio(audio_data: bytes) -> str:
+    """Content hash of a voice sample"""
+    return hashlib.sha256(audio_data).hexdigest()
+
+
+class ReferenceCache:
+    """
+    Content-addressed cache of encoded reference codes.
+
+    Entries are keyed by voice_id plus the hash of the sample audio, held in an
+    in-process LRU and persisted to disk so they survive restarts.
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, voice_id: str, audio_hash: str) -> Path:
+        return self.cache_dir / f"{voice_id}_{audio_hash}.pt"
+
+    def _remember(self, voice_id: str, entry: tuple):
+        with self._lock:
+            self._entries[voice_id] = entry
+            self._entries.move_to_end(voice_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_cached(self, voice_id: str, audio_hash: Optional[str] = None) -> Optional[Tuple[str, object]]:
+        """In-memory lookup only, cheap enough for the event loop"""
+        with self._lock:
+            entry = self._entries.get(voice_id)
+            if entry is not None and (audio_hash is None or entry[0] == audio_hash):
+                self._entries.move_to_end(voice_id)
+                self.hits += 1
+                return entry
+        return None
+
+    def load(self, voice_id: str, audio_hash: Optional[str] = None) -> Optional[Tuple[str, object]]:
+        """On-disk lookup, newest file first; blocks, so run it in an executor"""
+        pattern = f"{voice_id}_{audio_hash or '*'}.pt"
+        paths = sorted(
+            self.cache_dir.glob(pattern),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True
+        )
+        if paths:
+            import torch
+        for path in paths:
+            try:
+                ref_codes = torch.load(path, map_location="cpu")
+            except Exception as e:
+                print(f"Dropping unreadable reference cache entry {path.name}: {e}")
+                path.unlink(missing_ok=True)
+                continue
+            entry = (path.stem.split("_", 1)[1], ref_codes)
+            self._remember(voice_id, entry)
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get(self, voice_id: str, audio_hash: Optional[str] = None) -> Optional[Tuple[str, object]]:
+        """Return (audio_hash, ref_codes) for a voice, or None on a miss"""
+        return self.get_cached(voice_id, audio_hash) or self.load(voice_id, audio_hash)
+
+    def put(self, voice_id: str, audio_hash: str, ref_codes):
+        """Store reference codes in memory and on disk"""
+        import torch
+        ref_codes = ref_codes.detach().cpu()
+        path = self._path(voice_id, audio_hash)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        torch.save(ref_codes, tmp_path)
+        os.replace(tmp_path, path)
+
+        # A voice only ever has one live sample, drop codes for older ones
+        for stale in self.cache_dir.glob(f"{voice_id}_*.pt"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+        self._remember(voice_id, (audio_hash, ref_codes))
+
+    def invalidate(self, voice_id: str):
+        """Forget all cached codes for a voice"""
+        with self._lock:
+            self._entries.pop(voice_id, None)
+        for path in self.cache_dir.glob(f"{voice_id}_*.pt"):
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+reference_cache = ReferenceCache(
+    Path(settings.CACHE_DIR) / "reference_codes",
+    settings.REFERENCE_CACHE_SIZE
+)
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Tuple
+
+from app.config import settings
+
+
+class SampleCache:
+    """
+    Size-bounded on-disk cache of voice-sample blobs keyed by storage_path.
+
+    Each blob sits next to a .sha256 sidecar that is checked on every hit, so a
+    truncated or corrupted file is refetched instead of being fed to the codec.
+    Concurrent misses for the same path share one in-flight download.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._load_index()
+
+    def _key(self, storage_path: str) -> str:
+        return hashlib.sha256(storage_path.encode()).hexdigest()
+
+    def _blob_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.bin"
+
+    def _checksum_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.sha256"
+
+    def _load_index(self):
+        """Rebuild the LRU order from files left by a previous process"""
+        blobs = sorted(
+            self.cache_dir.glob("*.bin"),
+            key=lambda p: p.stat().st_mtime
+        )
+        for blob in blobs:
+            key = blob.stem
+            if not self._checksum_path(key).exists():
+                blob.unlink(missing_ok=True)
+                continue
+            size = blob.stat().st_size
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self._blob_path(key).unlink(missing_ok=True)
+            self._checksum_path(key).unlink(missing_ok=True)
+
+    def _drop(self, key: str):
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self.total_bytes -= size
+        self._blob_path(key).unlink(missing_ok=True)
+        self._checksum_path(key).unlink(missing_ok=True)
+
+    def _lookup(self, key: str):
+        """Return (path, sha256) for a verified entry, or None"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        blob_path = self._blob_path(key)
+        try:
+            expected = self._checksum_path(key).read_text().strip()
+            actual = hashlib.sha256(blob_path.read_bytes()).hexdigest()
+        except OSError:
+            self._drop(key)
+            return None
+
+        if actual != expected:
+            print(f"Sample cache integrity check failed, refetching: {key}")
+            self._drop(key)
+            return None
+
+        os.utime(blob_path)
+        return blob_path, actual
+
+    def put(self, storage_path: str, data: bytes) -> Tuple[Path, str]:
+        """Store a blob and return (path, sha256)"""
+        key = self._key(storage_path)
+        checksum = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(key)
+
+        tmp_path = self.cache_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, blob_path)
+        self._checksum_path(key).write_text(checksum)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+        return blob_path, checksum
+
+    async def get(self, storage_path: str, fetch: Callable[[], Awaitable[bytes]]) -> Tuple[Path, str]:
+        """Return (path, sha256) for a sample, awaiting fetch() on a miss"""
+        key = self._key(storage_path)
+        loop = asyncio.get_running_loop()
+
+        cached = await loop.run_in_executor(None, self._lookup, key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            data = await fetch()
+            result = await loop.run_in_executor(None, self.put, storage_path, data)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                e = RuntimeError(f"Sample download cancelled: {storage_path}")
+            future.set_exception(e)
+            # Mark retrieved so waiter-less failures don't log warnings
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, storage_path: str):
+        self._drop(self._key(storage_path))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "inflight": len(self._inflight)
+            }
+
+
+sample_cache = SampleCache(
+    Path(settings.CACHE_DIR) / "samples",
+    settings.SAMPLE_CACHE_MAX_BYTES
+)
@@ -0,0 +1,78 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+
+
+def normalize_segment(text: str) -> str:
+    """Canonical form of a sentence for cache lookups"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class SegmentCache:
+    """
+    In-memory cache of synthesized sentences.
+
+    Keyed by (voice reference hash, normalized sentence, model id) and evicted
+    least-recently-used first once the stored audio exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.seconds_served = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, ref_hash: str, text: str, model_id: str) -> str:
+        raw = f"{model_id}\0{ref_hash}\0{normalize_segment(text)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str, samplerate: int = 24000) -> Optional[np.ndarray]:
+        with self._lock:
+            wav = self._entries.get(key)
+            if wav is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.seconds_served += len(wav) / samplerate
+            return wav
+
+    def put(self, key: str, wav: np.ndarray):
+        wav = np.array(wav, dtype=np.float32)
+        wav.flags.writeable = False
+        if wav.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous.nbytes
+            self._entries[key] = wav
+            self.total_bytes += wav.nbytes
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "seconds_served": round(self.seconds_served, 2)
+            }
+
+
+segment_cache = SegmentCache(settings.SEGMENT_CACHE_MAX_BYTES)
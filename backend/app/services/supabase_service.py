@@ -1,9 +1,307 @@
-from supabase import create_client, Client
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, TypedDict, Union
+from urllib.parse import quote
+
+import httpx
+
 from app.config import settings
 
-# Initialize Supabase client with SERVICE KEY for storage operations
-# This bypasses RLS policies and gives admin access
-supabase_client: Client = create_client(
+
+class Profile(TypedDict, total=False):
+    user_id: str
+    email: str
+    tier: str
+    generations_used: int
+    generations_limit: int
+    stripe_customer_id: Optional[str]
+    stripe_subscription_id: Optional[str]
+
+
+class Voice(TypedDict, total=False):
+    id: str
+    user_id: str
+    name: str
+    storage_path: str
+    duration: float
+    created_at: str
+
+
+class Generation(TypedDict, total=False):
+    id: str
+    user_id: str
+    voice_id: str
+    text: str
+    storage_path: str
+    created_at: str
+
+
+class AuthUser:
+    """Authenticated Supabase user, exposing the fields the routers use"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id: str = data["id"]
+        self.email: Optional[str] = data.get("email")
+        self.data = data
+
+
+class SupabaseError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def transient(self) -> bool:
+        return self.status_code == 429 or self.status_code >= 500
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether retrying the failed Supabase call may succeed"""
+    if isinstance(error, SupabaseError):
+        return error.transient
+    return isinstance(error, httpx.TransportError)
+
+
+class SupabaseRepository:
+    """
+    Async data access for Supabase (PostgREST, Storage and Auth).
+
+    All calls share one pooled httpx.AsyncClient with keep-alive and timeouts,
+    authenticated with the SERVICE KEY so storage and tables bypass RLS.
+    """
+
+    def __init__(self, url: str, service_key: str):
+        self.url = url.rstrip("/")
+        self.service_key = service_key
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "apikey": self.service_key,
+                    "Authorization": f"Bearer {self.service_key}"
+                },
+                timeout=httpx.Timeout(
+                    settings.SUPABASE_TIMEOUT_SECONDS,
+                    connect=settings.SUPABASE_CONNECT_TIMEOUT_SECONDS
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SUPABASE_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        response = await self.client.request(method, f"{self.url}{path}", **kwargs)
+        if response.status_code >= 400:
+            try:
+                body = response.json()
+                message = body.get("message") or body.get("msg") or body.get("error_description") or str(body)
+            except ValueError:
+                message = response.text
+            raise SupabaseError(response.status_code, message)
+        return response
+
+    # Tables
+
+    async def _select(self, table: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        response = await self._request("GET", f"/rest/v1/{table}", params=params)
+        return response.json()
+
+    async def _insert(self, table: str, rows, ignore_duplicates: bool = False):
+        prefer = "return=minimal"
+        if ignore_duplicates:
+            prefer += ",resolution=ignore-duplicates"
+        await self._request(
+            "POST",
+            f"/rest/v1/{table}",
+            json=rows,
+            headers={"Prefer": prefer}
+        )
+
+    async def _update(self, table: str, values: Dict[str, Any], filters: Dict[str, str]):
+        await self._request(
+            "PATCH",
+            f"/rest/v1/{table}",
+            params=filters,
+            json=values,
+            headers={"Prefer": "return=minimal"}
+        )
+
+    async def get_profile(self, user_id: str, columns: str = "*") -> Optional[Profile]:
+        rows = await self._select("profiles", {
+            "select": columns,
+            "user_id": f"eq.{user_id}",
+            "limit": "1"
+        })
+        return rows[0] if rows else None
+
+    async def create_profile(self, profile: Profile):
+        await self._insert("profiles", profile)
+
+    async def update_profile(self, user_id: str, values: Dict[str, Any]):
+        await self._update("profiles", values, {"user_id": f"eq.{user_id}"})
+
+    async def increment_generations_used(self, deltas: Dict[str, int]):
+        """Atomically add per-user deltas to generations_used in one call"""
+        await self._request(
+            "POST",
+            "/rest/v1/rpc/increment_generations_used",
+            json={"deltas": deltas}
+        )
+
+    async def update_profile_by_subscription(self, subscription_id: str, values: Dict[str, Any]):
+        await self._update("profiles", values, {"stripe_subscription_id": f"eq.{subscription_id}"})
+
+    async def get_voice(self, voice_id: str, user_id: str) -> Optional[Voice]:
+        rows = await self._select("voices", {
+            "select": "*",
+            "id": f"eq.{voice_id}",
+            "user_id": f"eq.{user_id}",
+            "limit": "1"
+        })
+        return rows[0] if rows else None
+
+    def _page_params(
+        self,
+        user_id: str,
+        columns: str,
+        limit: int,
+        after: Optional[Tuple[str, str]]
+    ) -> Dict[str, str]:
+        """Keyset page newest first; after is the (created_at, id) of the last row seen"""
+        params = {
+            "select": columns,
+            "user_id": f"eq.{user_id}",
+            "order": "created_at.desc,id.desc",
+            "limit": str(limit)
+        }
+        if after is not None:
+            created_at, row_id = after
+            params["or"] = f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}"))'
+        return params
+
+    async def list_voices(
+        self,
+        user_id: str,
+        columns: str = "*",
+        limit: int = 100,
+        after: Optional[Tuple[str, str]] = None
+    ) -> List[Voice]:
+        return await self._select("voices", self._page_params(user_id, columns, limit, after))
+
+    async def insert_voice(self, voice: Voice):
+        await self._insert("voices", voice)
+
+    async def list_generations(
+        self,
+        user_id: str,
+        columns: str = "*",
+        limit: int = 50,
+        after: Optional[Tuple[str, str]] = None
+    ) -> List[Generation]:
+        return await self._select("generations", self._page_params(user_id, columns, limit, after))
+
+    async def insert_generation(self, generation: Generation):
+        """Insert a generation; re-inserting the same id is a no-op"""
+        await self._insert("generations", generation, ignore_duplicates=True)
+
+    async def insert_generations(self, generations: List[Generation]):
+        """Insert many generations in one request, skipping ids already present"""
+        if generations:
+            await self._insert("generations", generations, ignore_duplicates=True)
+
+    # Storage
+
+    def _object_path(self, bucket: str, path: str) -> str:
+        return f"{quote(bucket)}/{quote(path)}"
+
+    async def upload(
+        self,
+        bucket: str,
+        path: str,
+        data: Union[bytes, AsyncIterator[bytes]],
+        content_type: str,
+        upsert: bool = False,
+        content_length: Optional[int] = None
+    ):
+        """Store an object; data may be an async iterator of chunks, streamed as read"""
+        headers = {"Content-Type": content_type, "x-upsert": "true" if upsert else "false"}
+        if content_length is not None:
+            headers["Content-Length"] = str(content_length)
+        await self._request(
+            "POST",
+            f"/storage/v1/object/{self._object_path(bucket, path)}",
+            content=data,
+            headers=headers
+        )
+
+    async def download(self, bucket: str, path: str) -> bytes:
+        response = await self._request(
+            "GET",
+            f"/storage/v1/object/{self._object_path(bucket, path)}"
+        )
+        return response.content
+
+    async def remove(self, bucket: str, paths: List[str]):
+        """Delete many objects in one request"""
+        if paths:
+            await self._request(
+                "DELETE",
+                f"/storage/v1/object/{quote(bucket)}",
+                json={"prefixes": paths}
+            )
+
+    def public_url(self, bucket: str, path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{self._object_path(bucket, path)}"
+
+    def public_urls(self, bucket: str, paths: List[str]) -> List[str]:
+        """Public URLs for many objects, building the bucket prefix once"""
+        prefix = f"{self.url}/storage/v1/object/public/{quote(bucket)}/"
+        return [prefix + quote(path) for path in paths]
+
+    # Auth
+
+    async def get_user(self, token: str) -> AuthUser:
+        response = await self._request(
+            "GET",
+            "/auth/v1/user",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        return AuthUser(response.json())
+
+    async def sign_up(self, email: str, password: str) -> Dict[str, Any]:
+        response = await self._request(
+            "POST",
+            "/auth/v1/signup",
+            json={"email": email, "password": password}
+        )
+        return response.json()
+
+    async def sign_in(self, email: str, password: str) -> Dict[str, Any]:
+        response = await self._request(
+            "POST",
+            "/auth/v1/token",
+            params={"grant_type": "password"},
+            json={"email": email, "password": password}
+        )
+        return response.json()
+
+    async def sign_out(self, token: str):
+        await self._request(
+            "POST",
+            "/auth/v1/logout",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+
+supabase_repo = SupabaseRepository(
     settings.SUPABASE_URL,
     settings.SUPABASE_SERVICE_KEY
-)
\ No newline at end of file
+)
@@ -0,0 +1,101 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.batch_scheduler import get_batch_scheduler
+from app.services.model_registry import model_registry
+from app.services.neutts_service import SAMPLE_RATE
+from app.services.segment_cache import segment_cache
+from app.utils.audio_utils import crossfade_concat, match_segment_loudness
+from app.utils.text_utils import plan_segments
+
+
+async def synthesize_segment(
+    segment: str,
+    ref_codes,
+    ref_hash: str,
+    variant: Optional[str] = None,
+    on_synthesized: Optional[Callable[[float], None]] = None
+) -> np.ndarray:
+    """
+    Synthesize one sentence, reusing cached audio when possible.
+
+    on_synthesized receives the seconds of audio the model produced, so
+    cache hits don't count towards observed speed.
+    """
+    model = model_registry.get(variant)
+    key = segment_cache.key(ref_hash, segment, model.model_id)
+    wav = segment_cache.get(key, SAMPLE_RATE)
+    if wav is not None:
+        return wav
+
+    wav = await get_batch_scheduler(model.name).submit(segment, ref_codes, segment)
+    if on_synthesized is not None:
+        on_synthesized(len(wav) / SAMPLE_RATE)
+    segment_cache.put(key, wav)
+    return wav
+
+
+async def synthesize(
+    text: str,
+    ref_codes,
+    ref_hash: str,
+    on_progress: Optional[Callable[[float], Awaitable[None]]] = None,
+    variant: Optional[str] = None,
+    on_synthesized: Optional[Callable[[float], None]] = None
+) -> np.ndarray:
+    """
+    Synthesize text segment by segment.
+
+    The text is planned into sentence or clause segments. Cached segments
+    are reused and only the rest go to the model, queued together so the
+    scheduler can spread them over the inference workers. The pieces are
+    brought to a common loudness and overlap-added with short crossfades.
+    on_progress receives the completed fraction of uncached segments, and
+    on_synthesized the seconds of audio the model produced for each.
+    variant names the backbone to use, the registry default if None.
+    """
+    segments = plan_segments(text, settings.SEGMENT_MAX_CHARS, settings.SEGMENT_MIN_CHARS) or [text]
+
+    model = model_registry.get(variant)
+    keys = [segment_cache.key(ref_hash, segment, model.model_id) for segment in segments]
+    audio: Dict[str, np.ndarray] = {}
+    missing: List[int] = []
+    pending = set()
+    for i, key in enumerate(keys):
+        if key in audio or key in pending:
+            continue
+        wav = segment_cache.get(key, SAMPLE_RATE)
+        if wav is None:
+            missing.append(i)
+            pending.add(key)
+        else:
+            audio[key] = wav
+
+    if missing:
+        print(f"Synthesizing {len(missing)}/{len(segments)} segments")
+        scheduler = get_batch_scheduler(model.name)
+        done = 0
+
+        async def generate(i: int) -> np.ndarray:
+            nonlocal done
+            wav = await scheduler.submit(segments[i], ref_codes, segments[i])
+            if on_synthesized is not None:
+                on_synthesized(len(wav) / SAMPLE_RATE)
+            done += 1
+            if on_progress is not None:
+                await on_progress(done / len(missing))
+            return wav
+
+        generated = await asyncio.gather(*[generate(i) for i in missing])
+        for i, wav in zip(missing, generated):
+            segment_cache.put(keys[i], wav)
+            audio[keys[i]] = wav
+
+    return crossfade_concat(
+        match_segment_loudness([audio[key] for key in keys]),
+        SAMPLE_RATE,
+        settings.SEGMENT_CROSSFADE_MS
+    )
@@ -0,0 +1,392 @@
+import asyncio
+import itertools
+import math
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.cpu_layout import CpuLayout, apply_thread_settings, get_layout
+from app.services.metrics import observe_batch
+from app.services.model_registry import model_registry
+from app.services.neutts_service import get_neutts_service, import_backend
+
+
+class WorkersUnavailable(Exception):
+    """No model worker can take the request; retry after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _export_result(result) -> tuple:
+    """Move a waveform into a shared-memory block the parent will unlink"""
+    if isinstance(result, Exception):
+        return ("error", f"{type(result).__name__}: {result}")
+
+    wav = np.ascontiguousarray(result)
+    shm = shared_memory.SharedMemory(create=True, size=max(wav.nbytes, 1))
+    np.ndarray(wav.shape, dtype=wav.dtype, buffer=shm.buf)[:] = wav
+    name = shm.name
+    shm.close()
+    return ("shm", name, wav.shape, wav.dtype.str)
+
+
+def _import_result(result):
+    if result[0] == "error":
+        return Exception(result[1])
+
+    _, name, shape, dtype = result
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _worker_main(worker_id: int, requests: mp.Queue, results: mp.Queue, cpus: List[int], threads: int):
+    """Entry point of a model worker process"""
+    started = time.perf_counter()
+    # Before torch loads, so its thread pools start at the budgeted size
+    apply_thread_settings(threads, cpus)
+    import_backend()
+    imported = time.perf_counter()
+    # Every worker holds all variants, sharing one codec
+    for variant in model_registry.variants:
+        if get_neutts_service(variant).tts is None:
+            results.put(("failed", worker_id, None, f"NeuTTS {variant} failed to load"))
+            return
+    service = get_neutts_service()
+    results.put(("ready", worker_id, None, {
+        "import": imported - started,
+        "load": time.perf_counter() - imported
+    }))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        kind, request_id, payload = message
+        try:
+            if kind == "batch":
+                variant, jobs = payload
+                timings = {}
+                # Each job goes back as soon as it is done, the batch message only closes the request
+                get_neutts_service(variant).generate_batch(
+                    jobs,
+                    timings,
+                    lambda i, output: results.put(("result", worker_id, request_id, (i, _export_result(output))))
+                )
+                results.put(("batch", worker_id, request_id, timings))
+            elif kind == "encode":
+                ref_codes = service.encode_reference(payload)
+                results.put(("encode", worker_id, request_id, ref_codes.cpu().numpy()))
+        except Exception as e:
+            results.put(("error", worker_id, request_id, f"{type(e).__name__}: {e}"))
+
+
+class _Request:
+    def __init__(self, worker_id: int, future: asyncio.Future, size: int = 0, on_result: Optional[Callable] = None):
+        self.worker_id = worker_id
+        self.future = future
+        self.size = size
+        self.on_result = on_result
+        self.outputs: Dict[int, object] = {}
+
+
+class _Worker:
+    def __init__(self, worker_id: int, process, requests: mp.Queue):
+        self.worker_id = worker_id
+        self.process = process
+        self.requests = requests
+        self.ready = False
+        self.timings: Dict[str, float] = {}
+        self.request_id: Optional[int] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        # Consecutive failed model loads, carried over to replacements
+        self.load_failures = 0
+        self.restart_at: Optional[float] = None
+        self.given_up = False
+
+
+class WorkerPool:
+    """
+    Pool of model worker processes, each holding its own NeuTTSAir per variant.
+
+    Requests are dispatched to idle workers and awaited from the event loop.
+    Waveforms come back through shared memory as each job of a batch
+    finishes; only block names cross the result queue. A health check
+    restarts workers that die or exceed WORKER_BATCH_TIMEOUT, failing the
+    request they were running. A worker whose model fails to load is
+    restarted with exponential backoff and given up on after
+    WORKER_MAX_LOAD_FAILURES, leaving the pool degraded. With no worker
+    ready, requests fail fast with WorkersUnavailable.
+    """
+
+    def __init__(self, size: int, layout: CpuLayout):
+        self.size = size
+        self.layout = layout
+        self.ctx = mp.get_context("spawn")
+        self.results = self.ctx.Queue()
+        self.workers: Dict[int, _Worker] = {}
+        self.requests_served = 0
+        self.requests_failed = 0
+        self.load_failures = 0
+
+        self._ids = itertools.count()
+        self._pending: Dict[int, _Request] = {}
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _spawn(self, worker_id: int) -> _Worker:
+        requests = self.ctx.Queue()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, requests, self.results, self.layout.cpus_for(worker_id), self.layout.threads),
+            name=f"neutts-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        cpus = self.layout.cpus_for(worker_id)
+        pinned = f", cpus {cpus}" if cpus else ""
+        print(f"🔄 Started NeuTTS worker {worker_id} (pid {process.pid}, {self.layout.threads} threads{pinned})")
+        return _Worker(worker_id, process, requests)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        for worker_id in range(self.size):
+            self.workers[worker_id] = self._spawn(worker_id)
+
+        self._listener = threading.Thread(target=self._listen, name="worker-results", daemon=True)
+        self._listener.start()
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        self._closing = True
+        if self._health_task:
+            self._health_task.cancel()
+        for worker in self.workers.values():
+            worker.requests.put(None)
+        loop = asyncio.get_running_loop()
+        for worker in self.workers.values():
+            await loop.run_in_executor(None, worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self.results.put(None)
+
+    @property
+    def ready_count(self) -> int:
+        return sum(1 for w in self.workers.values() if w.ready)
+
+    @property
+    def degraded(self) -> bool:
+        return any(w.given_up for w in self.workers.values())
+
+    def _listen(self):
+        """Drain the shared result queue on a thread and hand off to the loop"""
+        while True:
+            message = self.results.get()
+            if message is None:
+                break
+            self._loop.call_soon_threadsafe(self._handle_result, *message)
+
+    def _handle_result(self, kind: str, worker_id: int, request_id: Optional[int], payload):
+        worker = self.workers.get(worker_id)
+
+        if kind == "ready":
+            if worker is not None:
+                worker.ready = True
+                worker.timings = payload
+                worker.load_failures = 0
+                self._idle.put_nowait(worker_id)
+            print(
+                f"✅ NeuTTS worker {worker_id} ready "
+                f"(import {payload['import']:.1f}s, load {payload['load']:.1f}s)"
+            )
+            return
+        if kind == "failed":
+            self.load_failures += 1
+            if worker is not None:
+                worker.load_failures += 1
+            print(f"❌ NeuTTS worker {worker_id} failed: {payload}")
+            return
+
+        if kind == "result":
+            # Always claim the shared block, even if the caller went away
+            index, exported = payload
+            output = _import_result(exported)
+            pending = self._pending.get(request_id)
+            if pending is not None:
+                pending.outputs[index] = output
+                if pending.on_result is not None:
+                    pending.on_result(index, output)
+            return
+
+        pending = self._pending.pop(request_id, None)
+        if kind == "batch":
+            observe_batch(payload)
+            if pending is not None:
+                payload = [
+                    pending.outputs.get(i, Exception("Worker sent no result"))
+                    for i in range(pending.size)
+                ]
+        if pending is None:
+            return
+
+        future = pending.future
+        if worker is not None and worker.request_id == request_id:
+            worker.request_id = None
+            self._idle.put_nowait(worker_id)
+
+        if future.done():
+            return
+        if kind == "error":
+            self.requests_failed += 1
+            future.set_exception(Exception(payload))
+        else:
+            self.requests_served += 1
+            future.set_result(payload)
+
+    def _unavailable(self) -> WorkersUnavailable:
+        retry_after = max(1, math.ceil(settings.WORKER_HEALTHCHECK_INTERVAL))
+        state = "degraded" if self.degraded else "starting or restarting"
+        return WorkersUnavailable(f"No model worker ready (pool {state})", retry_after)
+
+    async def _dispatch(self, kind: str, payload, size: int = 0, on_result: Optional[Callable] = None):
+        deadline = time.monotonic() + settings.WORKER_DISPATCH_TIMEOUT
+        while True:
+            if self.ready_count == 0:
+                raise self._unavailable()
+            try:
+                worker_id = await asyncio.wait_for(self._idle.get(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                raise self._unavailable()
+            worker = self.workers.get(worker_id)
+            # Skip stale entries left by a restarted worker
+            if worker is not None and worker.ready and worker.request_id is None:
+                break
+
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = _Request(worker_id, future, size, on_result)
+        worker.request_id = request_id
+        worker.started_at = time.monotonic()
+        worker.requests.put((kind, request_id, payload))
+        return await future
+
+    async def wait_ready(self) -> int:
+        """Wait until every worker has loaded or failed, return the number ready"""
+        while True:
+            ready = self.ready_count
+            failed = sum(1 for w in self.workers.values() if not w.ready and w.load_failures)
+            if ready + failed >= self.size:
+                return ready
+            await asyncio.sleep(0.2)
+
+    async def run_batch(
+        self,
+        jobs: List[Tuple[str, object, str]],
+        variant: Optional[str] = None,
+        on_result: Optional[Callable[[int, object], None]] = None
+    ) -> List[object]:
+        """Generate a group of jobs with a model variant on the next idle worker"""
+        jobs = [
+            (text, ref_codes.cpu().numpy() if hasattr(ref_codes, "cpu") else ref_codes, ref_text)
+            for text, ref_codes, ref_text in jobs
+        ]
+        return await self._dispatch("batch", (variant, jobs), len(jobs), on_result)
+
+    async def encode_reference(self, reference_audio: str):
+        """Encode a reference sample on the next idle worker"""
+        return await self._dispatch("encode", reference_audio)
+
+    async def _restart(self, worker: _Worker, reason: str):
+        """Stop a worker, fail its requests and respawn it, now or after a backoff"""
+        print(f"⚠️ Restarting NeuTTS worker {worker.worker_id}: {reason}")
+        worker.ready = False
+        if worker.process.is_alive():
+            worker.process.terminate()
+            await asyncio.get_running_loop().run_in_executor(None, worker.process.join, 5)
+
+        for request_id, pending in list(self._pending.items()):
+            if pending.worker_id == worker.worker_id:
+                del self._pending[request_id]
+                if not pending.future.done():
+                    self.requests_failed += 1
+                    pending.future.set_exception(Exception(f"Worker {pending.worker_id} {reason}"))
+
+        if worker.load_failures == 0:
+            self._respawn(worker)
+        elif worker.load_failures >= settings.WORKER_MAX_LOAD_FAILURES:
+            worker.given_up = True
+            print(
+                f"❌ NeuTTS worker {worker.worker_id} failed to load {worker.load_failures} times, "
+                f"not restarting it (pool degraded)"
+            )
+        else:
+            # Loading again straight away would most likely fail the same way
+            delay = min(
+                settings.WORKER_RESTART_BACKOFF_MAX,
+                settings.WORKER_RESTART_BACKOFF_SECONDS * 2 ** (worker.load_failures - 1)
+            )
+            worker.restart_at = time.monotonic() + delay
+            print(f"NeuTTS worker {worker.worker_id} will be restarted in {delay:.0f}s")
+
+    def _respawn(self, worker: _Worker):
+        replacement = self._spawn(worker.worker_id)
+        replacement.restarts = worker.restarts + 1
+        replacement.load_failures = worker.load_failures
+        self.workers[worker.worker_id] = replacement
+
+    async def _health_loop(self):
+        while not self._closing:
+            await asyncio.sleep(settings.WORKER_HEALTHCHECK_INTERVAL)
+            now = time.monotonic()
+            for worker in list(self.workers.values()):
+                if worker.given_up:
+                    continue
+                if worker.restart_at is not None:
+                    if now >= worker.restart_at:
+                        self._respawn(worker)
+                elif not worker.process.is_alive():
+                    await self._restart(worker, f"exited with code {worker.process.exitcode}")
+                elif (
+                    worker.request_id is not None
+                    and now - worker.started_at > settings.WORKER_BATCH_TIMEOUT
+                ):
+                    await self._restart(worker, "timed out")
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "ready": self.ready_count,
+            "degraded": self.degraded,
+            "busy": sum(1 for w in self.workers.values() if w.request_id is not None),
+            "restarts": sum(w.restarts for w in self.workers.values()),
+            "load_failures": self.load_failures,
+            "requests_served": self.requests_served,
+            "requests_failed": self.requests_failed
+        }
+
+
+_worker_pool = None
+
+def get_worker_pool() -> Optional[WorkerPool]:
+    """Return the worker pool, or None when inference runs in-process"""
+    global _worker_pool
+    layout = get_layout()
+    if _worker_pool is None and layout.workers > 0:
+        _worker_pool = WorkerPool(layout.workers, layout)
+    return _worker_pool
@@ -1,6 +1,23 @@
 import soundfile as sf
+import numpy as np
 from pydub import AudioSegment
 import io
+import struct
+from math import gcd
+from scipy.signal import resample_poly
+
+# Output formats for generated audio, all encoded through libsndfile
+OUTPUT_FORMATS = {
+    "wav": {"format": "WAV", "subtype": "PCM_16", "extension": "wav", "content_type": "audio/wav"},
+    "flac": {"format": "FLAC", "subtype": "PCM_16", "extension": "flac", "content_type": "audio/flac"},
+    "ogg": {"format": "OGG", "subtype": "OPUS", "extension": "ogg", "content_type": "audio/ogg"},
+    "mp3": {"format": "MP3", "subtype": "MPEG_LAYER_III", "extension": "mp3", "content_type": "audio/mpeg"}
+}
+
+# Opus only runs at these rates
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+ENCODE_BLOCK_FRAMES = 24000
 
 def validate_audio_file(file_data: bytes) -> bool:
     """Validate audio file format"""
@@ -10,11 +27,135 @@ def validate_audio_file(file_data: bytes) -> bool:
     except:
         return False
 
-def get_audio_duration(file_path: str) -> float:
-    """Get audio duration in seconds"""
+def get_audio_duration(audio) -> float:
+    """Get audio duration in seconds from the file header (path, bytes or file)"""
     try:
-        data, samplerate = sf.read(file_path)
-        duration = len(data) / samplerate
-        return duration
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = io.BytesIO(audio)
+        return sf.info(audio).duration
     except Exception as e:
-        raise Exception(f"Failed to read audio: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to read audio: {str(e)}")
+
+def pcm16_bytes(wav) -> bytes:
+    """Convert a float waveform to little-endian 16-bit PCM"""
+    clipped = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+    return (clipped * 32767).astype("<i2").tobytes()
+
+def wav_stream_header(samplerate: int = 24000, channels: int = 1) -> bytes:
+    """
+    WAV header for a 16-bit PCM stream of unknown length.
+    
+    The RIFF and data sizes are set to the maximum value, which browsers and
+    most decoders treat as "read until EOF".
+    """
+    bits_per_sample = 16
+    block_align = channels * bits_per_sample // 8
+    byte_rate = samplerate * block_align
+    return b"".join([
+        b"RIFF",
+        struct.pack("<I", 0xFFFFFFFF),
+        b"WAVE",
+        b"fmt ",
+        struct.pack("<IHHIIHH", 16, 1, channels, samplerate, byte_rate, block_align, bits_per_sample),
+        b"data",
+        struct.pack("<I", 0xFFFFFFFF)
+    ])
+
+def crossfade_concat(segments, samplerate: int = 24000, crossfade_ms: float = 10):
+    """
+    Overlap-add waveforms with an equal-power crossfade at each seam.
+    
+    The output is allocated once, so joining many segments stays linear.
+    """
+    segments = [np.asarray(segment, dtype=np.float32) for segment in segments]
+    if not segments:
+        return np.zeros(0, dtype=np.float32)
+    
+    fade = int(samplerate * crossfade_ms / 1000)
+    overlaps = [
+        min(fade, len(previous), len(segment))
+        for previous, segment in zip(segments, segments[1:])
+    ]
+    output = np.zeros(sum(len(segment) for segment in segments) - sum(overlaps), dtype=np.float32)
+    
+    position = 0
+    for i, segment in enumerate(segments):
+        overlap = overlaps[i - 1] if i > 0 else 0
+        start = position - overlap
+        if overlap:
+            # sin/cos ramps keep the summed power constant across the seam
+            t = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)
+            output[start:position] *= np.cos(t)
+            output[start:position] += segment[:overlap] * np.sin(t)
+        output[position:start + len(segment)] = segment[overlap:]
+        position = start + len(segment)
+    return output
+
+def speech_rms(wav, gate_db: float = -40.0) -> float:
+    """RMS level over the non-silent part of a waveform"""
+    wav = np.asarray(wav, dtype=np.float32)
+    if len(wav) == 0:
+        return 0.0
+    threshold = np.max(np.abs(wav)) * 10 ** (gate_db / 20)
+    active = wav[np.abs(wav) > threshold]
+    if len(active) == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(active ** 2)))
+
+def match_loudness(wav, target_rms: float, max_gain_db: float = 6.0):
+    """Scale a waveform towards target_rms, bounded so quiet takes aren't blown up"""
+    rms = speech_rms(wav)
+    if rms <= 0 or target_rms <= 0:
+        return np.asarray(wav, dtype=np.float32)
+    limit = 10 ** (max_gain_db / 20)
+    gain = np.clip(target_rms / rms, 1 / limit, limit)
+    return np.clip(np.asarray(wav, dtype=np.float32) * gain, -1.0, 1.0)
+
+def match_segment_loudness(segments) -> list:
+    """Bring segments to their common median speech level"""
+    levels = [speech_rms(segment) for segment in segments]
+    voiced = [level for level in levels if level > 0]
+    if len(voiced) < 2:
+        return [np.asarray(segment, dtype=np.float32) for segment in segments]
+    target = float(np.median(voiced))
+    return [match_loudness(segment, target) for segment in segments]
+
+def resample(wav, from_rate: int, to_rate: int):
+    """Polyphase resample a waveform to another sample rate"""
+    if from_rate == to_rate:
+        return np.asarray(wav, dtype=np.float32)
+    divisor = gcd(from_rate, to_rate)
+    return resample_poly(wav, to_rate // divisor, from_rate // divisor).astype(np.float32)
+
+def check_output_format(output_format: str, samplerate: int):
+    """Raise ValueError for an unknown format or a rate it can't encode"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported format '{output_format}' (use {', '.join(OUTPUT_FORMATS)})")
+    if output_format == "ogg" and samplerate not in OPUS_SAMPLE_RATES:
+        raise ValueError(f"Opus needs a sample rate of {', '.join(map(str, OPUS_SAMPLE_RATES))}")
+    if not 8000 <= samplerate <= 48000:
+        raise ValueError("Sample rate must be between 8000 and 48000")
+
+def encode_audio(wav, samplerate: int = 24000, output_format: str = "wav", target_rate: int = 0) -> bytes:
+    """
+    Encode a waveform in one of OUTPUT_FORMATS, optionally resampled.
+    
+    Frames are fed to the encoder a block at a time, so no whole-take
+    intermediate copy is made. Blocking, run it off the event loop.
+    """
+    target_rate = target_rate or samplerate
+    check_output_format(output_format, target_rate)
+    spec = OUTPUT_FORMATS[output_format]
+    
+    wav = np.clip(resample(wav, samplerate, target_rate), -1.0, 1.0)
+    buffer = io.BytesIO()
+    with sf.SoundFile(
+        buffer, "w",
+        samplerate=target_rate,
+        channels=1,
+        format=spec["format"],
+        subtype=spec["subtype"]
+    ) as encoder:
+        for start in range(0, len(wav), ENCODE_BLOCK_FRAMES):
+            encoder.write(wav[start:start + ENCODE_BLOCK_FRAMES])
+    return buffer.getvalue()
@@ -0,0 +1,49 @@
+import base64
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor pointing just past a row in created_at/id order"""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        # Both go into a PostgREST filter, so only well-formed values get through
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(row_id))
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def select_columns(fields: Optional[str], default: Sequence[str], allowed: Sequence[str]) -> list:
+    """
+    Columns to fetch for a listing.
+    
+    id and created_at are always included since the cursor needs them.
+    """
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(default)
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(allowed)})"
+        )
+    return list(dict.fromkeys(["id", "created_at", *requested]))
+
+def etag_response(request: Request, payload: dict) -> Response:
+    """JSON response with an ETag, or an empty 304 if the client's copy matches"""
+    body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
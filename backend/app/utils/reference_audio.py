@@ -0,0 +1,149 @@
+import struct
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+from app.utils.audio_utils import resample, speech_rms
+
+# NeuCodec encodes references at 16 kHz mono
+REFERENCE_SAMPLE_RATE = 16000
+
+FRAME_MS = 20
+SILENCE_DB = -40.0
+MIN_SPEECH_DBFS = -60.0  # frames quieter than this are silence however quiet the rest is
+TARGET_RMS_DBFS = -20.0
+PEAK_LIMIT = 0.95
+
+# Leading bytes of the containers libsndfile can decode
+AUDIO_SIGNATURES = (
+    ("wav", lambda head: head[:4] == b"RIFF" and head[8:12] == b"WAVE", "audio/wav"),
+    ("flac", lambda head: head[:4] == b"fLaC", "audio/flac"),
+    ("ogg", lambda head: head[:4] == b"OggS", "audio/ogg"),
+    ("aiff", lambda head: head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"), "audio/aiff"),
+    ("mp3", lambda head: head[:3] == b"ID3" or _is_mpeg_frame(head), "audio/mpeg")
+)
+
+
+def _is_mpeg_frame(head: bytes) -> bool:
+    # Frame sync, then a non-zero layer; ADTS AAC shares the sync with layer 00
+    return len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0 and head[1] & 0x06 != 0
+
+
+def sniff_audio_format(head: bytes):
+    """Return (extension, content_type) from a file's first bytes, or None"""
+    for extension, matches, content_type in AUDIO_SIGNATURES:
+        if matches(head):
+            return extension, content_type
+    return None
+
+
+def declared_duration(extension: str, head: bytes) -> Optional[float]:
+    """
+    Duration a WAV or FLAC header declares, from the file's first bytes.
+    
+    None when the format doesn't declare one (streamed WAV, MP3, Ogg) or
+    the header isn't complete yet.
+    """
+    if extension == "wav":
+        offset = 12
+        byte_rate = 0
+        while offset + 8 <= len(head):
+            chunk_id = head[offset:offset + 4]
+            size = struct.unpack("<I", head[offset + 4:offset + 8])[0]
+            if chunk_id == b"fmt " and offset + 20 <= len(head):
+                byte_rate = struct.unpack("<I", head[offset + 16:offset + 20])[0]
+            elif chunk_id == b"data":
+                if not byte_rate or size in (0, 0xFFFFFFFF):
+                    return None
+                return size / byte_rate
+            offset += 8 + size + (size & 1)
+        return None
+    if extension == "flac" and len(head) >= 26 and head[4] & 0x7F == 0:
+        # STREAMINFO: 20-bit sample rate ... 36-bit total samples
+        bits = int.from_bytes(head[18:26], "big")
+        rate = bits >> 44
+        total = bits & ((1 << 36) - 1)
+        return total / rate if rate and total else None
+    return None
+
+
+def load_mono(source, block_frames: int = 65536):
+    """Decode a file block by block, downmixing as it goes; returns (wav, rate)"""
+    with sf.SoundFile(source) as audio:
+        rate = audio.samplerate
+        blocks = [
+            block.mean(axis=1) if block.ndim > 1 else block
+            for block in audio.blocks(blocksize=block_frames, dtype="float32", always_2d=True)
+        ]
+    wav = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    return wav.astype(np.float32), rate
+
+
+def frame_levels(wav, rate: int) -> np.ndarray:
+    """
+    RMS level in dB per FRAME_MS frame, relative to the loudest frame.
+
+    Frames below MIN_SPEECH_DBFS come out as -inf, so a silent or
+    near-silent file has no frame above SILENCE_DB.
+    """
+    frame = int(rate * FRAME_MS / 1000)
+    count = len(wav) // frame
+    if count == 0:
+        return np.zeros(0)
+    frames = wav[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10
+    levels = 20 * np.log10(rms / rms.max())
+    levels[20 * np.log10(rms) < MIN_SPEECH_DBFS] = -np.inf
+    return levels
+
+
+def trim_silence(wav, rate: int, pad_ms: float = 100):
+    """Cut leading and trailing silence, keeping a little padding"""
+    voiced = np.flatnonzero(frame_levels(wav, rate) > SILENCE_DB)
+    if len(voiced) == 0:
+        return wav[:0]
+    frame = int(rate * FRAME_MS / 1000)
+    pad = int(rate * pad_ms / 1000)
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(wav), (voiced[-1] + 1) * frame + pad)
+    return wav[start:end]
+
+
+def best_window(wav, rate: int, max_seconds: float):
+    """The max_seconds stretch with the most voiced frames"""
+    frame = int(rate * FRAME_MS / 1000)
+    window = int(max_seconds * 1000 / FRAME_MS)
+    voiced = (frame_levels(wav, rate) > SILENCE_DB).astype(np.int32)
+    if len(voiced) <= window:
+        return wav[:int(max_seconds * rate)]
+    counts = np.convolve(voiced, np.ones(window, dtype=np.int32), mode="valid")
+    start = int(np.argmax(counts)) * frame
+    return wav[start:start + int(max_seconds * rate)]
+
+
+def normalize_loudness(wav):
+    """Bring speech to TARGET_RMS_DBFS without letting peaks clip"""
+    rms = speech_rms(wav)
+    if rms <= 0:
+        return wav
+    gain = 10 ** (TARGET_RMS_DBFS / 20) / rms
+    peak = np.max(np.abs(wav)) * gain
+    if peak > PEAK_LIMIT:
+        gain *= PEAK_LIMIT / peak
+    return (wav * gain).astype(np.float32)
+
+
+def prepare_reference(source, max_seconds: float):
+    """
+    Turn an uploaded sample into the canonical codec reference.
+
+    Downmix, resample to 16 kHz, trim silence, pick the most voiced window
+    of at most max_seconds and normalize loudness. Returns the waveform at
+    REFERENCE_SAMPLE_RATE.
+    """
+    wav, rate = load_mono(source)
+    wav = resample(wav, rate, REFERENCE_SAMPLE_RATE)
+    wav = trim_silence(wav, REFERENCE_SAMPLE_RATE)
+    wav = best_window(wav, REFERENCE_SAMPLE_RATE, max_seconds)
+    return normalize_loudness(wav)
@@ -0,0 +1,54 @@
+import re
+import textwrap
+
+SENTENCE_BOUNDARY = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"')\]]))\s+")
+
+# Pauses inside a sentence where a cut still sounds natural
+CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:—–])\s+")
+
+def split_sentences(text: str) -> list:
+    """Split text into sentences, dropping empty pieces"""
+    sentences = SENTENCE_BOUNDARY.split(text.strip())
+    return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+def split_clauses(sentence: str, max_chars: int) -> list:
+    """Break an over-long sentence at clause boundaries, then between words"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+    
+    parts = []
+    for clause in CLAUSE_BOUNDARY.split(sentence):
+        if len(clause) <= max_chars:
+            parts.append(clause)
+        else:
+            parts.extend(textwrap.wrap(clause, max_chars, break_long_words=False))
+    
+    # Greedily refill pieces up to max_chars so cuts stay few
+    pieces = []
+    for part in parts:
+        if pieces and len(pieces[-1]) + 1 + len(part) <= max_chars:
+            pieces[-1] = f"{pieces[-1]} {part}"
+        else:
+            pieces.append(part)
+    return pieces
+
+def plan_segments(text: str, max_chars: int = 200, min_chars: int = 20) -> list:
+    """
+    Split text into segments that can be synthesized independently.
+    
+    Cuts fall on sentence boundaries, and over-long sentences are cut at
+    clauses. Fragments shorter than min_chars are merged into a neighbour,
+    since one-word segments get unnatural prosody.
+    """
+    pieces = []
+    for sentence in split_sentences(text):
+        pieces.extend(split_clauses(sentence, max_chars))
+    
+    segments = []
+    for piece in pieces:
+        short = segments and (len(segments[-1]) < min_chars or len(piece) < min_chars)
+        if short and len(segments[-1]) + 1 + len(piece) <= max_chars:
+            segments[-1] = f"{segments[-1]} {piece}"
+        else:
+            segments.append(piece)
+    return segments
@@ -0,0 +1,220 @@
+import json
+from typing import Iterable, Optional, Tuple
+
+from multipart.multipart import MultipartParser, parse_options_header
+
+from app.utils.reference_audio import declared_duration, sniff_audio_format
+
+SNIFF_BYTES = 64
+HEADER_BYTES = 64 * 1024  # how far into the file to look for a declared duration
+
+
+async def send_rejection(send, status: int, message: str):
+    """Error response that also closes the connection so the client stops sending"""
+    body = json.dumps({"error": message}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close")
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class UploadLimitMiddleware:
+    """
+    Hard cap on request body size for upload routes.
+
+    A declared Content-Length over the cap is refused before any body is
+    read; otherwise bytes are counted as they arrive and the body is cut
+    off the moment it passes the cap. Either way the client gets a 413 with
+    Connection: close so it stops sending.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Look like a dropped client so the form parser stops here
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded and not response_started:
+                # Swallow the app's own error for the truncated body
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        await send_rejection(send, 413, f"Upload larger than {self.max_bytes} bytes")
+
+
+class _AudioPartCheck:
+    """Follows a multipart body chunk by chunk and judges one file field by its first bytes"""
+
+    def __init__(self, boundary: bytes, field: str, max_seconds: float):
+        self.field = field.encode()
+        self.max_seconds = max_seconds
+        self.head = b""
+        # None until decided, then True or a (status, message) rejection
+        self.verdict = None
+        self._in_field = False
+        self._header_name = b""
+        self._header_value = b""
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end
+        })
+
+    def feed(self, chunk: bytes):
+        if self.verdict is None and chunk:
+            self._parser.write(chunk)
+
+    def _on_part_begin(self):
+        self._in_field = False
+        self._header_name = self._header_value = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            _, options = parse_options_header(self._header_value)
+            self._in_field = options.get(b"name") == self.field
+        self._header_name = self._header_value = b""
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_field and self.verdict is None:
+            self.head += data[start:min(end, start + HEADER_BYTES - len(self.head))]
+            self._judge(complete=False)
+
+    def _on_part_end(self):
+        if self._in_field and self.verdict is None:
+            self._judge(complete=True)
+        self._in_field = False
+
+    def _judge(self, complete: bool):
+        full = complete or len(self.head) >= HEADER_BYTES
+        sniffed = sniff_audio_format(self.head)
+        if sniffed is None:
+            if full or len(self.head) >= SNIFF_BYTES:
+                self.verdict = (415, "Unsupported audio format")
+            return
+        duration = declared_duration(sniffed[0], self.head)
+        if duration is not None and duration > self.max_seconds:
+            self.verdict = (400, f"Audio must be under {self.max_seconds}s")
+        elif duration is not None or full:
+            # Nothing more to learn from the header, the route checks the rest
+            self.verdict = True
+
+
+class AudioUploadCheckMiddleware:
+    """
+    Rejects an audio upload from its first bytes, while the rest is in flight.
+
+    The multipart body is parsed alongside the app. Once the file field's
+    first bytes are in, an unrecognised format gets a 415 and a WAV or FLAC
+    whose header declares more than max_seconds gets a 400, with
+    Connection: close, instead of waiting for the whole body. Formats
+    without a declared length are left to the route.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_seconds: float, field: str = "file"):
+        self.app = app
+        self.paths = set(paths)
+        self.max_seconds = max_seconds
+        self.field = field
+
+    def _boundary(self, scope) -> Optional[bytes]:
+        content_type = dict(scope["headers"]).get(b"content-type", b"")
+        kind, options = parse_options_header(content_type)
+        if kind != b"multipart/form-data":
+            return None
+        return options.get(b"boundary")
+
+    async def __call__(self, scope, receive, send):
+        boundary = None
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            boundary = self._boundary(scope)
+        if boundary is None:
+            await self.app(scope, receive, send)
+            return
+
+        check = _AudioPartCheck(boundary, self.field, self.max_seconds)
+        rejection: Optional[Tuple[int, str]] = None
+        response_started = False
+
+        async def checked_receive():
+            nonlocal rejection
+            if rejection is not None:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                try:
+                    check.feed(message.get("body", b""))
+                except Exception:
+                    # Malformed multipart is the form parser's to report
+                    check.verdict = True
+                if isinstance(check.verdict, tuple):
+                    rejection = check.verdict
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejection is not None and not response_started:
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, checked_receive, guarded_send)
+        except Exception:
+            if rejection is None:
+                raise
+        if rejection is not None and not response_started:
+            await send_rejection(send, *rejection)
@@ -0,0 +1,108 @@
+"""
+Benchmark output encodings for generated audio.
+
+Run from backend/:
+
+    python -m benchmarks.bench_formats
+    python -m benchmarks.bench_formats --seconds 10 60 --output formats.json
+
+Encodes speech (the bundled sample, looped to each length) in every output
+format and sample rate and reports encoded size, compression against 16-bit
+WAV and encode time. The recommendation is the smallest encoding whose
+encode real-time factor stays under --max-encode-rtf; use it for
+OUTPUT_FORMAT and OUTPUT_SAMPLE_RATE.
+"""
+import argparse
+import io
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import soundfile as sf
+
+from benchmarks.common import environment, make_reference
+
+SAMPLE_RATE = 24000
+
+
+def load_speech(seconds: float) -> np.ndarray:
+    from app.utils.audio_utils import resample
+
+    audio, sr = sf.read(io.BytesIO(make_reference(seconds)), dtype="float32")
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return resample(audio, sr, SAMPLE_RATE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark output audio encodings")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60])
+    parser.add_argument("--rates", type=int, nargs="+", default=[24000, 16000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-encode-rtf", type=float, default=0.02, help="encode seconds per audio second allowed")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    from app.utils.audio_utils import OUTPUT_FORMATS, OPUS_SAMPLE_RATES, encode_audio
+
+    results = []
+    for seconds in args.seconds:
+        speech = load_speech(seconds)
+        wav_size = len(encode_audio(speech, SAMPLE_RATE, "wav"))
+        for output_format in OUTPUT_FORMATS:
+            for rate in args.rates:
+                if output_format == "ogg" and rate not in OPUS_SAMPLE_RATES:
+                    continue
+                # First encode loads the codec, keep it out of the timings
+                encode_audio(speech, SAMPLE_RATE, output_format, rate)
+                timings = []
+                for _ in range(args.repeats):
+                    started = time.perf_counter()
+                    encoded = encode_audio(speech, SAMPLE_RATE, output_format, rate)
+                    timings.append(time.perf_counter() - started)
+                encode_ms = float(np.median(timings)) * 1000
+                results.append({
+                    "format": output_format,
+                    "sample_rate": rate,
+                    "audio_seconds": seconds,
+                    "bytes": len(encoded),
+                    "kbps": round(len(encoded) * 8 / seconds / 1000, 1),
+                    "compression_vs_wav": round(wav_size / len(encoded), 2),
+                    "encode_ms": round(encode_ms, 1),
+                    "encode_rtf": round(encode_ms / 1000 / seconds, 4)
+                })
+
+    # Judge on the longest take, where fixed costs matter least
+    longest = max(args.seconds)
+    candidates = [
+        r for r in results
+        if r["audio_seconds"] == longest and r["encode_rtf"] <= args.max_encode_rtf
+    ]
+    recommended = min(candidates, key=lambda r: r["bytes"]) if candidates else None
+
+    report = {
+        "benchmark": "formats",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": vars(args),
+        "results": results,
+        "recommended": {
+            "OUTPUT_FORMAT": recommended["format"],
+            "OUTPUT_SAMPLE_RATE": recommended["sample_rate"]
+        } if recommended else None
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if recommended is None:
+        print("No encoding met --max-encode-rtf", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
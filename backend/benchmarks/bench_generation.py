@@ -0,0 +1,248 @@
+"""
+Benchmark the voice generation hot path.
+
+Run from backend/:
+
+    python -m benchmarks.bench_generation --mode service
+    python -m benchmarks.bench_generation --mode route --concurrency 1 4 8
+    python -m benchmarks.bench_generation --baseline last.json --output new.json
+
+service  calls NeuTTSService.clone_and_generate directly, one request at a time
+route    drives POST /api/voice/generate in-process, with Supabase replaced by
+         an in-memory stand-in and auth by a dependency override
+
+Sweeps text length x reference duration (x concurrency for route) and writes
+a JSON report with latency percentiles, real-time factor (processing time
+over audio produced, lower is better), throughput and peak RSS. The segment
+cache is disabled unless --segment-cache is given, so every request reaches
+the model. With --baseline, exits non-zero if any cell's p95 latency grew by
+more than --max-regression.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks.common import (
+    audio_seconds,
+    environment,
+    find_regressions,
+    make_reference,
+    make_text,
+    peak_rss_mb,
+    summarize
+)
+from benchmarks.local_supabase import LocalSupabase
+
+
+def configure_environment(workdir: str, segment_cache: bool):
+    """Settings must be in the environment before app.config is imported"""
+    for name in (
+        "SUPABASE_KEY",
+        "SUPABASE_SERVICE_KEY",
+        "STRIPE_SECRET_KEY",
+        "STRIPE_PUBLISHABLE_KEY",
+        "STRIPE_WEBHOOK_SECRET"
+    ):
+        os.environ.setdefault(name, "benchmark")
+    os.environ["SUPABASE_URL"] = "http://supabase.local"
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["JOB_QUEUE_PATH"] = os.path.join(workdir, "jobs.sqlite3")
+    os.environ["WRITER_QUEUE_PATH"] = os.path.join(workdir, "writer.sqlite3")
+    os.environ["WRITER_AUDIO_DIR"] = os.path.join(workdir, "outputs")
+    os.environ["BILLING_EVENTS_PATH"] = os.path.join(workdir, "billing.sqlite3")
+    if not segment_cache:
+        os.environ["SEGMENT_CACHE_MAX_BYTES"] = "0"
+
+
+def bench_service(args, workdir: str) -> list:
+    from app.services.neutts_service import get_neutts_service, SAMPLE_RATE
+
+    started = time.perf_counter()
+    service = get_neutts_service()
+    if service.tts is None:
+        raise SystemExit("NeuTTS failed to load")
+    print(f"Model loaded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    results = []
+    for ref_seconds in args.ref_seconds:
+        ref_path = os.path.join(workdir, f"reference_{ref_seconds}.wav")
+        with open(ref_path, "wb") as f:
+            f.write(make_reference(ref_seconds))
+
+        started = time.perf_counter()
+        ref_codes = service.encode_reference(ref_path)
+        encode_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        # Untimed run so one-off allocations don't land in the first cell
+        service.clone_and_generate(ref_path, make_text(20), ref_codes=ref_codes)
+
+        for chars in args.text_lengths:
+            latencies, durations, errors = [], [], 0
+            wall_started = time.perf_counter()
+            for i in range(args.requests):
+                started = time.perf_counter()
+                try:
+                    wav = service.clone_and_generate(ref_path, make_text(chars, i), ref_codes=ref_codes)
+                except Exception as e:
+                    print(f"Request failed: {e}", file=sys.stderr)
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                durations.append(len(wav) / SAMPLE_RATE)
+            results.append(summarize(
+                latencies, durations, time.perf_counter() - wall_started, errors,
+                mode="service",
+                text_chars=chars,
+                ref_seconds=ref_seconds,
+                concurrency=1,
+                encode_ms=encode_ms
+            ))
+    return results
+
+
+async def bench_route(args) -> list:
+    import httpx
+
+    from app.config import settings
+    from app.main import app, start_background_services, stop_background_services
+    from app.routers.voice import get_current_user
+    from app.services.model_lifecycle import model_lifecycle
+    from app.services.supabase_service import AuthUser, supabase_repo
+
+    local = LocalSupabase()
+    supabase_repo._client = httpx.AsyncClient(transport=local.transport())
+    user = AuthUser({"id": str(uuid.uuid4()), "email": "bench@bench.local"})
+    local.add_profile(user.id)
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    results = []
+    await start_background_services()
+    try:
+        started = time.perf_counter()
+        while settings.PRELOAD_MODEL and model_lifecycle.state not in ("ready", "failed"):
+            await asyncio.sleep(0.5)
+        if model_lifecycle.state == "failed":
+            raise SystemExit(f"Model failed to load: {model_lifecycle.error}")
+        print(f"Model ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def generate(voice_id: str, text: str) -> float:
+                response = await client.post(
+                    "/api/voice/generate",
+                    data={"voice_id": voice_id, "text": text}
+                )
+                response.raise_for_status()
+                # The row and upload land later; the audio is served from the local cache
+                audio = await client.get(response.json()["download_url"])
+                audio.raise_for_status()
+                return audio_seconds(audio.content)
+
+            for ref_seconds in args.ref_seconds:
+                reference = make_reference(ref_seconds)
+                voice = local.add_voice(user.id, f"bench-{ref_seconds}s", reference, ref_seconds)
+
+                # First request pays for download and reference encoding
+                started = time.perf_counter()
+                await generate(voice["id"], make_text(20))
+                first_request_ms = round((time.perf_counter() - started) * 1000, 1)
+
+                for chars in args.text_lengths:
+                    for concurrency in args.concurrency:
+                        latencies, durations = [], []
+                        errors = 0
+                        semaphore = asyncio.Semaphore(concurrency)
+
+                        async def timed(i: int):
+                            nonlocal errors
+                            async with semaphore:
+                                started = time.perf_counter()
+                                try:
+                                    duration = await generate(voice["id"], make_text(chars, i))
+                                except Exception as e:
+                                    print(f"Request failed: {e}", file=sys.stderr)
+                                    errors += 1
+                                    return
+                                latencies.append(time.perf_counter() - started)
+                                durations.append(duration)
+
+                        wall_started = time.perf_counter()
+                        await asyncio.gather(*[timed(i) for i in range(args.requests * concurrency)])
+                        results.append(summarize(
+                            latencies, durations, time.perf_counter() - wall_started, errors,
+                            mode="route",
+                            text_chars=chars,
+                            ref_seconds=ref_seconds,
+                            concurrency=concurrency,
+                            first_request_ms=first_request_ms
+                        ))
+    finally:
+        app.dependency_overrides.clear()
+        await stop_background_services()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark voice generation")
+    parser.add_argument("--mode", choices=["service", "route", "all"], default="all")
+    parser.add_argument("--text-lengths", type=int, nargs="+", default=[60, 250, 700])
+    parser.add_argument("--ref-seconds", type=float, nargs="+", default=[3, 7, 15])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=3, help="requests per cell (per concurrent client in route mode)")
+    parser.add_argument("--segment-cache", action="store_true", help="leave the sentence cache on")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous report to compare p95 latency against")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="allowed p95 growth vs baseline (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="voiceclone-bench-")
+    configure_environment(workdir, args.segment_cache)
+
+    report = {
+        "benchmark": "generation",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": vars(args),
+        "results": []
+    }
+
+    # Keep the app's progress prints off stdout so the report stays parseable
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.mode in ("service", "all"):
+            report["results"] += bench_service(args, workdir)
+        if args.mode in ("route", "all"):
+            report["results"] += asyncio.run(bench_route(args))
+
+    from app.config import settings
+    report["environment"].update({
+        "worker_processes": settings.WORKER_PROCESSES,
+        "batch_max_size": settings.BATCH_MAX_SIZE
+    })
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
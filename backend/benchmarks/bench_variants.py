@@ -0,0 +1,154 @@
+"""
+Compare backbone variants: real-time factor against memory.
+
+Run from backend/:
+
+    python -m benchmarks.bench_variants
+    python -m benchmarks.bench_variants \
+        --variants "q4=neuphonic/neutts-air-q4-gguf@4,q8=neuphonic/neutts-air-q8-gguf@4"
+
+Each variant is loaded alone in a fresh process, so its memory figures are
+not mixed with another model's. Reports load time, resident memory before
+and after loading and at peak, and latency / real-time factor per text
+length. Divide a box's memory by peak_rss_mb and its cores by the variant's
+threads to see how many workers fit, and use rtf to see how much audio each
+worker produces per second.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.bench_generation import configure_environment
+from benchmarks.common import (
+    current_rss_mb,
+    environment,
+    make_reference,
+    make_text,
+    peak_rss_mb,
+    summarize
+)
+
+
+def measure_variant(name: str, args: dict, workdir: str, results: mp.Queue):
+    """Child process: load one variant and time it"""
+    # Keep the app's progress prints off stdout so the report stays parseable
+    sys.stdout = sys.stderr
+    rss_before = current_rss_mb()
+
+    from app.services.model_registry import model_registry
+    from app.services.neutts_service import get_neutts_service, import_backend, SAMPLE_RATE
+
+    import_backend()
+    rss_imported = current_rss_mb()
+    started = time.perf_counter()
+    service = get_neutts_service(name)
+    if service.tts is None:
+        results.put({"variant": name, "error": "failed to load"})
+        return
+    load_seconds = time.perf_counter() - started
+    rss_loaded = current_rss_mb()
+
+    ref_path = os.path.join(workdir, f"reference_{name}.wav")
+    with open(ref_path, "wb") as f:
+        f.write(make_reference(args["ref_seconds"]))
+    ref_codes = service.encode_reference(ref_path)
+    service.clone_and_generate(ref_path, make_text(20), ref_codes=ref_codes)
+
+    cells = []
+    for chars in args["text_lengths"]:
+        latencies, durations, errors = [], [], 0
+        wall_started = time.perf_counter()
+        for i in range(args["requests"]):
+            started = time.perf_counter()
+            try:
+                wav = service.clone_and_generate(ref_path, make_text(chars, i), ref_codes=ref_codes)
+            except Exception as e:
+                print(f"Request failed: {e}", file=sys.stderr)
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            durations.append(len(wav) / SAMPLE_RATE)
+        cells.append(summarize(
+            latencies, durations, time.perf_counter() - wall_started, errors,
+            text_chars=chars
+        ))
+
+    variant = model_registry.get(name)
+    rtfs = [cell["rtf"]["mean"] for cell in cells if "rtf" in cell]
+    results.put({
+        "variant": name,
+        "backbone_repo": variant.backbone_repo,
+        "threads": variant.threads,
+        "load_seconds": round(load_seconds, 2),
+        "rss_mb": {
+            "before_import": rss_before,
+            "before_load": rss_imported,
+            "after_load": rss_loaded,
+            "model": round(rss_loaded - rss_imported, 1) if rss_loaded and rss_imported else None,
+            "peak": peak_rss_mb()["self"] if peak_rss_mb() else None
+        },
+        "rtf_mean": round(sum(rtfs) / len(rtfs), 3) if rtfs else None,
+        "results": cells
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare backbone variants")
+    parser.add_argument("--variants", help="MODEL_VARIANTS spec to compare (default: the configured one)")
+    parser.add_argument("--text-lengths", type=int, nargs="+", default=[60, 250])
+    parser.add_argument("--ref-seconds", type=float, default=7)
+    parser.add_argument("--requests", type=int, default=3, help="requests per text length")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="voiceclone-bench-")
+    configure_environment(workdir, segment_cache=False)
+    if args.variants:
+        os.environ["MODEL_VARIANTS"] = args.variants
+
+    from app.services.model_registry import parse_variants
+    from app.config import settings
+    names = list(parse_variants(settings.MODEL_VARIANTS))
+
+    ctx = mp.get_context("spawn")
+    variants = []
+    for name in names:
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        results = ctx.Queue()
+        process = ctx.Process(target=measure_variant, args=(name, vars(args), workdir, results))
+        process.start()
+        # Read before joining, a full queue would keep the child alive
+        while True:
+            try:
+                variants.append(results.get(timeout=1))
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    variants.append({"variant": name, "error": f"exited with code {process.exitcode}"})
+                    break
+        process.join()
+
+    report = {
+        "benchmark": "variants",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": vars(args),
+        "variants": variants
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
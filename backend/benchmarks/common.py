@@ -0,0 +1,133 @@
+import io
+import os
+import platform
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_WAV = os.path.join(BACKEND_DIR, "samples", "dave.wav")
+
+CORPUS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Every morning the harbour fills with small boats heading out to sea.",
+    "She checked the forecast twice before deciding to take the long route home.",
+    "Our quarterly numbers came in slightly ahead of what the team expected.",
+    "If you listen closely, you can hear the train long before you see it.",
+    "He kept the old radio on the kitchen shelf, tuned to the same station for years.",
+    "Please remember to save your work before closing the application.",
+    "The museum opens at nine, but the queue usually starts forming by eight.",
+    "A good story needs a beginning, a middle, and an ending that surprises you.",
+    "Rain is expected later this afternoon, so bring an umbrella just in case."
+]
+
+
+def make_text(chars: int, offset: int = 0) -> str:
+    """Text of roughly the requested length built from whole sentences"""
+    sentences = []
+    i = offset
+    while sum(len(s) + 1 for s in sentences) < chars:
+        sentences.append(CORPUS[i % len(CORPUS)])
+        i += 1
+    return " ".join(sentences)
+
+
+def make_reference(seconds: float) -> bytes:
+    """The bundled sample looped or cut to the requested length, as WAV bytes"""
+    audio, sr = sf.read(SAMPLE_WAV, dtype="float32")
+    frames = int(seconds * sr)
+    repeats = -(-frames // len(audio))
+    audio = np.concatenate([audio] * repeats)[:frames]
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sr, format="WAV")
+    return buffer.getvalue()
+
+
+def audio_seconds(wav_data: bytes) -> float:
+    return sf.info(io.BytesIO(wav_data)).duration
+
+
+def summarize(latencies: List[float], durations: List[float], wall: float, errors: int, **labels) -> dict:
+    """Latency percentiles, real-time factor and throughput for one sweep cell"""
+    result = {**labels, "requests": len(latencies) + errors, "errors": errors}
+    if not latencies:
+        return result
+
+    latency = np.array(latencies)
+    rtf = latency / np.maximum(np.array(durations), 1e-9)
+    result.update({
+        "latency_ms": {
+            "p50": round(float(np.percentile(latency, 50)) * 1000, 1),
+            "p95": round(float(np.percentile(latency, 95)) * 1000, 1),
+            "p99": round(float(np.percentile(latency, 99)) * 1000, 1),
+            "mean": round(float(latency.mean()) * 1000, 1),
+            "max": round(float(latency.max()) * 1000, 1)
+        },
+        "rtf": {
+            "mean": round(float(rtf.mean()), 3),
+            "p50": round(float(np.percentile(rtf, 50)), 3),
+            "p95": round(float(np.percentile(rtf, 95)), 3)
+        },
+        "throughput_rps": round(len(latencies) / wall, 3),
+        "audio_seconds_per_second": round(sum(durations) / wall, 3),
+        "wall_seconds": round(wall, 3)
+    })
+    return result
+
+
+def peak_rss_mb() -> Optional[Dict[str, float]]:
+    """Peak resident memory of this process and its (worker) children"""
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident memory of this process right now (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+CELL_LABELS = ("mode", "text_chars", "ref_seconds", "concurrency")
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Cells whose p95 latency grew by more than tolerance versus a baseline report"""
+    def key(cell):
+        return tuple(cell.get(label) for label in CELL_LABELS)
+
+    previous = {key(cell): cell for cell in baseline.get("results", [])}
+    regressions = []
+    for cell in report.get("results", []):
+        before = previous.get(key(cell))
+        if not before or "latency_ms" not in before or "latency_ms" not in cell:
+            continue
+        old, new = before["latency_ms"]["p95"], cell["latency_ms"]["p95"]
+        if new > old * (1 + tolerance):
+            labels = ", ".join(f"{label}={cell.get(label)}" for label in CELL_LABELS)
+            regressions.append(f"{labels}: p95 {old}ms -> {new}ms")
+    return regressions
@@ -0,0 +1,111 @@
+import json
+import uuid
+from typing import Any, Dict, List
+from urllib.parse import unquote
+
+import httpx
+
+
+class LocalSupabase:
+    """
+    In-memory stand-in for the Supabase REST, RPC and Storage endpoints.
+
+    Mounted as an httpx transport under the real SupabaseRepository, so the
+    benchmark exercises the same request code as production without the
+    network. Only the filters the repository uses (eq.) are understood.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            "profiles": [],
+            "voices": [],
+            "generations": []
+        }
+        self.objects: Dict[str, bytes] = {}
+        self.requests = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def add_profile(self, user_id: str, tier: str = "pro", limit: int = 1_000_000) -> dict:
+        profile = {
+            "user_id": user_id,
+            "email": f"{user_id}@bench.local",
+            "tier": tier,
+            "generations_used": 0,
+            "generations_limit": limit
+        }
+        self.tables["profiles"].append(profile)
+        return profile
+
+    def add_voice(self, user_id: str, name: str, audio_data: bytes, duration: float) -> dict:
+        voice_id = str(uuid.uuid4())
+        storage_path = f"{user_id}/{voice_id}.wav"
+        self.objects[f"voice-samples/{storage_path}"] = audio_data
+        voice = {
+            "id": voice_id,
+            "user_id": user_id,
+            "name": name,
+            "storage_path": storage_path,
+            "duration": duration
+        }
+        self.tables["voices"].append(voice)
+        return voice
+
+    def generation_audio(self, generation_id: str) -> bytes:
+        for row in self.tables["generations"]:
+            if row["id"] == generation_id:
+                return self.objects[f"generated-audio/{row['storage_path']}"]
+        raise KeyError(generation_id)
+
+    def _matches(self, row: dict, params) -> bool:
+        for column, condition in params.items():
+            if column in ("select", "order", "limit"):
+                continue
+            if not condition.startswith("eq.") or str(row.get(column)) != condition[3:]:
+                return False
+        return True
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        path = unquote(request.url.path)
+        params = dict(request.url.params)
+
+        if path.startswith("/storage/v1/object/"):
+            key = path[len("/storage/v1/object/"):]
+            if request.method == "DELETE":
+                for prefix in json.loads(request.content)["prefixes"]:
+                    self.objects.pop(f"{key}/{prefix}", None)
+                return httpx.Response(200, json=[])
+            if request.method == "POST":
+                self.objects[key] = request.content
+                return httpx.Response(200, json={"Key": key})
+            if key in self.objects:
+                return httpx.Response(200, content=self.objects[key])
+            return httpx.Response(404, json={"message": "Object not found"})
+
+        if path == "/rest/v1/rpc/increment_generations_used":
+            deltas = json.loads(request.content)["deltas"]
+            for row in self.tables["profiles"]:
+                row["generations_used"] += deltas.get(row["user_id"], 0)
+            return httpx.Response(204)
+
+        if path.startswith("/rest/v1/"):
+            rows = self.tables.setdefault(path[len("/rest/v1/"):], [])
+            if request.method == "GET":
+                found = [row for row in rows if self._matches(row, params)]
+                if "limit" in params:
+                    found = found[:int(params["limit"])]
+                return httpx.Response(200, json=found)
+            if request.method == "POST":
+                body = json.loads(request.content)
+                rows.extend(body if isinstance(body, list) else [body])
+                return httpx.Response(201)
+            if request.method == "PATCH":
+                values = json.loads(request.content)
+                for row in rows:
+                    if self._matches(row, params):
+                        row.update(values)
+                return httpx.Response(204)
+
+        return httpx.Response(404, json={"message": f"No local route for {request.method} {path}"})
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Settings are read when app.config is first imported
+for name in (
+    "SUPABASE_KEY",
+    "SUPABASE_SERVICE_KEY",
+    "STRIPE_SECRET_KEY",
+    "STRIPE_PUBLISHABLE_KEY",
+    "STRIPE_WEBHOOK_SECRET"
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="voiceclone-test-"))
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="voiceclone-test-data-"))
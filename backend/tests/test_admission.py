@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, Overloaded
+
+
+def controller(concurrency: int = 1, max_queue: int = 10, deadline: float = 100.0) -> AdmissionController:
+    # 10 characters per audio second at real time: a 10-character text costs 1s
+    return AdmissionController(concurrency, max_queue, deadline, initial_rtf=1.0, chars_per_second=10)
+
+
+def test_starts_immediately_while_slots_are_free():
+    async def run():
+        admission = controller(concurrency=2)
+        first = await admission.acquire("x" * 10, "free")
+        second = await admission.acquire("x" * 10, "free")
+        assert first.started_at is not None and second.started_at is not None
+        assert admission.stats()["active"] == 2
+    asyncio.run(run())
+
+
+def test_pro_requests_go_ahead_of_free_ones():
+    async def run():
+        admission = controller()
+        running = await admission.acquire("x", "free")
+        started = []
+
+        async def wait(name, tier):
+            ticket = await admission.acquire("x", tier)
+            started.append(name)
+            return ticket
+
+        free = asyncio.ensure_future(wait("free", "free"))
+        await asyncio.sleep(0)
+        pro = asyncio.ensure_future(wait("pro", "pro"))
+        await asyncio.sleep(0)
+        assert admission.stats()["queued"] == 2
+
+        admission.release(running)
+        admission.release(await pro)
+        admission.release(await free)
+        assert started == ["pro", "free"]
+    asyncio.run(run())
+
+
+def test_rejects_when_the_queue_is_full():
+    async def run():
+        admission = controller(max_queue=1)
+        await admission.acquire("x", "free")
+        waiting = asyncio.ensure_future(admission.acquire("x", "free"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await admission.acquire("x", "free")
+        assert admission.rejected == 1
+        waiting.cancel()
+    asyncio.run(run())
+
+
+def test_rejects_past_the_deadline_with_retry_after():
+    async def run():
+        admission = controller(deadline=5.0)
+        await admission.acquire("x" * 40, "free")
+        with pytest.raises(Overloaded) as raised:
+            await admission.acquire("x" * 20, "free")
+        assert raised.value.retry_after == 4
+    asyncio.run(run())
+
+
+def test_background_jobs_queue_instead_of_failing():
+    async def run():
+        admission = controller(max_queue=0, deadline=0.0)
+        running = await admission.acquire("x", "free")
+        waiting = asyncio.ensure_future(admission.acquire("x", "free", fail_fast=False))
+        await asyncio.sleep(0)
+        admission.release(running)
+        ticket = await waiting
+        assert ticket.started_at is not None
+        assert admission.rejected == 0
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        admission = controller()
+        running = await admission.acquire("x", "free")
+        waiting = asyncio.ensure_future(admission.acquire("x", "free"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert admission.stats()["queued"] == 0
+        admission.release(running)
+        assert admission.stats()["active"] == 0
+    asyncio.run(run())
+
+
+def test_learns_rtf_only_from_produced_audio():
+    async def run():
+        admission = controller()
+        cached = await admission.acquire("x", "free")
+        admission.release(cached)
+        assert admission.rtf == 1.0
+
+        generated = await admission.acquire("x", "free")
+        generated.started_at -= 2.0
+        generated.add_audio(1.0)
+        admission.release(generated)
+        assert admission.rtf == pytest.approx(1.2, abs=0.01)
+
+        admission.release(generated)  # releasing twice is a no-op
+        assert admission.stats()["active"] == 0
+    asyncio.run(run())
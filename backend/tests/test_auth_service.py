@@ -0,0 +1,99 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from app.services import auth_service
+from app.services.auth_service import InvalidToken, TokenVerifier
+from app.services.supabase_service import AuthUser
+
+SECRET = "test-secret"
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def make_token(secret: str = SECRET, **overrides) -> str:
+    claims = {
+        "sub": "user-1",
+        "email": "user@example.com",
+        "role": "authenticated",
+        "aud": "authenticated",
+        "exp": time.time() + 3600
+    }
+    claims.update(overrides)
+    claims = {key: value for key, value in claims.items() if value is not None}
+    header = b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = b64(json.dumps(claims).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64(signature)}"
+
+
+def verifier(secret: str = SECRET) -> TokenVerifier:
+    return TokenVerifier(secret, "", max_entries=10, max_ttl=300)
+
+
+def test_valid_token_is_verified_locally_and_cached():
+    tokens = verifier()
+    token = make_token()
+    user = asyncio.run(tokens.verify(token))
+    assert user.id == "user-1"
+    assert user.email == "user@example.com"
+    asyncio.run(tokens.verify(token))
+    assert tokens.local_verifications == 1
+    assert tokens.cache_hits == 1
+
+
+@pytest.mark.parametrize("token", [
+    make_token(secret="other-secret"),
+    make_token(exp=time.time() - 3600),
+    make_token(nbf=time.time() + 3600),
+    make_token(aud="anon"),
+    make_token(aud=None),
+    make_token(role="anon"),
+    make_token(sub=None),
+    "not-a-token"
+])
+def test_bad_tokens_are_rejected(token):
+    with pytest.raises(InvalidToken):
+        asyncio.run(verifier().verify(token))
+
+
+def test_clock_skew_within_leeway_is_accepted():
+    token = make_token(exp=time.time() - 5, nbf=time.time() + 5)
+    assert asyncio.run(verifier().verify(token)).id == "user-1"
+
+
+def test_audience_list_is_accepted():
+    token = make_token(aud=["other", "authenticated"])
+    assert asyncio.run(verifier().verify(token)).id == "user-1"
+
+
+def test_falls_back_to_supabase_without_a_secret(monkeypatch):
+    seen = []
+
+    async def get_user(token):
+        seen.append(token)
+        return AuthUser({"id": "remote-user"})
+
+    monkeypatch.setattr(auth_service.supabase_repo, "get_user", get_user)
+    tokens = verifier(secret="")
+    token = make_token()
+    assert asyncio.run(tokens.verify(token)).id == "remote-user"
+    assert asyncio.run(tokens.verify(token)).id == "remote-user"
+    assert seen == [token]
+    assert tokens.remote_verifications == 1
+
+
+def test_remote_rejection_is_an_invalid_token(monkeypatch):
+    async def get_user(token):
+        raise Exception("Invalid JWT")
+
+    monkeypatch.setattr(auth_service.supabase_repo, "get_user", get_user)
+    with pytest.raises(InvalidToken):
+        asyncio.run(verifier(secret="").verify(make_token()))
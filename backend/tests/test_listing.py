@@ -0,0 +1,66 @@
+import base64
+import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils.listing import decode_cursor, encode_cursor, etag_response, select_columns
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def request(if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_cursor_round_trip():
+    row = {"id": str(uuid.uuid4()), "created_at": "2024-05-01T12:30:00.123456+00:00"}
+    cursor = encode_cursor(row)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (row["created_at"], row["id"])
+
+
+def test_missing_cursor_means_first_page():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    raw_cursor("just a string"),
+    raw_cursor(["2024-05-01T00:00:00"]),
+    raw_cursor(["2024-05-01T00:00:00", "not-a-uuid"]),
+    raw_cursor(["2024-05-01T00:00:00", f"{uuid.uuid4()}),id.gt.("]),
+    raw_cursor(["2024-05-01,created_at.lt.2030", str(uuid.uuid4())]),
+    raw_cursor([None, str(uuid.uuid4())])
+])
+def test_malformed_or_injected_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor)
+    assert raised.value.status_code == 400
+
+
+def test_select_columns_always_includes_cursor_columns():
+    assert select_columns(None, ["name"], ["name", "duration"]) == ["id", "created_at", "name"]
+    assert select_columns("duration, id", ["name"], ["id", "name", "duration"]) == ["id", "created_at", "duration"]
+
+
+def test_select_columns_rejects_unknown_fields():
+    with pytest.raises(HTTPException) as raised:
+        select_columns("name,storage_path", ["name"], ["name"])
+    assert raised.value.status_code == 400
+    assert "storage_path" in raised.value.detail
+
+
+def test_etag_response_returns_304_for_a_matching_copy():
+    first = etag_response(request(), {"voices": []})
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+
+    assert etag_response(request(f'W/{etag}, "other"'), {"voices": []}).status_code == 304
+    assert etag_response(request(etag), {"voices": [{"id": 1}]}).status_code == 200
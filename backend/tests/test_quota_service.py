@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from app.services import quota_service as quota_module
+from app.services.quota_service import ProfileNotFound, QuotaExceeded, QuotaService
+from app.services.supabase_service import SupabaseError
+
+
+class FakeRepo:
+    def __init__(self, used: int = 0, limit: int = 3):
+        self.profile = {"user_id": "u", "tier": "free", "generations_used": used, "generations_limit": limit}
+        self.increments = []
+        self.fail_fetch = False
+        self.fail_increment = False
+        self.fetch_gate = None
+
+    async def get_profile(self, user_id, columns="*"):
+        if user_id != "u":
+            return None
+        snapshot = dict(self.profile)
+        if self.fetch_gate is not None:
+            await self.fetch_gate.wait()
+        if self.fail_fetch:
+            raise SupabaseError(503, "unavailable")
+        return snapshot
+
+    async def increment_generations_used(self, deltas):
+        if self.fail_increment:
+            raise SupabaseError(503, "unavailable")
+        self.increments.append(dict(deltas))
+        self.profile["generations_used"] += deltas.get("u", 0)
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    repo = FakeRepo()
+    monkeypatch.setattr(quota_module, "supabase_repo", repo)
+    return repo
+
+
+def test_reserve_until_the_limit(repo):
+    async def run():
+        quotas = QuotaService()
+        for _ in range(3):
+            await quotas.reserve("u")
+        with pytest.raises(QuotaExceeded):
+            await quotas.reserve("u")
+        assert quotas.rejections == 1
+    asyncio.run(run())
+
+
+def test_commit_refund_and_partial_commit(repo):
+    async def run():
+        quotas = QuotaService()
+        first = await quotas.reserve("u")
+        quotas.commit(first)
+        quotas.commit(first)  # settling twice is a no-op
+        second = await quotas.reserve("u")
+        quotas.refund(second)
+        third = await quotas.reserve("u", units=2)
+        quotas.commit(third, units=1)
+        entry = await quotas.get("u")
+        assert (entry.used, entry.reserved, entry.unsynced, entry.remaining) == (2, 0, 2, 1)
+    asyncio.run(run())
+
+
+def test_flush_writes_deltas_once(repo):
+    async def run():
+        quotas = QuotaService()
+        quotas.commit(await quotas.reserve("u"))
+        quotas.commit(await quotas.reserve("u"))
+        await quotas.flush()
+        await quotas.flush()
+        assert repo.increments == [{"u": 2}]
+        assert (await quotas.get("u")).unsynced == 0
+    asyncio.run(run())
+
+
+def test_failed_flush_is_retried(repo):
+    async def run():
+        quotas = QuotaService()
+        quotas.commit(await quotas.reserve("u"))
+        repo.fail_increment = True
+        await quotas.flush()
+        assert quotas.stats()["pending_units"] == 1
+        repo.fail_increment = False
+        await quotas.flush()
+        assert repo.increments == [{"u": 1}]
+    asyncio.run(run())
+
+
+def test_refresh_racing_a_flush_keeps_the_local_count(repo):
+    async def run():
+        quotas = QuotaService()
+        quotas.commit(await quotas.reserve("u"))
+        quotas.commit(await quotas.reserve("u"))
+        entry = await quotas.get("u")
+        entry.loaded_at = 0.0
+
+        # The refresh reads the row before the flush lands and returns after it
+        repo.fetch_gate = asyncio.Event()
+        refresh = asyncio.create_task(quotas.get("u"))
+        await asyncio.sleep(0)
+        await quotas.flush()
+        repo.fetch_gate.set()
+        await refresh
+        assert entry.used == 2
+
+        repo.fetch_gate = None
+        await quotas.get("u")
+        assert entry.used == 2
+    asyncio.run(run())
+
+
+def test_stale_entry_is_served_when_the_refresh_fails(repo):
+    async def run():
+        quotas = QuotaService()
+        entry = await quotas.get("u")
+        entry.loaded_at = 0.0
+        repo.fail_fetch = True
+        assert await quotas.get("u") is entry
+    asyncio.run(run())
+
+
+def test_errors_without_an_entry_propagate(repo):
+    async def run():
+        quotas = QuotaService()
+        with pytest.raises(ProfileNotFound):
+            await quotas.get("missing")
+        repo.fail_fetch = True
+        with pytest.raises(SupabaseError):
+            await quotas.get("u")
+    asyncio.run(run())
+
+
+def test_missing_increment_function_fails_startup(repo, monkeypatch):
+    async def missing(deltas):
+        raise SupabaseError(404, "Could not find the function public.increment_generations_used")
+
+    monkeypatch.setattr(repo, "increment_generations_used", missing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(QuotaService().check_database())
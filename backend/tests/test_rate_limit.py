@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from app.services import rate_limit as rate_limit_module
+from app.services.rate_limit import MemoryBackend, RateLimiter, RateLimitMiddleware, TierLimits
+
+
+def limiter(per_minute: float = 60, burst: int = 2, max_concurrent: int = 5) -> RateLimiter:
+    return RateLimiter(
+        MemoryBackend(),
+        {
+            "free": TierLimits(per_minute, burst, max_concurrent),
+            "pro": TierLimits(per_minute * 10, burst * 10, max_concurrent * 2)
+        }
+    )
+
+
+def test_bucket_allows_the_burst_then_reports_the_wait():
+    async def run():
+        backend = MemoryBackend()
+        assert await backend.take("u", rate=1.0, burst=2) == 0
+        assert await backend.take("u", rate=1.0, burst=2) == 0
+        assert await backend.take("u", rate=1.0, burst=2) == pytest.approx(1.0, abs=0.05)
+        # Other keys have their own bucket
+        assert await backend.take("v", rate=1.0, burst=2) == 0
+    asyncio.run(run())
+
+
+def test_bucket_refills_over_time(monkeypatch):
+    async def run():
+        clock = [100.0]
+        monkeypatch.setattr(rate_limit_module.time, "monotonic", lambda: clock[0])
+        backend = MemoryBackend()
+        await backend.take("u", rate=0.5, burst=1)
+        assert await backend.take("u", rate=0.5, burst=1) == pytest.approx(2.0)
+        clock[0] += 2.0
+        assert await backend.take("u", rate=0.5, burst=1) == 0
+    asyncio.run(run())
+
+
+def test_prune_drops_only_refilled_buckets(monkeypatch):
+    async def run():
+        clock = [100.0]
+        monkeypatch.setattr(rate_limit_module.time, "monotonic", lambda: clock[0])
+        backend = MemoryBackend(max_keys=2)
+        await backend.take("slow", rate=0.01, burst=1)
+        await backend.take("fast", rate=10.0, burst=1)
+        clock[0] += 1.0
+        await backend.take("new", rate=1.0, burst=1)
+        assert set(backend._buckets) == {"slow", "new"}
+    asyncio.run(run())
+
+
+def test_slots_are_capped_and_released():
+    async def run():
+        backend = MemoryBackend()
+        assert await backend.acquire_slot("u", 1)
+        assert not await backend.acquire_slot("u", 1)
+        await backend.release_slot("u")
+        assert await backend.acquire_slot("u", 1)
+        await backend.release_slot("u")
+        await backend.release_slot("u")  # never goes negative
+        assert backend._slots == {}
+    asyncio.run(run())
+
+
+def test_limiter_enforces_concurrency_before_spending_tokens():
+    async def run():
+        limits = limiter(max_concurrent=1)
+        assert await limits.acquire("u", "free") == (True, 0)
+        assert await limits.acquire("u", "free") == (False, 1)
+        await limits.release("u")
+        # The rejected request didn't spend the second token
+        assert await limits.acquire("u", "free") == (True, 0)
+        assert limits.stats()["concurrency_limited"] == 1
+    asyncio.run(run())
+
+
+def test_limiter_rate_limits_and_frees_the_slot():
+    async def run():
+        limits = limiter(per_minute=1, burst=1)
+        assert (await limits.acquire("u", "free"))[0]
+        await limits.release("u")
+        allowed, retry_after = await limits.acquire("u", "free")
+        assert not allowed and 55 <= retry_after <= 60
+        assert limits.backend._slots == {}
+        assert limits.rate_limited == 1
+    asyncio.run(run())
+
+
+def test_unknown_tier_gets_free_limits():
+    limits = limiter()
+    assert limits.limits_for(None) is limits.limits["free"]
+    assert limits.limits_for("enterprise") is limits.limits["free"]
+    assert limits.limits_for("pro") is limits.limits["pro"]
+
+
+class FakeQuota:
+    def __init__(self, tier=None, loaded_tier="pro", fail=False):
+        self.tier = tier
+        self.loaded_tier = loaded_tier
+        self.fail = fail
+        self.loads = 0
+
+    def cached_tier(self, user_id):
+        return self.tier
+
+    async def get(self, user_id):
+        self.loads += 1
+        if self.fail:
+            raise RuntimeError("unavailable")
+        self.tier = self.loaded_tier
+        return type("Quota", (), {"tier": self.loaded_tier})()
+
+
+@pytest.mark.parametrize("quota, expected, loads", [
+    (FakeQuota(tier="free"), "free", 0),
+    (FakeQuota(), "pro", 1),
+    (FakeQuota(fail=True), None, 1)
+])
+def test_middleware_loads_the_tier_on_a_cold_cache(monkeypatch, quota, expected, loads):
+    monkeypatch.setattr(rate_limit_module, "quota_service", quota)
+    middleware = RateLimitMiddleware(None, limiter(), ["/generate"])
+    assert asyncio.run(middleware._tier("u")) == expected
+    assert quota.loads == loads
@@ -0,0 +1,52 @@
+from app.utils.text_utils import plan_segments, split_clauses, split_sentences
+
+
+def test_split_sentences_on_terminal_punctuation():
+    text = "  Hello there. How are you? Fine! Well…  Good  "
+    assert split_sentences(text) == ["Hello there.", "How are you?", "Fine!", "Well…", "Good"]
+
+
+def test_split_sentences_keeps_closing_quotes_with_their_sentence():
+    assert split_sentences('She said "stop." Then left.') == ['She said "stop."', "Then left."]
+
+
+def test_split_sentences_of_blank_text():
+    assert split_sentences("   ") == []
+
+
+def test_short_sentence_is_not_split():
+    assert split_clauses("Short, sweet.", 50) == ["Short, sweet."]
+
+
+def test_long_sentence_is_cut_at_clauses_and_refilled():
+    sentence = "one two three, four five six; seven eight nine: ten"
+    pieces = split_clauses(sentence, 30)
+    assert pieces == ["one two three, four five six;", "seven eight nine: ten"]
+    assert " ".join(pieces) == sentence
+
+
+def test_clause_without_pauses_is_wrapped_between_words():
+    sentence = " ".join(["word"] * 20)
+    pieces = split_clauses(sentence, 24)
+    assert all(len(piece) <= 24 for piece in pieces)
+    assert " ".join(pieces) == sentence
+
+
+def test_plan_segments_respects_max_chars_and_keeps_every_word():
+    text = " ".join(f"Sentence number {i} has a few words, and a clause." for i in range(20))
+    segments = plan_segments(text, max_chars=80, min_chars=20)
+    assert all(len(segment) <= 80 for segment in segments)
+    assert " ".join(segments).split() == text.split()
+
+
+def test_plan_segments_merges_short_fragments():
+    assert plan_segments("Hi. Okay. This sentence is long enough on its own.", max_chars=200, min_chars=20) == [
+        "Hi. Okay. This sentence is long enough on its own."
+    ]
+    assert plan_segments("This sentence is long enough on its own. Yes.", max_chars=42, min_chars=20) == [
+        "This sentence is long enough on its own.", "Yes."
+    ]
+
+
+def test_plan_segments_of_empty_text():
+    assert plan_segments("") == []
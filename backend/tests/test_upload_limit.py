@@ -0,0 +1,152 @@
+import asyncio
+import io
+import json
+import struct
+
+import numpy as np
+import pytest
+import soundfile as sf
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.utils.reference_audio import declared_duration, sniff_audio_format
+from app.utils.upload_limit import AudioUploadCheckMiddleware, UploadLimitMiddleware
+
+BOUNDARY = b"testboundary"
+
+
+def audio(seconds: float, format: str = "WAV", rate: int = 8000) -> bytes:
+    buffer = io.BytesIO()
+    # Noise, so compressed formats stay about as large as the real thing
+    noise = np.random.default_rng(0).uniform(-0.5, 0.5, int(seconds * rate)).astype(np.float32)
+    sf.write(buffer, noise, rate, format=format)
+    return buffer.getvalue()
+
+
+def multipart(data: bytes, field: str = "file") -> bytes:
+    return (
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="name"\r\n\r\nvoice\r\n'
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="' + field.encode() + b'"; filename="sample"\r\n'
+        b"Content-Type: application/octet-stream\r\n\r\n" + data + b"\r\n"
+        b"--" + BOUNDARY + b"--\r\n"
+    )
+
+
+async def app(scope, receive, send):
+    form = await Request(scope, receive).form()
+    upload = form["file"]
+    await JSONResponse({"size": len(await upload.read())})(scope, receive, send)
+
+
+def call(middleware, body: bytes, chunk_size: int = 1024, content_length: bool = False):
+    """Send body in chunks; returns (status, json, headers, chunks the app pulled)"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": headers, "query_string": b""}
+    pulled = 0
+    sent = []
+
+    async def receive():
+        nonlocal pulled
+        if pulled >= len(chunks):
+            return {"type": "http.disconnect"}
+        pulled += 1
+        return {"type": "http.request", "body": chunks[pulled - 1], "more_body": pulled < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    start, payload = sent[0], b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], json.loads(payload), dict(start["headers"]), pulled
+
+
+@pytest.mark.parametrize("format, extension", [
+    ("WAV", "wav"), ("FLAC", "flac"), ("OGG", "ogg"), ("AIFF", "aiff")
+])
+def test_sniff_recognises_decodable_containers(format, extension):
+    assert sniff_audio_format(audio(0.1, format))[0] == extension
+
+
+@pytest.mark.parametrize("head", [
+    b"ID3\x04\x00",
+    b"\xff\xfb\x90\x00"
+])
+def test_sniff_recognises_mp3(head):
+    assert sniff_audio_format(head)[0] == "mp3"
+
+
+@pytest.mark.parametrize("head", [
+    b"\xff\xf1\x50\x80",  # ADTS AAC
+    b"\x00\x00\x00\x20ftypM4A ",
+    b"<html>",
+    b""
+])
+def test_sniff_rejects_everything_else(head):
+    assert sniff_audio_format(head) is None
+
+
+@pytest.mark.parametrize("format", ["WAV", "FLAC"])
+def test_declared_duration_from_the_header(format):
+    data = audio(2.5, format)
+    assert declared_duration(format.lower(), data[:4096]) == pytest.approx(2.5)
+
+
+def test_declared_duration_unknown_for_streamed_or_partial_headers():
+    data = bytearray(audio(1.0))
+    assert declared_duration("wav", bytes(data[:20])) is None
+    data_offset = data.index(b"data")
+    data[data_offset + 4:data_offset + 8] = struct.pack("<I", 0xFFFFFFFF)
+    assert declared_duration("wav", bytes(data)) is None
+    assert declared_duration("mp3", b"ID3\x04\x00") is None
+
+
+def test_audio_check_passes_a_short_upload():
+    data = audio(1.0)
+    status, payload, _, _ = call(AudioUploadCheckMiddleware(app, ["/upload"], max_seconds=5), multipart(data))
+    assert status == 200 and payload == {"size": len(data)}
+
+
+@pytest.mark.parametrize("data, status", [
+    (b"<html>" + b"\x00" * 20000, 415),
+    (audio(10.0), 400),
+    (audio(10.0, "FLAC"), 400)
+], ids=["unknown", "long-wav", "long-flac"])
+def test_audio_check_rejects_from_the_first_bytes(data, status):
+    body = multipart(data)
+    result, _, headers, pulled = call(AudioUploadCheckMiddleware(app, ["/upload"], max_seconds=5), body)
+    assert result == status
+    assert headers[b"connection"] == b"close"
+    assert pulled < len(body) // 1024
+
+
+def test_audio_check_leaves_other_fields_and_paths_alone():
+    data = b"not audio at all"
+    middleware = AudioUploadCheckMiddleware(app, ["/elsewhere"], max_seconds=5)
+    assert call(middleware, multipart(data))[0] == 200
+    middleware = AudioUploadCheckMiddleware(app, ["/upload"], max_seconds=5, field="other")
+    assert call(middleware, multipart(data))[0] == 200
+
+
+def test_size_limit_refuses_a_declared_length_before_reading():
+    body = multipart(b"\x00" * 5000)
+    status, _, headers, pulled = call(
+        UploadLimitMiddleware(app, max_bytes=1000, paths=["/upload"]), body, content_length=True
+    )
+    assert status == 413 and pulled == 0
+    assert headers[b"connection"] == b"close"
+
+
+def test_size_limit_cuts_off_an_undeclared_body():
+    body = multipart(b"\x00" * 5000)
+    status, _, _, pulled = call(UploadLimitMiddleware(app, max_bytes=1000, paths=["/upload"]), body, chunk_size=512)
+    assert status == 413 and pulled == 2
+
+
+def test_size_limit_passes_small_bodies():
+    status, payload, _, _ = call(UploadLimitMiddleware(app, max_bytes=10000, paths=["/upload"]), multipart(b"abc"))
+    assert status == 200 and payload == {"size": 3}
@@ -11,6 +11,21 @@ import axios from 'axios'
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 
+// my-voices is paginated, follow next_cursor until every page is in
+const fetchAllVoices = async (token) => {
+  const voices = []
+  let cursor = null
+  do {
+    const res = await axios.get(`${API_URL}/api/voice/my-voices`, {
+      headers: { Authorization: `Bearer ${token}` },
+      params: { limit: 200, ...(cursor ? { cursor } : {}) }
+    })
+    voices.push(...res.data.voices)
+    cursor = res.data.next_cursor
+  } while (cursor)
+  return voices
+}
+
 export default function Dashboard() {
   const navigate = useNavigate()
   const { user, signOut } = useSupabase()
@@ -35,12 +50,10 @@ export default function Dashboard() {
       }
       const token = session.access_token
       
-      const voicesRes = await axios.get(`${API_URL}/api/voice/my-voices`, {
-        headers: { Authorization: `Bearer ${token}` }
-      })
-      setVoices(voicesRes.data.voices)
-      if (voicesRes.data.voices.length > 0) {
-        setSelectedVoice(voicesRes.data.voices[0].id)
+      const allVoices = await fetchAllVoices(token)
+      setVoices(allVoices)
+      if (allVoices.length > 0) {
+        setSelectedVoice(allVoices[0].id)
       }
 
       const usageRes = await axios.get(`${API_URL}/api/voice/usage`, {